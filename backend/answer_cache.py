@@ -0,0 +1,198 @@
+# backend/answer_cache.py
+"""
+Answer cache for RAG responses.
+
+Answers are stored under the retrieved context they were generated from:
+the model, the personalization text and the IDs of the retrieved chunks.
+Within one context, a question hits the cache either on its normalized text
+or when its embedding is close enough to an earlier question's embedding.
+Entries remember which sources they were built from so that re-ingesting or
+deleting a document drops every answer that quoted it. A source is a
+(namespace, document name) tuple, so the same file name in two namespaces
+never invalidates the other's answers (see rag.Namespace.source_key).
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# ========================================
+# ⚡ ANSWER CACHE TUNING
+# ========================================
+# 🎯 MAX_ENTRIES: Maximum cached answers (least recently used are evicted first)
+# 🎯 TTL_SECONDS: Cached answers expire after this long
+#    Default: 3600 (1 hour)
+# 🎯 SIMILARITY_THRESHOLD: Cosine similarity needed for a near-duplicate hit
+#    Higher = only near-identical rephrasings hit, Lower = more hits but riskier
+#    Default: 0.95
+# 🎯 REPLAY_CHUNK_CHARS: Size of the pieces a cached answer is streamed back in
+MAX_ENTRIES = 512
+TTL_SECONDS = 3600
+SIMILARITY_THRESHOLD = 0.95
+REPLAY_CHUNK_CHARS = 32
+
+_whitespace = re.compile(r"\s+")
+_trailing_punct = re.compile(r"[\s?!.]+$")
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and strip trailing punctuation."""
+    text = _whitespace.sub(" ", question.strip().lower())
+    return _trailing_punct.sub("", text)
+
+def _context_key(model: str, personalization: str, chunk_ids) -> tuple:
+    personalization_hash = hashlib.sha1((personalization or "").encode("utf-8")).hexdigest()
+    return (model or "", personalization_hash, tuple(chunk_ids))
+
+def answer_key(question: str, model: str, personalization: str, chunk_ids) -> tuple:
+    """Identity of an answer: (retrieved context, normalized question)."""
+    return (_context_key(model, personalization, chunk_ids), normalize_question(question))
+
+class _Entry:
+    __slots__ = ("question", "embedding", "answer", "sources", "context_key", "created_at")
+
+    def __init__(self, question, embedding, answer, sources, context_key):
+        self.question = question
+        self.embedding = embedding
+        self.answer = answer
+        self.sources = sources
+        self.context_key = context_key
+        self.created_at = time.monotonic()
+
+class AnswerCache:
+    """
+    LRU + TTL cache of generated answers.
+
+    Thread safe: lookups happen on worker threads and on the event loop.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: float = TTL_SECONDS,
+                 similarity_threshold: float = SIMILARITY_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()   # (context_key, question) -> _Entry
+        self._by_context = {}           # context_key -> set of entry keys
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(embedding):
+        if embedding is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else None
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            siblings = self._by_context.get(entry.context_key)
+            if siblings is not None:
+                siblings.discard(key)
+                if not siblings:
+                    del self._by_context[entry.context_key]
+
+    def _expired(self, entry) -> bool:
+        return self.ttl is not None and time.monotonic() - entry.created_at > self.ttl
+
+    def get(self, question: str, embedding, model: str, personalization: str, chunk_ids):
+        """
+        Look up an answer for a question asked against the given context.
+
+        Returns:
+            The cached answer string, or None on a miss
+        """
+        exact_key = answer_key(question, model, personalization, chunk_ids)
+        context_key = exact_key[0]
+
+        with self._lock:
+            entry = self._entries.get(exact_key)
+            if entry is not None and self._expired(entry):
+                self._drop(exact_key)
+                entry = None
+
+            if entry is None:
+                query = self._unit(embedding)
+                best_key, best_score = None, self.similarity_threshold
+                if query is not None:
+                    for key in list(self._by_context.get(context_key, ())):
+                        candidate = self._entries[key]
+                        if self._expired(candidate):
+                            self._drop(key)
+                            continue
+                        if candidate.embedding is None:
+                            continue
+                        score = float(np.dot(query, candidate.embedding))
+                        if score >= best_score:
+                            best_key, best_score = key, score
+                if best_key is not None:
+                    exact_key, entry = best_key, self._entries[best_key]
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(exact_key)
+            self.hits += 1
+            return entry.answer
+
+    def put(self, question: str, embedding, model: str, personalization: str, chunk_ids, sources, answer: str):
+        """Store an answer generated from the given context; `sources` are (namespace, document) tuples."""
+        if not answer:
+            return
+        key = answer_key(question, model, personalization, chunk_ids)
+        context_key = key[0]
+        entry = _Entry(key[1], self._unit(embedding), answer, frozenset(sources), context_key)
+
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = entry
+            self._by_context.setdefault(context_key, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+
+    def invalidate_source(self, source: tuple) -> int:
+        """
+        Drop every answer built from chunks of `source`, a (namespace, document)
+        tuple. Returns the number removed.
+        """
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if source in entry.sources]
+            for key in stale:
+                self._drop(key)
+            return len(stale)
+
+    def invalidate_sources(self, matches) -> int:
+        """Drop every answer built from a source for which `matches((namespace, document))` is true."""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if any(matches(source) for source in entry.sources)]
+            for key in stale:
+                self._drop(key)
+            return len(stale)
+
+    def clear(self):
+        """Drop every cached answer."""
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+def replay(answer: str, chunk_chars: int = REPLAY_CHUNK_CHARS):
+    """Generator that yields a cached answer in stream-sized pieces."""
+    for start in range(0, len(answer), chunk_chars):
+        yield answer[start:start + chunk_chars]
+
+async def replay_async(answer: str, chunk_chars: int = REPLAY_CHUNK_CHARS):
+    """Async generator version of replay(), for the SSE streaming path."""
+    for piece in replay(answer, chunk_chars):
+        yield piece
+
+answer_cache = AnswerCache()
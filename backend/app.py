@@ -1,12 +1,24 @@
 # backend/app.py
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+import asyncio
+import importlib
 import os
-import shutil
-from rag import ask_rag, add_document_to_rag
-from docs_loader import process_document
+import time
+# Imported first so its clock starts with the process; rag (vector store,
+# embedding model) is imported lazily in the routes and the warm-up thread
+import warmup
+from jobs import DATA_DIR, job_queue
+from namespaces import InvalidNamespace, UnknownNamespace, namespace_dir, validate_namespace
+from ollama_client import close_async_client
+from streaming import stream_sse
+from metrics import finish_trace, render as render_metrics, start_trace
+from uploads import UploadRejected, receive_upload, receive_uploads
+from logger import get_logger
+
+log = get_logger(__name__)
 
 app = FastAPI(title="RAG Chatbot API")
 
@@ -19,99 +31,277 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup():
+    # Start ingestion workers and resume jobs left over from the last run
+    job_queue.start()
+    # Load the vector store, embedding model and default LLM in the background
+    warmup.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Release pooled keep-alive connections to Ollama
+    await close_async_client()
+    job_queue.stop()
+
 class Question(BaseModel):
     text: str
     stream: bool = False
     history: list = []
     personalization: str = ''
     model: str = ''
+    # Random ID of the conversation; follow-up questions (non-empty history)
+    # with one use server-side sessions that let Ollama reuse the evaluated prompt
+    session_id: str = ''
+    # Namespace (workspace) whose documents are searched; empty = default
+    namespace: str = ''
+    # Optional filters on the searched documents: names, types ("pdf", "md",
+    # "txt") and ingest time range (epoch seconds or ISO 8601 dates)
+    sources: list[str] = []
+    types: list[str] = []
+    after: float | str | None = None
+    before: float | str | None = None
+
+def _namespace(name: str) -> str:
+    """Validated namespace name; 400 if it can't be used."""
+    try:
+        return validate_namespace(name)
+    except InvalidNamespace as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def _import_rag():
+    """
+    The rag module, for async routes. Its first import opens the vector store
+    and embedding model, so it runs in a worker thread instead of blocking the
+    event loop (and /, /ready) while pre-warming is still loading them.
+    """
+    return await asyncio.to_thread(importlib.import_module, "rag")
 
 @app.get("/")
 def root():
     return {"message": "RAG Chatbot API is running"}
 
+@app.get("/ready")
+def ready():
+    """Readiness probe: 503 until the vector store and embedding model are loaded."""
+    state = warmup.readiness.snapshot()
+    if not state["ready"]:
+        return JSONResponse(status_code=503, content=state)
+    return state
+
 @app.get("/models")
-def get_models():
+async def get_models():
     """Get list of available Ollama models."""
-    from ollama_client import get_available_models
-    models = get_available_models()
+    from ollama_client import get_available_models_async
+    models = await get_available_models_async()
     return {"models": models}
 
 @app.post("/ask")
-def ask(q: Question):
+async def ask(q: Question, request: Request):
     """Ask a question and get an answer based on RAG context."""
+    started_at = time.perf_counter()
+    namespace = _namespace(q.namespace)
+    trace = start_trace(stream=q.stream, session=bool(q.session_id), namespace=namespace)
+    rag = await _import_rag()
+    try:
+        where = rag.metadata_filter(q.sources, q.types, q.after, q.before)
+    except ValueError as e:
+        finish_trace("ask", trace, status="error")
+        raise HTTPException(status_code=400, detail=str(e))
     try:
-        print(f"Received question: {q.text}, stream: {q.stream}")
+        log.debug("Received question: %s, stream: %s", q.text, q.stream)
         if q.stream:
-            # Return streaming response
-            def generate():
-                for chunk in ask_rag(q.text, stream=True):
-                    yield f"data: {chunk}\n\n"
-                yield "data: [DONE]\n\n"
-            
-            return StreamingResponse(generate(), media_type="text/event-stream")
+            # Return streaming response; tokens are batched, and the upstream
+            # generation is cancelled if the client disconnects
+            chunks = await rag.ask_rag_async(q.text, stream=True, history=q.history, personalization=q.personalization, model=q.model, session_id=q.session_id,
+                                         namespace=namespace, where=where)
+            return StreamingResponse(
+                stream_sse(request, chunks, started_at, trace),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
         else:
             # Return complete answer
-            print("Getting answer from RAG...")
-            print(f"Chat history length: {len(q.history)}")
+            log.debug("Chat history length: %d", len(q.history))
             if q.personalization:
-                print(f"Using personalization: {q.personalization[:100]}...")
+                log.debug("Using personalization: %.100s...", q.personalization)
             if q.model:
-                print(f"Using model: {q.model}")
-            answer = ask_rag(q.text, stream=False, history=q.history, personalization=q.personalization, model=q.model)
-            print(f"Answer received: {answer[:100]}...")
+                log.debug("Using model: %s", q.model)
+            answer = await rag.ask_rag_async(q.text, stream=False, history=q.history, personalization=q.personalization, model=q.model, session_id=q.session_id,
+                                         namespace=namespace, where=where)
+            log.debug("Answer received: %.100s...", answer)
+            finish_trace("ask", trace)
             return {"answer": answer}
+    except UnknownNamespace as e:
+        finish_trace("ask", trace, status="error")
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
-        print(f"Error in /ask endpoint: {e}")
+        log.error("Error in /ask endpoint: %s", e)
+        finish_trace("ask", trace, status="error")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    """Upload a document (PDF, TXT, MD) to add to the knowledge base."""
+async def upload_file(request: Request, namespace: str = ""):
+    """
+    Upload a document (PDF, TXT, MD) to add to the knowledge base.
+
+    The multipart body is streamed to data/ while it is hashed and checked
+    against the type and size limits; a file whose content is already
+    indexed in the namespace (?namespace=, default if omitted) is rejected
+    with 409 before any parsing.
+    """
+    namespace = _namespace(namespace)
+    data_dir = namespace_dir(DATA_DIR, namespace)
+    os.makedirs(data_dir, exist_ok=True)
     try:
-        # Check file extension
-        allowed_extensions = {".pdf", ".txt", ".md"}
-        file_ext = os.path.splitext(file.filename)[1].lower()
-        
-        if file_ext not in allowed_extensions:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"File type {file_ext} not supported. Allowed: {allowed_extensions}"
-            )
-        
-        # Save uploaded file to data directory
-        data_dir = os.path.join(os.path.dirname(__file__), "..", "data")
-        os.makedirs(data_dir, exist_ok=True)
-        
-        file_path = os.path.join(data_dir, file.filename)
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        upload = await receive_upload(request, data_dir)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    filename = upload["filename"]
+    try:
+        rag = await _import_rag()
+        # Reads the manifest (and opens the namespace on first use); keep it off the loop
+        duplicate = await asyncio.to_thread(rag.find_duplicate, upload["file_hash"], namespace)
+        if duplicate is not None:
+            detail = (f"Document '{filename}' is already in the knowledge base" if duplicate == filename
+                      else f"Document '{filename}' has the same content as '{duplicate}', which is already in the knowledge base")
+            raise HTTPException(status_code=409, detail=detail)
+        file_path = os.path.join(data_dir, filename)
+        os.replace(upload["temp_path"], file_path)
         
-        # Process and add to RAG
-        chunks = process_document(file_path)
-        add_document_to_rag(file.filename, chunks)
+        # Parse, chunk, embed and store in the background; poll /jobs/{job_id}
+        job = job_queue.submit(file_path, filename, file_hash=upload["file_hash"], namespace=namespace)
         
         return {
-            "message": f"Document '{file.filename}' uploaded and processed successfully",
-            "chunks": len(chunks)
+            "message": f"Document '{filename}' uploaded and queued for processing",
+            "namespace": namespace,
+            "job_id": job["id"],
+            "status": job["status"]
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if os.path.exists(upload["temp_path"]):
+            os.remove(upload["temp_path"])
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Get the status of a background ingestion job."""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@app.post("/upload/bulk")
+async def upload_files(request: Request, namespace: str = ""):
+    """
+    Upload many documents at once (form field "files").
+
+    Every file gets the same type, size, content and duplicate checks as
+    /upload and is queued as its own job; files that fail them are listed
+    in "errors" and the rest are still accepted.
+    """
+    namespace = _namespace(namespace)
+    data_dir = namespace_dir(DATA_DIR, namespace)
+    os.makedirs(data_dir, exist_ok=True)
+    try:
+        uploads, errors = await receive_uploads(request, data_dir)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    jobs = []
+    try:
+        rag = await _import_rag()
+        queued = {}   # file hash -> name, for copies within this request
+        for upload in uploads:
+            filename = upload["filename"]
+            if filename in queued.values():
+                # A second file of the same name would replace the first while its job is queued
+                errors[filename] = "Another file of this name is already in this upload"
+                continue
+            duplicate = queued.get(upload["file_hash"])
+            if duplicate is None:
+                duplicate = await asyncio.to_thread(rag.find_duplicate, upload["file_hash"], namespace)
+            if duplicate is not None:
+                errors[filename] = ("Already in the knowledge base" if duplicate == filename
+                                    else f"Same content as '{duplicate}'")
+                continue
+            file_path = os.path.join(data_dir, filename)
+            os.replace(upload["temp_path"], file_path)
+            queued[upload["file_hash"]] = filename
+            job = job_queue.submit(file_path, filename, file_hash=upload["file_hash"], namespace=namespace)
+            jobs.append({"filename": filename, "job_id": job["id"], "status": job["status"]})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for upload in uploads:
+            if os.path.exists(upload["temp_path"]):
+                os.remove(upload["temp_path"])
+    
+    return {
+        "message": f"Queued {len(jobs)} of {len(jobs) + len(errors)} documents for processing",
+        "namespace": namespace,
+        "jobs": jobs,
+        "errors": errors,
+    }
+
+@app.get("/namespaces")
+def list_namespaces():
+    """List the namespaces (workspaces) of the knowledge base."""
+    from rag import list_namespaces as get_namespaces
+    return {"namespaces": get_namespaces()}
 
 @app.get("/documents")
-def list_documents():
-    """List all documents in the knowledge base."""
+def list_documents(namespace: str = ""):
+    """List all documents in a namespace of the knowledge base."""
+    namespace = _namespace(namespace)
     from rag import get_collection_stats
-    stats = get_collection_stats()
-    return stats
+    try:
+        return get_collection_stats(namespace)
+    except UnknownNamespace as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
 @app.delete("/documents")
-def clear_documents():
-    """Clear all documents from the knowledge base."""
+def clear_documents(namespace: str = ""):
+    """Clear all documents from one namespace of the knowledge base."""
+    namespace = _namespace(namespace)
     from rag import clear_collection
-    clear_collection()
-    return {"message": "All documents cleared from knowledge base"}
+    try:
+        clear_collection(namespace)
+    except UnknownNamespace as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"message": f"All documents cleared from namespace '{namespace}'"}
+
+@app.delete("/documents/{name}")
+def delete_document(name: str, namespace: str = ""):
+    """Remove a single document from a namespace of the knowledge base."""
+    namespace = _namespace(namespace)
+    from rag import delete_document as remove_document
+    try:
+        result = remove_document(name, namespace)
+    except UnknownNamespace as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Document '{name}' not found")
+    return {"message": f"Document '{name}' removed from knowledge base", **result}
+
+@app.get("/stats/embedding")
+def embedding_stats():
+    """Query embedding batch sizes and queue waits."""
+    from rag import embedding_stats as get_embedding_stats
+    return get_embedding_stats()
+
+@app.get("/stats/models")
+def model_stats():
+    """Per-model queues, running requests, Ollama residency and routing counts."""
+    from model_router import router
+    return router.stats()
+
+@app.get("/metrics")
+def metrics():
+    """Stage latencies, Ollama timings, queue and warm-up gauges in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
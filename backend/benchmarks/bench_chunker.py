@@ -0,0 +1,107 @@
+# backend/benchmarks/bench_chunker.py
+"""
+Benchmark the character chunker against the token-aware chunker.
+
+Reports chunks/sec, MB/sec and the chunk length distribution (characters and
+embedding-model tokens) for each, including how many chunks exceed the
+embedding model's input limit.
+
+Usage (from backend/):
+    python benchmarks/bench_chunker.py                  # synthetic corpus, ~20 MB
+    python benchmarks/bench_chunker.py --corpus ../data # your own documents
+    python benchmarks/bench_chunker.py --json results.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from docs_loader import chunk_text, chunk_text_tokens, list_supported_files, load_document
+from token_counter import MODEL_MAX_TOKENS, SPECIAL_TOKENS, count_tokens, get_tokenizer
+
+WORDS = (
+    "the of and to in is that for it as with was on be by this are or from at an "
+    "retrieval embedding vector index query document chunk token model latency "
+    "throughput cache server request response pipeline configuration ERR_CONN_RESET "
+    "0x7f3a v2.4.1 kubernetes postgres authentication"
+).split()
+
+def synthetic_corpus(megabytes: float, seed: int = 42) -> list[str]:
+    """Documents made of sentences grouped into paragraphs."""
+    rng = random.Random(seed)
+    documents, size = [], 0
+    while size < megabytes * 1024 * 1024:
+        paragraphs = []
+        for _ in range(rng.randint(20, 200)):
+            sentences = []
+            for _ in range(rng.randint(1, 8)):
+                words = [rng.choice(WORDS) for _ in range(rng.randint(5, 30))]
+                sentences.append(" ".join(words).capitalize() + rng.choice([".", ".", ".", "?", "!"]))
+            paragraphs.append(" ".join(sentences))
+        document = "\n\n".join(paragraphs)
+        documents.append(document)
+        size += len(document)
+    return documents
+
+def percentiles(values: list, points=(0, 50, 95, 100)) -> dict:
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+    return {f"p{p}": ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] for p in points}
+
+def run(name: str, chunker, documents: list[str]) -> dict:
+    total_chars = sum(len(d) for d in documents)
+    started = time.perf_counter()
+    chunks = [chunk for document in documents for chunk in chunker(document)]
+    elapsed = time.perf_counter() - started
+
+    token_lengths = [count_tokens(chunk) + SPECIAL_TOKENS for chunk in chunks]
+    over_limit = sum(1 for n in token_lengths if n > MODEL_MAX_TOKENS)
+    return {
+        "chunker": name,
+        "chunks": len(chunks),
+        "seconds": round(elapsed, 3),
+        "chunks_per_second": round(len(chunks) / elapsed, 1),
+        "mb_per_second": round(total_chars / elapsed / 1024 / 1024, 2),
+        "chars": percentiles([len(c) for c in chunks]),
+        "tokens": percentiles(token_lengths),
+        "over_model_limit": over_limit,
+        "over_model_limit_pct": round(100 * over_limit / len(chunks), 2) if chunks else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Directory of PDF/TXT/MD files (default: synthetic)")
+    parser.add_argument("--megabytes", type=float, default=20, help="Size of the synthetic corpus")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    if args.corpus:
+        documents = [load_document(path) for path in list_supported_files(args.corpus)]
+    else:
+        documents = synthetic_corpus(args.megabytes)
+    print(f"Corpus: {len(documents)} documents, {sum(len(d) for d in documents) / 1024 / 1024:.1f} MB, "
+          f"tokenizer: {get_tokenizer().name}")
+
+    results = [
+        run("chars", chunk_text, documents),
+        run("tokens", chunk_text_tokens, documents),
+    ]
+    for result in results:
+        print(f"\n[{result['chunker']}] {result['chunks']} chunks in {result['seconds']}s "
+              f"({result['chunks_per_second']} chunks/s, {result['mb_per_second']} MB/s)")
+        print(f"  chars:  {result['chars']}")
+        print(f"  tokens: {result['tokens']}")
+        print(f"  over {MODEL_MAX_TOKENS}-token model limit: {result['over_model_limit']} "
+              f"({result['over_model_limit_pct']}%)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"tokenizer": get_tokenizer().name, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
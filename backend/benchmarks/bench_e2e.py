@@ -0,0 +1,354 @@
+# backend/benchmarks/bench_e2e.py
+"""
+End-to-end benchmark and load test of the backend, without a real model.
+
+Runs against a temporary vector store and data directory, so your own
+documents are never touched. Scenarios:
+
+- ingest: a synthetic corpus (see corpus.py) goes through process_document
+  (parse + chunk) and add_document_to_rag (embed + store); reports docs,
+  chunks and MB per second. Always runs, the other scenarios need the corpus
+- retrieval: retrieve_context latency (p50/p95/p99) and how often the
+  question's source document is retrieved, measured each time the corpus has
+  grown to the next of --sizes documents
+- ask: starts the stand-in Ollama server (fake_ollama.py) and the API in
+  separate processes, then sends streaming /ask requests at each --concurrency
+  level (closed loop: every client sends its next question when the previous
+  answer finished). Reports latency and time-to-first-token percentiles,
+  requests per second, errors, and the mean server-side time per stage taken
+  from /metrics
+
+Every question is distinct, so the answer and retrieval caches don't flatter
+the results. Results are written as JSON (default benchmarks/results/) with
+the git commit and machine details; --compare prints the change of every
+latency and throughput figure against an earlier results file.
+
+Usage (from backend/):
+    python benchmarks/bench_e2e.py                                 # all scenarios
+    python benchmarks/bench_e2e.py --scenarios ingest,retrieval --sizes 50,200,1000
+    python benchmarks/bench_e2e.py --scenarios ask --concurrency 1,8,32 --requests 64
+    python benchmarks/bench_e2e.py --compare benchmarks/results/e2e-20260101-120000.json
+    python benchmarks/bench_e2e.py --ollama-url http://localhost:11434   # a real Ollama
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from corpus import generate_questions, write_corpus
+
+SCENARIOS = ("ingest", "retrieval", "ask")
+STAGE_LINE = re.compile(r'^rag_stage_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$')
+
+def percentiles(samples: list) -> dict:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    result = {f"p{p}": round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))], 2) for p in (50, 95, 99)}
+    result["mean"] = round(sum(ordered) / len(ordered), 2)
+    return result
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def fresh_questions(count: int, docs: int, seed: int, asked: set) -> list[dict]:
+    """`count` questions about documents 0..docs-1 that haven't been asked before."""
+    questions, attempt = [], 0
+    while len(questions) < count:
+        for question in generate_questions(count, docs, seed=f"{seed}-{attempt}"):
+            if question["question"] not in asked and len(questions) < count:
+                asked.add(question["question"])
+                questions.append(question)
+        attempt += 1
+    return questions
+
+# ========================================
+# Ingest and retrieval (in this process)
+# ========================================
+def bench_ingest_and_retrieval(args, corpus_dir: str, asked: set) -> dict:
+    # Imported here, after main() pointed EMBEDDINGS_PATH at the temporary store
+    import docs_loader
+    import rag
+
+    sizes = sorted(set(args.sizes)) if "retrieval" in args.scenarios else [max(args.sizes)]
+    steps, retrieval, ingested = [], [], 0
+    for size in sizes:
+        paths = write_corpus(corpus_dir, size - ingested, args.words, args.seed, start=ingested)
+        step = {"docs": len(paths), "chunks": 0, "mb": round(sum(os.path.getsize(p) for p in paths) / 1024 / 1024, 2),
+                "parse_seconds": 0.0, "embed_store_seconds": 0.0}
+        for path in paths:
+            started = time.perf_counter()
+            chunks = docs_loader.process_document(path)
+            parsed = time.perf_counter()
+            rag.add_document_to_rag(os.path.basename(path), chunks)
+            step["parse_seconds"] += parsed - started
+            step["embed_store_seconds"] += time.perf_counter() - parsed
+            step["chunks"] += len(chunks)
+        steps.append(step)
+        ingested = size
+        print(f"Ingested {size} documents ({rag.get_namespace().collection.count()} chunks)")
+
+        if "retrieval" in args.scenarios:
+            samples, hits = [], 0
+            for question in fresh_questions(args.queries, size, args.seed, asked):
+                started = time.perf_counter()
+                context = rag.retrieve_context(question["question"], n_results=args.k)
+                samples.append((time.perf_counter() - started) * 1000)
+                hits += f"[Source: {question['source']}]" in context
+            retrieval.append({
+                "docs": size,
+                "chunks": rag.get_namespace().collection.count(),
+                "queries": len(samples),
+                "latency_ms": percentiles(samples),
+                "source_hit_rate": round(hits / len(samples), 3),
+            })
+
+    total = {key: sum(step[key] for step in steps) for key in ("docs", "chunks", "mb", "parse_seconds", "embed_store_seconds")}
+    seconds = total["parse_seconds"] + total["embed_store_seconds"]
+    results = {"ingest": {
+        **{key: round(value, 3) if isinstance(value, float) else value for key, value in total.items()},
+        "docs_per_second": round(total["docs"] / seconds, 2),
+        "chunks_per_second": round(total["chunks"] / seconds, 1),
+        "mb_per_second": round(total["mb"] / seconds, 3),
+    }}
+    if retrieval:
+        results["retrieval"] = retrieval
+    return results
+
+# ========================================
+# Concurrent /ask load (API in a separate process)
+# ========================================
+def wait_until(check, timeout: float, what: str):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if check():
+                return
+        except Exception:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {what}")
+
+def stage_totals(base_url: str) -> dict:
+    """Per-stage (sum, count) of rag_stage_seconds from the API's /metrics."""
+    import httpx
+    totals = {}
+    for line in httpx.get(f"{base_url}/metrics", timeout=10).text.splitlines():
+        match = STAGE_LINE.match(line)
+        if match:
+            kind, stage, value = match.groups()
+            totals.setdefault(stage, [0.0, 0])[0 if kind == "sum" else 1] = float(value)
+    return totals
+
+async def run_load(base_url: str, questions: list[str], concurrency: int) -> dict:
+    import httpx
+
+    pending = iter(questions)
+    latencies, ttfts, errors = [], [], []
+
+    async def client_loop(client):
+        for question in pending:
+            started = time.perf_counter()
+            first = None
+            try:
+                async with client.stream("POST", "/ask", json={"text": question, "stream": True}) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if first is None and line.startswith("data:"):
+                            first = time.perf_counter() - started
+            except Exception as e:
+                errors.append(str(e))
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            if first is not None:
+                ttfts.append(first * 1000)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": len(questions),
+        "errors": len(errors),
+        "rps": round(len(latencies) / elapsed, 2),
+        "latency_ms": percentiles(latencies),
+        "ttft_ms": percentiles(ttfts),
+        "sample_errors": errors[:3],
+    }
+
+def bench_ask(args, workdir: str, asked: set) -> list[dict]:
+    import httpx
+
+    processes = []
+    try:
+        ollama_url = args.ollama_url
+        if not ollama_url:
+            port = free_port()
+            processes.append(subprocess.Popen([
+                sys.executable, os.path.join(BENCHMARKS_DIR, "fake_ollama.py"), "--port", str(port),
+                "--tokens-per-second", str(args.tokens_per_second), "--response-tokens", str(args.response_tokens),
+                "--load-ms", str(args.load_ms),
+            ]))
+            ollama_url = f"http://127.0.0.1:{port}"
+            wait_until(lambda: httpx.get(f"{ollama_url}/api/tags").status_code == 200, 30, "the fake Ollama server")
+
+        port = free_port()
+        env = dict(os.environ, OLLAMA_BASE_URL=ollama_url, DATA_DIR=os.path.join(workdir, "data"), LOG_LEVEL="WARNING")
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env,
+        ))
+        base_url = f"http://127.0.0.1:{port}"
+        wait_until(lambda: httpx.get(f"{base_url}/ready").json()["ready"], 180, "the API to become ready")
+
+        # Unmeasured requests load the model and warm the caches
+        asyncio.run(run_load(base_url, [q["question"] for q in fresh_questions(2, max(args.sizes), args.seed, asked)], 1))
+
+        levels = []
+        for concurrency in args.concurrency:
+            questions = [q["question"] for q in fresh_questions(args.requests, max(args.sizes), args.seed, asked)]
+            before = stage_totals(base_url)
+            level = asyncio.run(run_load(base_url, questions, concurrency))
+            after = stage_totals(base_url)
+            level["server_stage_ms"] = {
+                stage: round((total - before.get(stage, (0.0, 0))[0]) / (count - before.get(stage, (0.0, 0))[1]) * 1000, 2)
+                for stage, (total, count) in sorted(after.items())
+                if count > before.get(stage, (0.0, 0))[1]
+            }
+            levels.append(level)
+            print(f"/ask at concurrency {concurrency}: {level['rps']} req/s, p50 {level['latency_ms'].get('p50')} ms")
+        return levels
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+# ========================================
+# Reporting
+# ========================================
+def machine_info() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {"commit": commit, "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}
+
+def flatten(results: dict) -> dict:
+    """Latency and throughput figures as {"ask.c4.latency_ms.p95": value}."""
+    flat = {}
+    ingest = results.get("ingest", {})
+    for key in ("docs_per_second", "chunks_per_second", "mb_per_second"):
+        if key in ingest:
+            flat[f"ingest.{key}"] = ingest[key]
+    for row in results.get("retrieval", []):
+        for key, value in row["latency_ms"].items():
+            flat[f"retrieval.{row['docs']}docs.latency_ms.{key}"] = value
+    for row in results.get("ask", []):
+        prefix = f"ask.c{row['concurrency']}"
+        flat[f"{prefix}.rps"] = row["rps"]
+        for metric in ("latency_ms", "ttft_ms"):
+            for key, value in row[metric].items():
+                flat[f"{prefix}.{metric}.{key}"] = value
+    return flat
+
+def print_summary(results: dict):
+    ingest = results["ingest"]
+    print(f"\nIngest: {ingest['docs']} docs, {ingest['chunks']} chunks, {ingest['mb']} MB -> "
+          f"{ingest['docs_per_second']} docs/s, {ingest['chunks_per_second']} chunks/s "
+          f"(parse {ingest['parse_seconds']}s, embed+store {ingest['embed_store_seconds']}s)")
+    if results.get("retrieval"):
+        print(f"\n{'docs':>6} {'chunks':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'source hit':>11}")
+        for row in results["retrieval"]:
+            latency = row["latency_ms"]
+            print(f"{row['docs']:>6} {row['chunks']:>7} {latency['p50']:>8} {latency['p95']:>8} {latency['p99']:>8} {row['source_hit_rate']:>11}")
+    if results.get("ask"):
+        print(f"\n{'conc':>5} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ttft p50':>9} {'ttft p95':>9} {'errors':>7}")
+        for row in results["ask"]:
+            latency, ttft = row["latency_ms"], row["ttft_ms"]
+            print(f"{row['concurrency']:>5} {row['rps']:>7} {latency.get('p50', '-'):>8} {latency.get('p95', '-'):>8} "
+                  f"{latency.get('p99', '-'):>8} {ttft.get('p50', '-'):>9} {ttft.get('p95', '-'):>9} {row['errors']:>7}")
+
+def print_comparison(old: dict, new: dict):
+    before, after = flatten(old["results"]), flatten(new["results"])
+    print(f"\nCompared with {old['machine'].get('commit') or 'previous run'} ({old['started_at']}):")
+    for key in sorted(set(before) & set(after)):
+        change = (after[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+        print(f"  {key:<40} {before[key]:>10} -> {after[key]:>10} ({change:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated: ingest, retrieval, ask")
+    parser.add_argument("--sizes", default="20,100,400", help="Corpus sizes (documents) at which retrieval is measured")
+    parser.add_argument("--words", type=int, default=1500, help="Approximate words per document")
+    parser.add_argument("--queries", type=int, default=100, help="retrieve_context calls per corpus size")
+    parser.add_argument("--k", type=int, default=2, help="n_results passed to retrieve_context")
+    parser.add_argument("--concurrency", default="1,4,16", help="Concurrent /ask clients per load level")
+    parser.add_argument("--requests", type=int, default=32, help="/ask requests per load level")
+    parser.add_argument("--ollama-url", help="Use this Ollama server instead of starting the fake one")
+    parser.add_argument("--tokens-per-second", type=float, default=50, help="Fake Ollama generation speed")
+    parser.add_argument("--response-tokens", type=int, default=48, help="Fake Ollama tokens per answer")
+    parser.add_argument("--load-ms", type=float, default=2000, help="Fake Ollama model load time")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Results file (default: benchmarks/results/e2e-<time>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    args.sizes = [int(size) for size in args.sizes.split(",")]
+    args.concurrency = [int(level) for level in args.concurrency.split(",")]
+
+    workdir = tempfile.mkdtemp(prefix="bench-e2e-")
+    # Before rag is imported: keep the benchmark store away from ../embeddings
+    os.environ["EMBEDDINGS_PATH"] = os.path.join(workdir, "embeddings")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+    asked = set()
+    try:
+        results = bench_ingest_and_retrieval(args, os.path.join(workdir, "corpus"), asked)
+        if "ask" in args.scenarios:
+            results["ask"] = bench_ask(args, workdir, asked)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "started_at": started_at,
+        "machine": machine_info(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("json", "compare")},
+        "results": results,
+    }
+    print_summary(results)
+    path = args.json or os.path.join(BENCHMARKS_DIR, "results", f"e2e-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {path}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print_comparison(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# backend/benchmarks/bench_lexical.py
+"""
+Benchmark the BM25 keyword index and hybrid retrieval at scale.
+
+Builds a LexicalIndex over a synthetic corpus (Zipf-distributed vocabulary with
+rare identifiers mixed in, ~60 terms per chunk), then reports build time,
+on-disk size, load time and query latency percentiles for plain BM25 and for
+reciprocal rank fusion on top of it. With --chroma the chunks are also stored
+in a temporary Chroma collection with random unit vectors, so the vector leg
+and the full hybrid search are timed as well.
+
+Usage (from backend/):
+    python benchmarks/bench_lexical.py                   # 100k chunks
+    python benchmarks/bench_lexical.py --chunks 250000
+    python benchmarks/bench_lexical.py --chroma --json results.json
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from lexical_index import LexicalIndex
+
+VOCABULARY_SIZE = 50_000
+IDENTIFIERS = 5_000
+RRF_K = 60
+
+def synthetic_chunks(count: int, seed: int = 42) -> tuple:
+    """Chunks of Zipf-distributed words, 1 in 4 containing an identifier like ERR-1234."""
+    rng = np.random.default_rng(seed)
+    words = np.array([f"w{i}" for i in range(VOCABULARY_SIZE)])
+    identifiers = [f"ERR-{i:04d}" for i in range(IDENTIFIERS)]
+    chunks = []
+    for _ in range(count):
+        ranks = np.minimum(rng.zipf(1.2, size=60), VOCABULARY_SIZE) - 1
+        text = " ".join(words[ranks])
+        if rng.random() < 0.25:
+            text += f" failed with {identifiers[rng.integers(IDENTIFIERS)]}"
+        chunks.append(text)
+    return chunks, identifiers
+
+def percentiles(samples_ms: list) -> dict:
+    ordered = sorted(samples_ms)
+    return {f"p{p}": round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))], 3) for p in (50, 95, 99)}
+
+def timed(fn, queries: list) -> dict:
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        fn(query)
+        samples.append((time.perf_counter() - started) * 1000)
+    return percentiles(samples)
+
+def fuse(vector_ids: list, keyword_hits: list, n_results: int) -> list:
+    scores = {}
+    for rank, chunk_id in enumerate(vector_ids):
+        scores[chunk_id] = 1.0 / (RRF_K + rank + 1)
+    for rank, (chunk_id, _) in enumerate(keyword_hits):
+        scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:n_results]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100_000, help="Number of synthetic chunks")
+    parser.add_argument("--queries", type=int, default=500, help="Queries per scenario")
+    parser.add_argument("--candidates", type=int, default=20, help="Hits per retriever before fusion")
+    parser.add_argument("--chroma", action="store_true", help="Also time vector and hybrid search in Chroma")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    chunks, identifiers = synthetic_chunks(args.chunks)
+    ids = [f"chunk-{i}" for i in range(len(chunks))]
+    rng = random.Random(7)
+    queries = [
+        f"what does {rng.choice(identifiers)} mean" if i % 2 else
+        " ".join(rng.choice(chunks).split()[:8])
+        for i in range(args.queries)
+    ]
+
+    workdir = tempfile.mkdtemp(prefix="bench-lexical-")
+    results = {"chunks": len(chunks), "queries": len(queries)}
+    try:
+        path = os.path.join(workdir, "lexical_index.pkl")
+        index = LexicalIndex(path)
+        started = time.perf_counter()
+        for offset in range(0, len(chunks), 1024):
+            index.add(ids[offset:offset + 1024], chunks[offset:offset + 1024])
+        results["build_seconds"] = round(time.perf_counter() - started, 2)
+        results["build_chunks_per_second"] = round(len(chunks) / results["build_seconds"], 1)
+
+        started = time.perf_counter()
+        index.save()
+        results["save_seconds"] = round(time.perf_counter() - started, 2)
+        results["index_mb"] = round(os.path.getsize(path) / 1024 / 1024, 1)
+        started = time.perf_counter()
+        index = LexicalIndex(path)
+        results["load_seconds"] = round(time.perf_counter() - started, 2)
+
+        results["bm25_ms"] = timed(lambda q: index.search(q, args.candidates), queries)
+        fake_vector_ids = [rng.sample(ids, args.candidates) for _ in range(len(queries))]
+        pairs = list(zip(queries, fake_vector_ids))
+        results["bm25_plus_fusion_ms"] = timed(
+            lambda pair: fuse(pair[1], index.search(pair[0], args.candidates), 6), pairs
+        )
+
+        # Exact identifier queries: is the chunk containing the identifier ranked first?
+        identifier_queries = [q for q in queries if q.startswith("what does")]
+        hits = 0
+        for query in identifier_queries:
+            top = index.search(query, 1)
+            hits += bool(top) and query.split()[2] in chunks[int(top[0][0].split("-")[1])]
+        results["identifier_top1_pct"] = round(100 * hits / max(1, len(identifier_queries)), 1)
+
+        if args.chroma:
+            import chromadb
+            client = chromadb.PersistentClient(path=os.path.join(workdir, "chroma"))
+            collection = client.create_collection("bench", embedding_function=None)
+            vectors = np.random.default_rng(1).standard_normal((len(chunks), 384)).astype(np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            batch = client.get_max_batch_size()
+            started = time.perf_counter()
+            for offset in range(0, len(chunks), batch):
+                collection.add(ids=ids[offset:offset + batch], documents=chunks[offset:offset + batch],
+                               embeddings=vectors[offset:offset + batch])
+            results["chroma_load_seconds"] = round(time.perf_counter() - started, 2)
+            query_vectors = {q: vectors[rng.randrange(len(chunks))] for q in queries}
+
+            def vector(query):
+                return collection.query(query_embeddings=[query_vectors[query]], n_results=args.candidates)
+
+            def hybrid(query):
+                found = vector(query)
+                return fuse(found["ids"][0], index.search(query, args.candidates), 6)
+
+            results["vector_ms"] = timed(vector, queries)
+            results["hybrid_ms"] = timed(hybrid, queries)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{results['chunks']} chunks, {results['queries']} queries")
+    print(f"  build: {results['build_seconds']}s ({results['build_chunks_per_second']} chunks/s), "
+          f"save: {results['save_seconds']}s, load: {results['load_seconds']}s, size: {results['index_mb']} MB")
+    for key in ("bm25_ms", "bm25_plus_fusion_ms", "vector_ms", "hybrid_ms"):
+        if key in results:
+            print(f"  {key}: {results[key]}")
+    print(f"  identifier queries with the right chunk first: {results['identifier_top1_pct']}%")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
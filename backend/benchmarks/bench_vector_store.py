@@ -0,0 +1,132 @@
+# backend/benchmarks/bench_vector_store.py
+"""
+Compare the flat (brute-force) vector index with Chroma's HNSW index.
+
+For each corpus size, synthetic MiniLM-sized embeddings (384 dims, clustered
+around random topics and normalized) are stored in a temporary Chroma
+collection and in a FlatIndex per storage type. Every backend answers the same
+queries; recall@k is measured against exact float32 search, alongside query
+latency percentiles, build time and size on disk. Use the results to pick
+FLAT_MAX_CHUNKS and FLAT_DTYPE (see rag.py and flat_index.py).
+
+Usage (from backend/):
+    python benchmarks/bench_vector_store.py                       # 1k, 5k, 20k chunks
+    python benchmarks/bench_vector_store.py --chunks 2000,50000 --k 20
+    python benchmarks/bench_vector_store.py --json results.json
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from flat_index import FlatIndex
+
+DIM = 384
+
+def synthetic_embeddings(count: int, queries: int, seed: int = 42) -> tuple:
+    """Unit vectors around count/50 topic centres; queries are noisy copies of stored vectors."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((max(1, count // 50), DIM)).astype(np.float32)
+    vectors = centres[rng.integers(len(centres), size=count)] + 0.6 * rng.standard_normal((count, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    picked = vectors[rng.integers(count, size=queries)]
+    query_vectors = picked + 0.3 * rng.standard_normal(picked.shape).astype(np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    return vectors, query_vectors
+
+def percentiles(samples_ms: list) -> dict:
+    ordered = sorted(samples_ms)
+    return {f"p{p}": round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))], 3) for p in (50, 95, 99)}
+
+def directory_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return round(total / 1024 / 1024, 2)
+
+def evaluate(search, query_vectors: np.ndarray, truth: list) -> dict:
+    """Latency percentiles and mean recall of `search(vector) -> ids` against `truth`."""
+    samples, recalls = [], []
+    for query, expected in zip(query_vectors, truth):
+        started = time.perf_counter()
+        found = search(query)
+        samples.append((time.perf_counter() - started) * 1000)
+        recalls.append(len(set(found) & expected) / len(expected))
+    return {"recall": round(float(np.mean(recalls)), 4), "latency_ms": percentiles(samples)}
+
+def bench_size(count: int, args, workdir: str) -> dict:
+    vectors, query_vectors = synthetic_embeddings(count, args.queries)
+    ids = [f"chunk-{i}" for i in range(count)]
+    truth = []
+    for query in query_vectors:
+        distances = ((vectors - query) ** 2).sum(axis=1)
+        truth.append({ids[row] for row in np.argsort(distances)[:args.k]})
+    result = {"chunks": count}
+
+    import chromadb
+    chroma_path = os.path.join(workdir, f"chroma-{count}")
+    client = chromadb.PersistentClient(path=chroma_path)
+    collection = client.create_collection("bench", embedding_function=None)
+    batch = client.get_max_batch_size()
+    started = time.perf_counter()
+    for offset in range(0, count, batch):
+        collection.add(ids=ids[offset:offset + batch], embeddings=vectors[offset:offset + batch],
+                       documents=["x"] * len(ids[offset:offset + batch]))
+    chroma = {"build_seconds": round(time.perf_counter() - started, 2), "disk_mb": directory_mb(chroma_path)}
+    chroma.update(evaluate(
+        lambda query: collection.query(query_embeddings=[query], n_results=args.k, include=["distances"])["ids"][0],
+        query_vectors, truth,
+    ))
+    result["chroma"] = chroma
+
+    for dtype in ("int8", "float16"):
+        flat_path = os.path.join(workdir, f"flat-{dtype}-{count}", "flat_index.pkl")
+        os.makedirs(os.path.dirname(flat_path))
+        index = FlatIndex(flat_path, dtype=dtype)
+        started = time.perf_counter()
+        for offset in range(0, count, 1024):
+            index.add(ids[offset:offset + 1024], vectors[offset:offset + 1024])
+        index.save()
+        flat = {"build_seconds": round(time.perf_counter() - started, 2), "disk_mb": directory_mb(os.path.dirname(flat_path))}
+        # Reopen so queries run against the memory-mapped matrix, as in the server
+        index = FlatIndex(flat_path, dtype=dtype)
+        flat.update(evaluate(lambda query: [chunk_id for chunk_id, _ in index.search(query, args.k)], query_vectors, truth))
+        result[f"flat_{dtype}"] = flat
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", default="1000,5000,20000", help="Comma-separated corpus sizes")
+    parser.add_argument("--queries", type=int, default=300, help="Queries per corpus size")
+    parser.add_argument("--k", type=int, default=20, help="Neighbours per query (recall@k)")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-vector-store-")
+    results = []
+    try:
+        for count in (int(size) for size in args.chunks.split(",")):
+            results.append(bench_size(count, args, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'chunks':>8} {'backend':<13} {'recall@' + str(args.k):>9} {'p50 ms':>8} {'p95 ms':>8} {'disk MB':>8} {'build s':>8}")
+    for result in results:
+        for backend in ("chroma", "flat_int8", "flat_float16"):
+            row = result[backend]
+            print(f"{result['chunks']:>8} {backend:<13} {row['recall']:>9} {row['latency_ms']['p50']:>8} "
+                  f"{row['latency_ms']['p95']:>8} {row['disk_mb']:>8} {row['build_seconds']:>8}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"k": args.k, "queries": args.queries, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
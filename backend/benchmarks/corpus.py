@@ -0,0 +1,132 @@
+# backend/benchmarks/corpus.py
+"""
+Synthetic document corpus and questions for the end-to-end benchmarks.
+
+Each document describes one made-up system component: Markdown or plain text
+with headings and paragraphs mixing common English, shared technical terms and
+a few terms unique to that document (its component name, settings and error
+codes). Questions ask about those unique terms, so each has a known source
+document and retrieval can be checked as well as timed. Output is
+deterministic for a given seed.
+
+Usage (from backend/):
+    python benchmarks/corpus.py --out /tmp/corpus --docs 200 --words 1500
+"""
+import argparse
+import os
+import random
+
+COMMON = (
+    "the of and to in is that for it as with was on be by this are or from at an "
+    "when each which their can will after before into during between while all most"
+).split()
+TECHNICAL = (
+    "request response cache index query latency throughput buffer queue worker thread "
+    "socket timeout retry replica shard snapshot checkpoint schema migration token "
+    "session cluster node partition lease quota backoff handshake payload checksum"
+).split()
+SYLLABLES = ("ka", "lo", "mi", "ren", "tor", "vas", "el", "quin", "dar", "sef", "ny", "bro", "zu", "pel", "ix")
+ASPECTS = ("timeouts", "retries", "memory usage", "startup", "failover", "configuration", "logging", "upgrades")
+TEMPLATES = (
+    "How does {component} handle {aspect}?",
+    "What does the {setting} setting of {component} control?",
+    "What causes error {error} in {component}?",
+    "How should {component} be configured for {aspect}?",
+    "Why would {component} report {error} during {aspect}?",
+)
+
+def _name(rng: random.Random, syllables: int) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(syllables))
+
+def document_facts(index: int, seed: int = 42) -> dict:
+    """The unique component name, settings and error codes of document `index`."""
+    rng = random.Random(f"{seed}-{index}")
+    return {
+        "component": f"{_name(rng, 3).capitalize()}-{index}",
+        "settings": [f"{_name(rng, 2)}_{rng.choice(TECHNICAL)}" for _ in range(3)],
+        "errors": [f"E{index:04d}-{rng.randint(100, 999)}" for _ in range(2)],
+    }
+
+def _sentence(rng: random.Random, facts: dict) -> str:
+    words = [rng.choice(COMMON) if rng.random() < 0.6 else rng.choice(TECHNICAL) for _ in range(rng.randint(8, 24))]
+    # Sprinkle the document's own terms through the text
+    if rng.random() < 0.5:
+        words.insert(rng.randrange(len(words)), facts["component"])
+    if rng.random() < 0.2:
+        words.insert(rng.randrange(len(words)), rng.choice(facts["settings"]))
+    if rng.random() < 0.1:
+        words.insert(rng.randrange(len(words)), rng.choice(facts["errors"]))
+    return " ".join(words).capitalize() + "."
+
+def document_name(index: int) -> str:
+    """Filename of document `index`; even documents are Markdown, odd ones plain text."""
+    return f"component-{index:05d}.{'md' if index % 2 == 0 else 'txt'}"
+
+def generate_document(index: int, words: int = 1500, seed: int = 42) -> tuple:
+    """Return (filename, text) of document `index`, about `words` words long."""
+    rng = random.Random(f"{seed}-{index}-text")
+    facts = document_facts(index, seed)
+    markdown = index % 2 == 0
+    sections, count = [], 0
+    while count < words:
+        aspect = rng.choice(ASPECTS)
+        paragraphs = []
+        for _ in range(rng.randint(1, 4)):
+            sentences = [_sentence(rng, facts) for _ in range(rng.randint(3, 7))]
+            count += sum(len(sentence.split()) for sentence in sentences)
+            paragraphs.append(" ".join(sentences))
+        heading = f"{facts['component']} {aspect}"
+        sections.append(("## " if markdown else "") + heading.title() + "\n\n" + "\n\n".join(paragraphs))
+    title = f"{facts['component']} reference"
+    text = ("# " + title if markdown else title.upper()) + "\n\n" + "\n\n".join(sections) + "\n"
+    return document_name(index), text
+
+def write_corpus(out_dir: str, docs: int, words: int = 1500, seed: int = 42, start: int = 0) -> list[str]:
+    """Write documents start..start+docs-1 to `out_dir` and return their paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for index in range(start, start + docs):
+        filename, text = generate_document(index, words, seed)
+        path = os.path.join(out_dir, filename)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        paths.append(path)
+    return paths
+
+def generate_questions(count: int, docs: int, seed: int = 42) -> list[dict]:
+    """
+    `count` distinct questions about documents 0..docs-1.
+
+    Returns:
+        [{"question", "source"}], source being the filename of the document
+        the question is about
+    """
+    rng = random.Random(f"{seed}-questions-{count}-{docs}")
+    questions, seen = [], set()
+    while len(questions) < count:
+        index = rng.randrange(docs)
+        facts = document_facts(index, seed)
+        question = rng.choice(TEMPLATES).format(
+            component=facts["component"], aspect=rng.choice(ASPECTS),
+            setting=rng.choice(facts["settings"]), error=rng.choice(facts["errors"]),
+        )
+        # Retry duplicates so every question misses the answer and retrieval caches
+        if question in seen and len(seen) < docs * len(TEMPLATES) * len(ASPECTS):
+            continue
+        seen.add(question)
+        questions.append({"question": question, "source": document_name(index)})
+    return questions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="Directory to write documents to")
+    parser.add_argument("--docs", type=int, default=200, help="Number of documents")
+    parser.add_argument("--words", type=int, default=1500, help="Approximate words per document")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    paths = write_corpus(args.out, args.docs, args.words, args.seed)
+    size = sum(os.path.getsize(path) for path in paths)
+    print(f"Wrote {len(paths)} documents ({size / 1024 / 1024:.1f} MB) to {args.out}")
+
+if __name__ == "__main__":
+    main()
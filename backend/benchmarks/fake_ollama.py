@@ -0,0 +1,194 @@
+# backend/benchmarks/fake_ollama.py
+"""
+Stand-in Ollama server for benchmarks on machines without a GPU model.
+
+Implements the endpoints the backend uses (/api/generate and /api/chat,
+streaming and not, /api/tags and /api/ps) with configurable timings instead
+of a model:
+
+- prompt evaluation takes prompt_tokens / --prompt-tokens-per-second
+  (prompt tokens estimated at 4 characters each). Like Ollama, each model
+  keeps its last prompt and only evaluates what follows the longest prefix
+  shared with it (--no-prompt-cache evaluates every prompt in full)
+- tokens are generated at --tokens-per-second, up to --response-tokens or
+  the request's num_predict
+- a model that isn't loaded costs --load-ms first; at most --max-loaded
+  models stay loaded, so requests for other models evict and reload them
+- at most --parallel generations run at once per model (OLLAMA_NUM_PARALLEL);
+  the rest wait
+- --latency-ms is added before every response
+
+Responses carry the same timing fields as Ollama's (load_duration,
+prompt_eval_count/duration, eval_count/duration, in nanoseconds), so the
+backend's metrics work unchanged.
+
+Usage (from backend/):
+    python benchmarks/fake_ollama.py --port 11435 --tokens-per-second 40
+    OLLAMA_BASE_URL=http://localhost:11435 python -m uvicorn app:app
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+DEFAULTS = {
+    "tokens_per_second": 30.0,
+    "prompt_tokens_per_second": 600.0,
+    "response_tokens": 64,
+    "load_ms": 2000.0,
+    "latency_ms": 2.0,
+    "parallel": 4,
+    "max_loaded": 1,
+    "prompt_cache": True,
+    "models": ["gpt-oss:20b", "llama3:8b", "phi3:mini"],
+}
+
+WORDS = ("the", "index", "returns", "a", "chunk", "with", "context", "from", "each", "document",
+         "and", "answer", "uses", "page", "source", "query", "model", "result", "of", "in")
+
+def create_app(**settings) -> FastAPI:
+    """Fake Ollama app; keyword arguments override DEFAULTS."""
+    config = dict(DEFAULTS, **settings)
+    app = FastAPI(title="Fake Ollama")
+    loaded = OrderedDict()       # model -> load time, least recently used first
+    slots = {}                   # model -> semaphore limiting parallel generations
+    load_lock = asyncio.Lock()
+    last_prompts = {}            # model -> text of the last prompt it evaluated
+
+    async def acquire_model(model: str) -> float:
+        """Load `model` if needed (evicting the least recently used) and return the load time."""
+        async with load_lock:
+            if model in loaded:
+                loaded.move_to_end(model)
+                return 0.0
+            while len(loaded) >= config["max_loaded"]:
+                evicted, _ = loaded.popitem(last=False)
+                # Unloading a model drops its prompt cache
+                last_prompts.pop(evicted, None)
+            await asyncio.sleep(config["load_ms"] / 1000)
+            loaded[model] = time.time()
+            return config["load_ms"] / 1000
+
+    def prompt_tokens(model: str, body: dict) -> int:
+        """Prompt tokens left to evaluate after the prefix cached from the model's last prompt."""
+        if "messages" in body:
+            text = "".join(f"{message.get('role', '')}\0{message.get('content', '')}\0" for message in body["messages"])
+        else:
+            text = (body.get("system") or "") + "\0" + body.get("prompt", "")
+        cached = 0
+        if config["prompt_cache"]:
+            cached = len(os.path.commonprefix([text, last_prompts.get(model, "")]))
+            last_prompts[model] = text
+        return max(1, (len(text) - cached) // 4)
+
+    def final_stats(model: str, load: float, prompt_count: int, prompt_seconds: float, count: int, eval_seconds: float, started: float) -> dict:
+        return {
+            "model": model,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((time.perf_counter() - started) * 1e9),
+            "load_duration": int(load * 1e9),
+            "prompt_eval_count": prompt_count,
+            "prompt_eval_duration": int(prompt_seconds * 1e9),
+            "eval_count": count,
+            "eval_duration": int(eval_seconds * 1e9),
+        }
+
+    async def generate(body: dict, chat: bool):
+        """Yield Ollama response objects: one per token, then the final stats."""
+        started = time.perf_counter()
+        model = body.get("model", config["models"][0])
+        await asyncio.sleep(config["latency_ms"] / 1000)
+        load = await acquire_model(model)
+        # A request without a prompt only loads the model
+        if not chat and not body.get("prompt"):
+            yield final_stats(model, load, 0, 0.0, 0, 0.0, started)
+            return
+        semaphore = slots.setdefault(model, asyncio.Semaphore(config["parallel"]))
+        async with semaphore:
+            prompt_count = prompt_tokens(model, body)
+            prompt_seconds = prompt_count / config["prompt_tokens_per_second"]
+            await asyncio.sleep(prompt_seconds)
+            limit = body.get("options", {}).get("num_predict") or config["response_tokens"]
+            count = max(1, min(config["response_tokens"], limit))
+            interval = 1 / config["tokens_per_second"]
+            generation_started = time.perf_counter()
+            for i in range(count):
+                # Sleep until this token is due, so slow consumers don't stretch the rate
+                delay = generation_started + (i + 1) * interval - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                token = WORDS[i % len(WORDS)] + " "
+                if chat:
+                    yield {"model": model, "message": {"role": "assistant", "content": token}, "done": False}
+                else:
+                    yield {"model": model, "response": token, "done": False}
+            eval_seconds = time.perf_counter() - generation_started
+        stats = final_stats(model, load, prompt_count, prompt_seconds, count, eval_seconds, started)
+        stats.update({"message": {"role": "assistant", "content": ""}} if chat else {"response": ""})
+        yield stats
+
+    async def respond(request: Request, chat: bool):
+        body = await request.json()
+        if body.get("stream", True):
+            async def lines():
+                async for item in generate(body, chat):
+                    yield json.dumps(item) + "\n"
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
+        text, final = [], {}
+        async for item in generate(body, chat):
+            if item["done"]:
+                final = item
+            else:
+                text.append(item["message"]["content"] if chat else item["response"])
+        if chat:
+            final["message"] = {"role": "assistant", "content": "".join(text)}
+        else:
+            final["response"] = "".join(text)
+        return final
+
+    @app.post("/api/generate")
+    async def api_generate(request: Request):
+        return await respond(request, chat=False)
+
+    @app.post("/api/chat")
+    async def api_chat(request: Request):
+        return await respond(request, chat=True)
+
+    @app.get("/api/tags")
+    async def api_tags():
+        return {"models": [{"name": name, "size": 0, "modified_at": ""} for name in config["models"]]}
+
+    @app.get("/api/ps")
+    async def api_ps():
+        return {"models": [{"name": name, "model": name} for name in loaded]}
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tokens-per-second", type=float, default=DEFAULTS["tokens_per_second"])
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=DEFAULTS["prompt_tokens_per_second"])
+    parser.add_argument("--response-tokens", type=int, default=DEFAULTS["response_tokens"])
+    parser.add_argument("--load-ms", type=float, default=DEFAULTS["load_ms"])
+    parser.add_argument("--latency-ms", type=float, default=DEFAULTS["latency_ms"])
+    parser.add_argument("--parallel", type=int, default=DEFAULTS["parallel"])
+    parser.add_argument("--max-loaded", type=int, default=DEFAULTS["max_loaded"])
+    parser.add_argument("--no-prompt-cache", dest="prompt_cache", action="store_false")
+    args = parser.parse_args()
+
+    import uvicorn
+    settings = {key: value for key, value in vars(args).items() if key in DEFAULTS}
+    uvicorn.run(create_app(**settings), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
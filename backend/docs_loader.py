@@ -4,20 +4,85 @@ Document loader with support for PDF, TXT, and Markdown files.
 Handles chunking of documents for better RAG performance.
 """
 import os
+import re
+import hashlib
+import multiprocessing
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from typing import List
 from pypdf import PdfReader
+from token_counter import get_tokenizer, MODEL_MAX_TOKENS, SPECIAL_TOKENS
+from metrics import TimedIterator
+from logger import get_logger
 
-def load_pdf(file_path: str) -> str:
-    """Load and extract text from a PDF file."""
+log = get_logger(__name__)
+
+SUPPORTED_EXTENSIONS = {'.pdf', '.txt', '.md'}
+
+# ========================================
+# ⚡ CHUNKING TUNING
+# ========================================
+# 🎯 CHUNKING_MODE: How chunk sizes are measured
+#    "tokens" = sized with the embedding model's tokenizer, never exceeds its
+#               256-token input (longer chunks are silently truncated when embedded)
+#    "chars"  = legacy character-based chunking (chunk_size / overlap in characters)
+# 🎯 CHUNK_TOKENS: Tokens per chunk in "tokens" mode
+#    Lower = more precise retrieval, Higher = more context per chunk
+#    Default: 200 (fits the embedding model with room to spare)
+# 🎯 CHUNK_OVERLAP_TOKENS: Tokens shared between consecutive chunks
+# 🎯 CHUNK_CHARS / CHUNK_OVERLAP_CHARS: Sizes for "chars" mode
+CHUNKING_MODE = "tokens"
+CHUNK_TOKENS = 200
+CHUNK_OVERLAP_TOKENS = 40
+CHUNK_CHARS = 1000
+CHUNK_OVERLAP_CHARS = 200
+
+# Text tokenized at once when streaming in "tokens" mode
+TOKEN_WINDOW_CHARS = 32 * 1024
+
+def hash_file(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file's bytes, read in blocks so large files stay out of memory."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def iter_pdf_pages(file_path: str):
+    """
+    Yield (page_number, text) for each page of a PDF, one page at a time.
+    
+    Page numbers start at 1. Only the current page's text is held in memory.
+    """
     try:
         reader = PdfReader(file_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        return text
+        for page_number, page in enumerate(reader.pages, start=1):
+            yield page_number, (page.extract_text() or "") + "\n"
     except Exception as e:
         raise Exception(f"Error loading PDF {file_path}: {str(e)}")
 
+def iter_text_windows(file_path: str, window_chars: int = 64 * 1024):
+    """Yield (None, text) windows of a TXT or MD file without reading it whole."""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for window in iter(lambda: f.read(window_chars), ''):
+                yield None, window
+    except Exception as e:
+        raise Exception(f"Error loading text file {file_path}: {str(e)}")
+
+def iter_document_segments(file_path: str):
+    """Yield (page_number, text) segments of a supported document."""
+    file_ext = os.path.splitext(file_path)[1].lower()
+    if file_ext == '.pdf':
+        return iter_pdf_pages(file_path)
+    elif file_ext in ['.txt', '.md']:
+        return iter_text_windows(file_path)
+    raise ValueError(f"Unsupported file type: {file_ext}")
+
+def load_pdf(file_path: str) -> str:
+    """Load and extract text from a PDF file."""
+    return "".join(text for _, text in iter_pdf_pages(file_path))
+
 def load_text_file(file_path: str) -> str:
     """Load text from a TXT or MD file."""
     try:
@@ -26,6 +91,20 @@ def load_text_file(file_path: str) -> str:
     except Exception as e:
         raise Exception(f"Error loading text file {file_path}: {str(e)}")
 
+SENTENCE_SEPARATORS = ['. ', '.\n', '! ', '!\n', '? ', '?\n']
+
+def _chunk_end(text: str, start: int, chunk_size: int, has_more: bool) -> int:
+    """End offset of the chunk starting at `start`, preferring a sentence boundary."""
+    end = start + chunk_size
+    if has_more:
+        chunk = text[start:end]
+        # Look for sentence endings
+        for sep in SENTENCE_SEPARATORS:
+            last_sep = chunk.rfind(sep)
+            if last_sep > chunk_size * 0.7:  # Only if we're past 70% of chunk
+                return start + last_sep + 1
+    return end
+
 def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
     """
     Split text into overlapping chunks.
@@ -46,21 +125,9 @@ def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[st
     text_length = len(text)
     
     while start < text_length:
-        # Get chunk
-        end = start + chunk_size
-        chunk = text[start:end]
-        
-        # Try to break at sentence boundary if possible
-        if end < text_length:
-            # Look for sentence endings
-            for sep in ['. ', '.\n', '! ', '!\n', '? ', '?\n']:
-                last_sep = chunk.rfind(sep)
-                if last_sep > chunk_size * 0.7:  # Only if we're past 70% of chunk
-                    chunk = chunk[:last_sep + 1]
-                    end = start + last_sep + 1
-                    break
-        
-        chunks.append(chunk.strip())
+        # Get chunk, breaking at a sentence boundary if possible
+        end = _chunk_end(text, start, chunk_size, start + chunk_size < text_length)
+        chunks.append(text[start:end].strip())
         
         # Move start position with overlap
         start = end - overlap
@@ -69,18 +136,235 @@ def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[st
     
     return [c for c in chunks if c]  # Filter empty chunks
 
-def process_document(file_path: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
+def iter_chunks(segments, chunk_size: int = 1000, overlap: int = 200):
     """
-    Process a document file and return chunks.
+    Streaming version of chunk_text.
+    
+    Consumes (page_number, text) segments and yields chunks as soon as enough
+    text has arrived, so only about one chunk plus one segment is buffered at
+    a time. Produces the same chunks as chunk_text on the joined text.
+    
+    Yields:
+        Dicts with "text" and "page" (the page the chunk starts on, or None)
+    """
+    buffer = ""       # text from absolute offset `base` onwards
+    base = 0
+    start = 0         # absolute offset of the next chunk
+    pages = []        # (absolute offset, page number) where each segment starts
+    
+    def emit(has_more: bool):
+        nonlocal buffer, base, start
+        relative = start - base
+        end = _chunk_end(buffer, relative, chunk_size, has_more)
+        chunk = buffer[relative:end].strip()
+        page = next((p for offset, p in reversed(pages) if offset <= start), None)
+        
+        # Move start position with overlap and drop text before it
+        start = base + end - overlap
+        while len(pages) > 1 and pages[1][0] <= start:
+            pages.pop(0)
+        buffer = buffer[start - base:]
+        base = start
+        return {"text": chunk, "page": page} if chunk else None
+    
+    for page, text in segments:
+        if not buffer and base == 0:
+            # Match chunk_text, which strips the document before chunking
+            text = text.lstrip()
+            if not text:
+                continue
+        pages.append((base + len(buffer), page))
+        buffer += text
+        
+        # Only cut once more text follows the chunk, so boundaries match chunk_text
+        while len(buffer) - (start - base) > chunk_size:
+            chunk = emit(has_more=True)
+            if chunk:
+                yield chunk
+    
+    buffer = buffer.rstrip()
+    while start - base < len(buffer):
+        chunk = emit(has_more=start + chunk_size < base + len(buffer))
+        if chunk:
+            yield chunk
+
+# Paragraph breaks (group 1) and sentence ends (group 2), found in a single scan
+_boundaries = re.compile(r"(\n[ \t]*\n)|([.!?])(?=\s)")
+
+def _boundary_index(text: str, token_starts: list) -> tuple:
+    """
+    Precompute where paragraphs and sentences end, as token positions.
+    
+    One regex pass over the text replaces the per-chunk rfind scans of the
+    character chunker; each chunk then finds its break with a binary search.
+    
+    Returns:
+        (paragraph_ends, sentence_ends): sorted lists of token indices that
+        are valid exclusive chunk ends
+    """
+    paragraph_ends, sentence_ends = [], []
+    for match in _boundaries.finditer(text):
+        position = bisect_left(token_starts, match.end())
+        (paragraph_ends if match.group(1) else sentence_ends).append(position)
+    return paragraph_ends, sentence_ends
+
+def _token_chunk_end(start: int, limit: int, chunk_tokens: int, paragraph_ends: list, sentence_ends: list) -> int:
+    """Best exclusive end token for a chunk starting at `start`: paragraph, then sentence, then hard cut."""
+    for ends, floor in ((paragraph_ends, start + chunk_tokens * 0.5), (sentence_ends, start + chunk_tokens * 0.7)):
+        i = bisect_right(ends, limit) - 1
+        if i >= 0 and ends[i] > floor:
+            return ends[i]
+    return limit
+
+def _split_tokens(text: str, chunk_tokens: int, overlap_tokens: int, final: bool, resume: int = 0,
+                  tokenizer: str = None) -> tuple:
+    """
+    Token-sized chunks of `text`.
     
     Args:
-        file_path: Path to the document
-        chunk_size: Size of chunks in characters
-        overlap: Overlap between chunks
+        final: False while more text may follow; the chunk that would reach
+               the end of `text` is then held back until more text arrives
+        resume: Character offset of the first chunk's first token
+        tokenizer: Name of the tokenizer to measure with (default: best available)
+    
+    Returns:
+        (chunks, consumed, resume): list of (start character offset, chunk
+        text), the number of leading characters no later chunk will need, and
+        where the next chunk starts relative to `consumed`
+    """
+    chunk_tokens = min(chunk_tokens, MODEL_MAX_TOKENS - SPECIAL_TOKENS)
+    offsets = get_tokenizer(tokenizer).offsets(text)
+    n = len(offsets)
+    if n == 0:
+        return [], (len(text) if final else 0), 0
+    
+    token_starts = [s for s, _ in offsets]
+    paragraph_ends, sentence_ends = _boundary_index(text, token_starts)
+    
+    chunks = []
+    start = bisect_left(token_starts, resume)
+    while start < n:
+        limit = start + chunk_tokens
+        if limit >= n:
+            if not final:
+                break
+            end = n
+        else:
+            end = _token_chunk_end(start, limit, chunk_tokens, paragraph_ends, sentence_ends)
+        
+        chunk = text[offsets[start][0]:offsets[end - 1][1]].strip()
+        if chunk:
+            chunks.append((offsets[start][0], chunk))
+        if end >= n:
+            start = n
+            break
+        start = max(end - overlap_tokens, start + 1)
+    
+    if start >= n:
+        return chunks, len(text), 0
+    # Keep the whole word the next chunk starts in, so it re-tokenizes the same way
+    next_start = offsets[start][0]
+    consumed = next_start
+    while consumed > 0 and not text[consumed - 1].isspace():
+        consumed -= 1
+    return chunks, consumed, next_start - consumed
+
+def chunk_text_tokens(text: str, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                      tokenizer: str = None) -> List[str]:
+    """
+    Split text into overlapping chunks measured in embedding-model tokens.
+    
+    Chunks prefer to end at a paragraph break in their second half, then at a
+    sentence end in their last 30%, and never exceed the embedding model's
+    input limit.
+    
+    Args:
+        text: The text to chunk
+        chunk_tokens: Maximum tokens per chunk
+        overlap_tokens: Tokens shared between consecutive chunks
+        tokenizer: Name of the tokenizer to measure with (default: best available)
     
     Returns:
         List of text chunks
     """
+    if not text:
+        return []
+    chunks, _, _ = _split_tokens(text.strip(), chunk_tokens, overlap_tokens, final=True, tokenizer=tokenizer)
+    return [chunk for _, chunk in chunks]
+
+def iter_token_chunks(segments, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                      tokenizer: str = None):
+    """
+    Streaming version of chunk_text_tokens.
+    
+    Text is tokenized in windows of about TOKEN_WINDOW_CHARS, so memory stays
+    flat for any document size.
+    
+    Yields:
+        Dicts with "text" and "page" (the page the chunk starts on, or None)
+    """
+    buffer = ""
+    base = 0          # absolute offset of buffer[0]
+    resume = 0        # offset in buffer where the next chunk starts
+    pages = []        # (absolute offset, page number) where each segment starts
+    
+    def drain(final: bool):
+        nonlocal buffer, base, resume
+        chunks, consumed, resume = _split_tokens(buffer, chunk_tokens, overlap_tokens, final, resume, tokenizer)
+        for start, chunk in chunks:
+            absolute = base + start
+            page = next((p for offset, p in reversed(pages) if offset <= absolute), None)
+            yield {"text": chunk, "page": page}
+        buffer = buffer[consumed:]
+        base += consumed
+        while len(pages) > 1 and pages[1][0] <= base:
+            pages.pop(0)
+    
+    for page, text in segments:
+        if not buffer and base == 0:
+            text = text.lstrip()
+            if not text:
+                continue
+        pages.append((base + len(buffer), page))
+        buffer += text
+        if len(buffer) >= TOKEN_WINDOW_CHARS:
+            yield from drain(final=False)
+    
+    buffer = buffer.rstrip()
+    yield from drain(final=True)
+
+def iter_document_chunks(file_path: str, chunk_size: int = None, overlap: int = None, mode: str = None,
+                         tokenizer: str = None):
+    """
+    Stream a document's chunks with page numbers, parsing lazily.
+    
+    Peak memory stays flat regardless of file size, and callers can start
+    embedding the first chunks while later pages are still being parsed.
+    
+    Args:
+        file_path: Path to the document
+        chunk_size: Chunk size in tokens or characters, depending on mode
+        overlap: Overlap between chunks, in the same unit
+        mode: "tokens" or "chars" (default: CHUNKING_MODE)
+        tokenizer: Tokenizer measuring token chunks (default: best available);
+            pass the one the document was indexed with so its chunks keep their boundaries
+    """
+    # Parsing and chunking are timed as separate ingest stages
+    segments = TimedIterator(iter_document_segments(file_path), "ingest_parse")
+    if (mode or CHUNKING_MODE) == "tokens":
+        chunks = iter_token_chunks(segments, chunk_size or CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS if overlap is None else overlap,
+                                   tokenizer)
+    else:
+        chunks = iter_chunks(segments, chunk_size or CHUNK_CHARS, CHUNK_OVERLAP_CHARS if overlap is None else overlap)
+    return TimedIterator(chunks, "ingest_chunk", inner=segments)
+
+def load_document(file_path: str) -> str:
+    """
+    Load the cleaned text of a supported document.
+    
+    Raises:
+        ValueError: If the file type is unsupported or the document has no text
+    """
     file_ext = os.path.splitext(file_path)[1].lower()
     
     # Load document based on type
@@ -91,42 +375,108 @@ def process_document(file_path: str, chunk_size: int = 1000, overlap: int = 200)
     else:
         raise ValueError(f"Unsupported file type: {file_ext}")
     
-    # Clean and chunk text
+    # Clean text
     text = text.strip()
     if not text:
         raise ValueError(f"No text content found in {file_path}")
+    return text
+
+def process_document(file_path: str, chunk_size: int = None, overlap: int = None, mode: str = None) -> List[str]:
+    """
+    Process a document file and return chunks.
     
-    chunks = chunk_text(text, chunk_size=chunk_size, overlap=overlap)
+    Args:
+        file_path: Path to the document
+        chunk_size: Size of chunks in tokens or characters, depending on mode
+        overlap: Overlap between chunks
+        mode: "tokens" or "chars" (default: CHUNKING_MODE)
+    
+    Returns:
+        List of text chunks
+    """
+    chunks = [chunk["text"] for chunk in iter_document_chunks(file_path, chunk_size, overlap, mode)]
+    if not chunks:
+        raise ValueError(f"No text content found in {file_path}")
     
     return chunks
 
-def load_directory(directory_path: str) -> dict:
+def _chunk_records(file_path: str, tokenizer: str = None) -> List[dict]:
+    """Process-pool entry point: chunk a file, keeping page numbers."""
+    chunks = list(iter_document_chunks(file_path, tokenizer=tokenizer))
+    if not chunks:
+        raise ValueError(f"No text content found in {file_path}")
+    return chunks
+
+def list_supported_files(directory_path: str) -> List[str]:
+    """Return paths of all supported documents directly inside a directory."""
+    if not os.path.exists(directory_path):
+        return []
+    
+    paths = []
+    for filename in sorted(os.listdir(directory_path)):
+        file_path = os.path.join(directory_path, filename)
+        if os.path.isfile(file_path) and os.path.splitext(filename)[1].lower() in SUPPORTED_EXTENSIONS:
+            paths.append(file_path)
+    return paths
+
+def load_files(file_paths: List[str], max_workers: int = None, tokenizers: dict = None):
+    """
+    Parse and chunk many files in parallel.
+    
+    PDF text extraction is pure-Python and CPU bound, so files are processed
+    in a pool of worker processes rather than threads.
+    
+    Args:
+        file_paths: Documents to process
+        max_workers: Worker processes (default: one per CPU core, 1 = no pool)
+        tokenizers: Optional file path -> tokenizer name to chunk each file with
+    
+    Yields:
+        (file_path, chunks, error) tuples in completion order, where chunks
+        are {"text", "page"} dicts; `error` is None on success and `chunks`
+        is empty on failure
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    tokenizers = tokenizers or {}
+    
+    if max_workers == 1 or len(file_paths) <= 1:
+        for file_path in file_paths:
+            try:
+                yield file_path, _chunk_records(file_path, tokenizers.get(file_path)), None
+            except Exception as e:
+                yield file_path, [], e
+        return
+    
+    # "spawn" keeps workers from inheriting the parent's ONNX/Chroma threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(file_paths)), mp_context=context) as pool:
+        futures = {pool.submit(_chunk_records, file_path, tokenizers.get(file_path)): file_path for file_path in file_paths}
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                yield file_path, future.result(), None
+            except Exception as e:
+                yield file_path, [], e
+
+def load_directory(directory_path: str, max_workers: int = None) -> dict:
     """
     Load all supported documents from a directory.
     
     Args:
         directory_path: Path to directory containing documents
+        max_workers: Worker processes used for parsing (default: one per CPU core)
     
     Returns:
         Dictionary mapping filenames to their chunks
     """
-    if not os.path.exists(directory_path):
-        return {}
-    
     documents = {}
-    supported_extensions = {'.pdf', '.txt', '.md'}
     
-    for filename in os.listdir(directory_path):
-        file_path = os.path.join(directory_path, filename)
-        
-        if os.path.isfile(file_path):
-            file_ext = os.path.splitext(filename)[1].lower()
-            if file_ext in supported_extensions:
-                try:
-                    chunks = process_document(file_path)
-                    documents[filename] = chunks
-                    print(f"Loaded {filename}: {len(chunks)} chunks")
-                except Exception as e:
-                    print(f"Error loading {filename}: {e}")
+    for file_path, chunks, error in load_files(list_supported_files(directory_path), max_workers):
+        filename = os.path.basename(file_path)
+        if error is not None:
+            log.error("Error loading %s: %s", filename, error)
+            continue
+        documents[filename] = [chunk["text"] for chunk in chunks]
+        log.info("Loaded %s: %d chunks", filename, len(chunks))
     
     return documents
@@ -0,0 +1,43 @@
+# backend/embedding_client.py
+"""
+Embedding function backed by the embedding service (embedding_service.py).
+
+Drop-in replacement for Chroma's DefaultEmbeddingFunction, used by rag.py
+when EMBEDDING_SERVICE_URL is set.
+"""
+import base64
+
+import numpy as np
+import requests
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+class RemoteEmbeddingFunction(EmbeddingFunction):
+    """Embeds texts by calling the embedding service over a keep-alive session."""
+
+    def __init__(self, url: str, timeout: float = 60.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def __call__(self, input: Documents) -> Embeddings:
+        if not input:
+            return []
+        try:
+            resp = self._session.post(f"{self.url}/embed", json={"texts": list(input)}, timeout=self.timeout)
+            resp.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"Error communicating with embedding service: {str(e)}")
+        data = resp.json()
+        vectors = np.frombuffer(base64.b64decode(data["embeddings"]), dtype=np.float32)
+        return list(vectors.reshape(data["count"], data["dim"]))
+
+    @staticmethod
+    def name() -> str:
+        return "remote"
+
+    def get_config(self) -> dict:
+        return {"url": self.url}
+
+    @staticmethod
+    def build_from_config(config: dict) -> "RemoteEmbeddingFunction":
+        return RemoteEmbeddingFunction(config["url"])
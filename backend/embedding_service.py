@@ -0,0 +1,40 @@
+# backend/embedding_service.py
+"""
+Standalone embedding service for multi-worker deployments.
+
+Loads the embedding model once and serves it over HTTP, so API workers
+started with `--workers N` don't each load their own copy. Point the workers
+at it with EMBEDDING_SERVICE_URL (see embedding_client.py).
+
+Usage (from backend/):
+    uvicorn embedding_service:app --port 8002
+"""
+import base64
+
+import numpy as np
+from chromadb.utils import embedding_functions
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+app = FastAPI(title="Embedding Service")
+
+embedding_fn = embedding_functions.DefaultEmbeddingFunction()
+
+class EmbedRequest(BaseModel):
+    texts: list[str]
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+@app.post("/embed")
+def embed(req: EmbedRequest):
+    """Embed texts; vectors are returned as base64 float32 rows to keep payloads small."""
+    if not req.texts:
+        return {"count": 0, "dim": 0, "embeddings": ""}
+    vectors = np.asarray(embedding_fn(req.texts), dtype=np.float32)
+    return {
+        "count": vectors.shape[0],
+        "dim": vectors.shape[1],
+        "embeddings": base64.b64encode(vectors.tobytes()).decode("ascii"),
+    }
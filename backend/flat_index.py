@@ -0,0 +1,249 @@
+# backend/flat_index.py
+"""
+Compact exact vector index for small corpora.
+
+With a few thousand chunks, an HNSW graph is unnecessary: scoring every
+vector is cheaper than walking the graph, and it is exact. FlatIndex keeps the
+chunk embeddings as one quantized matrix (int8 with a per-row scale, or
+float16) saved as a .npy file and memory-mapped on load, and answers a query
+with a single pass of matrix-vector products. Distances are squared L2, the
+same metric the Chroma collection reports, so both backends rank and score
+hits identically (see rag.search).
+
+Deleted rows are tombstoned (their norm is set to infinity so they never
+rank) and dropped when the index is compacted on save. Each save writes a new
+matrix file and then swaps the metadata pickle atomically, so other worker
+processes can keep reading the old file until they reload.
+"""
+import glob
+import os
+import pickle
+import threading
+
+import numpy as np
+
+from logger import get_logger
+
+log = get_logger(__name__)
+
+# ========================================
+# ⚡ FLAT INDEX TUNING
+# ========================================
+# 🎯 FLAT_DTYPE: Storage type of the vectors
+#    "int8" = 1 byte per value (4x smaller than float32), fastest to score
+#    "float16" = 2 bytes per value, closer to float32 but slower on CPUs
+#    without fast half-precision conversion
+# 🎯 SCORE_BLOCK_ROWS: Rows converted to float32 per matrix-vector product
+#    Keeps the working buffer in cache (2048 x 384 float32 = 3 MB)
+# 🎯 COMPACT_RATIO: Rewrite the matrix on save once this share of rows is deleted
+FLAT_DTYPE = os.environ.get("FLAT_DTYPE", "int8")
+SCORE_BLOCK_ROWS = 2048
+COMPACT_RATIO = 0.2
+
+INDEX_FORMAT = 1
+
+def quantize(vectors: np.ndarray, dtype: str) -> tuple:
+    """Return (stored matrix, per-row scales) for float32 `vectors`."""
+    if dtype == "int8":
+        peaks = np.abs(vectors).max(axis=1)
+        scales = np.where(peaks > 0, peaks / 127, 1).astype(np.float32)
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales
+    return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+
+class FlatIndex:
+    """Quantized embedding matrix with exact top-k search, keyed by chunk ID."""
+
+    def __init__(self, path: str, dtype: str = FLAT_DTYPE):
+        if dtype not in ("int8", "float16"):
+            raise ValueError(f"unsupported flat index dtype {dtype!r}")
+        self.path = path
+        self.dtype = dtype
+        self._lock = threading.Lock()
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self._ids = []                                 # row -> chunk ID (None once deleted)
+        self._rows = {}                                # chunk ID -> row
+        self._matrix = None                            # quantized vectors, memory-mapped once saved
+        self._scales = np.zeros(0, dtype=np.float32)   # row -> dequantization scale
+        self._norms = np.zeros(0, dtype=np.float32)    # row -> squared L2 norm (inf once deleted)
+        self._appended = []                            # (matrix, scales, norms) not yet merged
+        self._matrix_file = None
+        self._dirty = False
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+            if data.get("format") != INDEX_FORMAT:
+                raise ValueError(f"unsupported format {data.get('format')}")
+            if data["dtype"] != self.dtype:
+                raise ValueError(f"stored as {data['dtype']}, configured for {self.dtype}")
+            matrix_path = os.path.join(os.path.dirname(self.path), data["matrix_file"])
+            matrix = np.load(matrix_path, mmap_mode="r") if data["ids"] else None
+        except (OSError, KeyError, ValueError, pickle.UnpicklingError, EOFError) as e:
+            log.warning("Ignoring unreadable flat index %s: %s", self.path, e)
+            return
+        self._ids = data["ids"]
+        self._scales = data["scales"]
+        self._norms = data["norms"]
+        self._matrix = matrix
+        self._matrix_file = data["matrix_file"]
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self._ids) if chunk_id is not None}
+
+    def reload(self):
+        """Re-read the index from disk (after another process changed it)."""
+        with self._lock:
+            self._reset()
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, ids: list[str], embeddings):
+        """Store vectors, replacing any already stored under the same ID."""
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        matrix, scales = quantize(vectors, self.dtype)
+        norms = np.einsum("ij,ij->i", vectors, vectors)
+        with self._lock:
+            self._remove(ids)
+            for chunk_id in ids:
+                self._rows[chunk_id] = len(self._ids)
+                self._ids.append(chunk_id)
+            self._appended.append((matrix, scales, norms))
+            self._dirty = True
+
+    def remove(self, ids: list[str]):
+        """Drop vectors from the index."""
+        with self._lock:
+            self._remove(ids)
+
+    def _remove(self, ids: list[str]):
+        for chunk_id in ids:
+            row = self._rows.pop(chunk_id, None)
+            if row is None:
+                continue
+            self._ids[row] = None
+            self._merge()
+            self._norms[row] = np.inf
+            self._dirty = True
+
+    def _merge(self):
+        """Fold appended rows into the main arrays (copies a memory-mapped matrix into RAM)."""
+        if not self._appended:
+            return
+        parts = [(self._matrix, self._scales, self._norms)] if self._matrix is not None else []
+        parts += self._appended
+        self._matrix = np.concatenate([part[0] for part in parts])
+        self._scales = np.concatenate([part[1] for part in parts])
+        self._norms = np.concatenate([part[2] for part in parts])
+        self._appended = []
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self._dirty = True
+        self.save()
+
+    def _snapshot(self) -> tuple:
+        # Arrays are replaced, never resized, so the references stay valid outside the lock
+        with self._lock:
+            self._merge()
+            return self._matrix, self._scales, self._norms, self._ids, len(self._rows)
+
+    def _distances(self, query: np.ndarray, matrix, scales, norms) -> np.ndarray:
+        dots = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), SCORE_BLOCK_ROWS):
+            block = matrix[start:start + SCORE_BLOCK_ROWS]
+            np.dot(block.astype(np.float32), query, out=dots[start:start + len(block)])
+        return np.maximum(norms + (query @ query) - 2 * dots * scales, 0)
+
+    def search(self, query_embedding, k: int = 20) -> list[tuple]:
+        """
+        Exact nearest neighbours of a query vector.
+
+        Args:
+            query_embedding: Query vector
+            k: Number of results
+
+        Returns:
+            List of (chunk ID, squared L2 distance), nearest first
+        """
+        matrix, scales, norms, ids, live = self._snapshot()
+        if matrix is None or not live:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32).ravel()
+        distances = self._distances(query, matrix, scales, norms)
+        k = min(k, live)
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        # A row deleted while scoring has an infinite distance or no ID any more
+        return [(ids[row], float(distances[row])) for row in top if ids[row] is not None and np.isfinite(distances[row])]
+
+    def distances(self, query_embedding, chunk_ids: list[str]) -> dict:
+        """Squared L2 distance from the query to each stored chunk in `chunk_ids`."""
+        with self._lock:
+            self._merge()
+            found = [(chunk_id, self._rows[chunk_id]) for chunk_id in chunk_ids if chunk_id in self._rows]
+            if not found:
+                return {}
+            rows = np.array([row for _, row in found])
+            matrix, scales, norms = self._matrix[rows], self._scales[rows], self._norms[rows]
+        query = np.asarray(query_embedding, dtype=np.float32).ravel()
+        distances = self._distances(query, matrix, scales, norms)
+        return {chunk_id: float(distance) for (chunk_id, _), distance in zip(found, distances)}
+
+    def save(self):
+        """Persist the index if it changed, compacting away deleted rows first."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._merge()
+            if len(self._rows) < len(self._ids):
+                if len(self._ids) - len(self._rows) > COMPACT_RATIO * len(self._ids) or not self._rows:
+                    self._compact()
+            directory = os.path.dirname(self.path)
+            previous = self._matrix_file
+            generation = int(previous.rsplit(".", 2)[-2]) + 1 if previous else 1
+            matrix_file = f"{os.path.basename(self.path)}.{generation}.npy"
+            if self._matrix is not None:
+                np.save(os.path.join(directory, matrix_file), self._matrix)
+            data = {
+                "format": INDEX_FORMAT,
+                "dtype": self.dtype,
+                "ids": self._ids,
+                "scales": self._scales,
+                "norms": self._norms,
+                "matrix_file": matrix_file,
+            }
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            self._matrix_file = matrix_file
+            if self._matrix is not None:
+                self._matrix = np.load(os.path.join(directory, matrix_file), mmap_mode="r")
+            self._dirty = False
+            self._remove_stale_files(matrix_file)
+
+    def _remove_stale_files(self, current: str):
+        for path in glob.glob(glob.escape(self.path) + ".*.npy"):
+            if os.path.basename(path) == current:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass   # still mapped by a reader on Windows; removed by a later save
+
+    def _compact(self):
+        alive = np.array([chunk_id is not None for chunk_id in self._ids], dtype=bool)
+        self._matrix = np.ascontiguousarray(self._matrix[alive]) if alive.any() else None
+        self._scales = self._scales[alive]
+        self._norms = self._norms[alive]
+        self._ids = [chunk_id for chunk_id in self._ids if chunk_id is not None]
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
@@ -0,0 +1,145 @@
+# backend/ingest.py
+"""
+Bulk ingestion of many documents into the RAG knowledge base.
+
+Files are parsed and chunked in a process pool while the main process embeds
+finished documents in fixed-size batches and a background thread writes them
+to Chroma, keeping every core busy on large corpora.
+
+Usage:
+    python ingest.py ../data
+    python ingest.py ../data --workers 8
+    python ingest.py ../team-docs --namespace research
+"""
+import argparse
+import os
+import threading
+import time
+
+from docs_loader import hash_file, list_supported_files, load_files
+from namespaces import DEFAULT_NAMESPACE
+from rag import ChunkWriter, document_tokenizer, index_document, is_unchanged
+
+class IngestProgress:
+    """Thread-safe counters for a running ingestion, reported via callback."""
+
+    def __init__(self, files_total: int, callback=None):
+        self.files_total = files_total
+        self.files_done = 0
+        self.files_failed = 0
+        self.files_unchanged = 0
+        self.chunks_parsed = 0
+        self.chunks_stored = 0
+        self.started_at = time.perf_counter()
+        self.errors = {}
+        self._callback = callback
+        self._lock = threading.Lock()
+
+    def file_done(self, filename: str, chunks: int, error: Exception = None):
+        with self._lock:
+            self.files_done += 1
+            if error is not None:
+                self.files_failed += 1
+                self.errors[filename] = str(error)
+            self.chunks_parsed += chunks
+        self._report()
+
+    def file_unchanged(self):
+        with self._lock:
+            self.files_done += 1
+            self.files_unchanged += 1
+        self._report()
+
+    def stored(self, chunks: int):
+        with self._lock:
+            self.chunks_stored += chunks
+        self._report()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            elapsed = time.perf_counter() - self.started_at
+            return {
+                "files_total": self.files_total,
+                "files_done": self.files_done,
+                "files_failed": self.files_failed,
+                "files_unchanged": self.files_unchanged,
+                "chunks_parsed": self.chunks_parsed,
+                "chunks_stored": self.chunks_stored,
+                "elapsed_seconds": round(elapsed, 2),
+                "chunks_per_second": round(self.chunks_stored / elapsed, 1) if elapsed > 0 else 0.0,
+                "errors": dict(self.errors),
+            }
+
+    def _report(self):
+        if self._callback:
+            self._callback(self.snapshot())
+
+def ingest_files(file_paths: list[str], max_workers: int = None, progress=None, namespace: str = DEFAULT_NAMESPACE) -> dict:
+    """
+    Parse, chunk, embed and store many documents.
+
+    Args:
+        file_paths: Documents to ingest; each is stored under its file name
+        max_workers: Parser processes (default: one per CPU core)
+        progress: Optional callback receiving a progress snapshot dict
+        namespace: Namespace to store the documents in
+
+    Returns:
+        Final progress snapshot
+    """
+    tracker = IngestProgress(len(file_paths), progress)
+
+    # Files identical to what is already indexed are skipped before parsing
+    file_hashes = {}
+    tokenizers = {}
+    changed_paths = []
+    for file_path in file_paths:
+        file_hash = hash_file(file_path)
+        if is_unchanged(os.path.basename(file_path), file_hash, namespace):
+            tracker.file_unchanged()
+        else:
+            file_hashes[file_path] = file_hash
+            tokenizers[file_path] = document_tokenizer(os.path.basename(file_path), namespace)
+            changed_paths.append(file_path)
+
+    with ChunkWriter(progress=tracker.stored, namespace=namespace) as writer:
+        for file_path, chunks, error in load_files(changed_paths, max_workers, tokenizers):
+            filename = os.path.basename(file_path)
+            if error is None and chunks:
+                index_document(filename, chunks, writer, file_hashes[file_path], os.path.getsize(file_path),
+                               tokenizers[file_path])
+            tracker.file_done(filename, len(chunks), error)
+
+    return tracker.snapshot()
+
+def ingest_directory(directory_path: str, max_workers: int = None, progress=None, namespace: str = DEFAULT_NAMESPACE) -> dict:
+    """Ingest every supported document in a directory. See ingest_files."""
+    return ingest_files(list_supported_files(directory_path), max_workers, progress, namespace)
+
+def _print_progress(snapshot: dict):
+    print(
+        f"\r[{snapshot['files_done']}/{snapshot['files_total']} files] "
+        f"{snapshot['chunks_stored']}/{snapshot['chunks_parsed']} chunks stored, "
+        f"{snapshot['chunks_per_second']} chunks/s",
+        end="",
+        flush=True,
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest documents into the RAG knowledge base.")
+    parser.add_argument("directory", help="Directory containing PDF, TXT and MD files")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--namespace", default=DEFAULT_NAMESPACE, help="Namespace to ingest into (default: %(default)s)")
+    args = parser.parse_args()
+
+    summary = ingest_directory(args.directory, args.workers, _print_progress, args.namespace)
+    print()
+    print(
+        f"Ingested {summary['files_done'] - summary['files_failed']} files "
+        f"({summary['chunks_stored']} chunks) in {summary['elapsed_seconds']}s"
+    )
+    for filename, error in summary["errors"].items():
+        print(f"  Failed {filename}: {error}")
+
+if __name__ == "__main__":
+    main()
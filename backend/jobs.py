@@ -0,0 +1,279 @@
+# backend/jobs.py
+"""
+Background ingestion jobs.
+
+/upload only saves the file and enqueues a job; a small pool of worker threads
+runs parse -> chunk -> embed -> store in the background, streaming pages
+through the chunker so embedding starts before parsing finishes. Each job is a JSON
+file under data/.jobs/, so queued or interrupted jobs are picked up again when
+the server restarts.
+
+With several API worker processes, the one holding data/.jobs/.owner.lock
+runs the jobs; the others only write new job files, which the owner picks up
+by polling, and read job status from disk. If the owner exits, another
+worker takes over and resumes its unfinished jobs.
+"""
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+from filelock import FileLock, Timeout
+
+from docs_loader import iter_document_chunks, hash_file
+from namespaces import DEFAULT_NAMESPACE
+from metrics import annotate, finish_trace, span, start_trace
+from logger import get_logger
+
+log = get_logger(__name__)
+
+# 🎯 DATA_DIR: Where uploaded documents and job files are kept (default ../data)
+DATA_DIR = os.environ.get("DATA_DIR", os.path.join(os.path.dirname(__file__), "..", "data"))
+JOBS_DIR = os.path.join(DATA_DIR, ".jobs")
+
+# ========================================
+# ⚡ INGESTION JOB TUNING
+# ========================================
+# 🎯 INGEST_WORKERS: Documents ingested at the same time
+#    Embedding already uses every core, so 2 keeps one job parsing while another embeds
+# 🎯 PROGRESS_SAVE_INTERVAL: Seconds between on-disk progress updates
+# 🎯 JOB_RETENTION_SECONDS: Finished jobs older than this are pruned on startup
+# 🎯 JOB_POLL_INTERVAL: Seconds between checks for jobs queued by other worker
+#    processes (and, in non-owner workers, for taking over job ownership)
+INGEST_WORKERS = 2
+PROGRESS_SAVE_INTERVAL = 1.0
+JOB_RETENTION_SECONDS = 24 * 3600
+JOB_POLL_INTERVAL = 1.0
+
+class JobQueue:
+    """Persistent FIFO of ingestion jobs processed by worker threads."""
+
+    def __init__(self, jobs_dir: str = JOBS_DIR, workers: int = INGEST_WORKERS):
+        self.jobs_dir = jobs_dir
+        self.workers = workers
+        self._jobs = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stopping = threading.Event()
+        self._owner_lock = FileLock(os.path.join(jobs_dir, ".owner.lock"), thread_local=False)
+        self._owner = False
+        self._poller = None
+
+    def start(self):
+        """Run the jobs if no other worker process does, and watch for new or orphaned jobs."""
+        if self._poller:
+            return
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self._stopping.clear()
+        self._try_own()
+        self._poller = threading.Thread(target=self._poll, name="ingest-poller", daemon=True)
+        self._poller.start()
+
+    def _try_own(self) -> bool:
+        """Become the process that runs jobs, if the owner lock is free."""
+        try:
+            self._owner_lock.acquire(timeout=0)
+        except Timeout:
+            return False
+        self._owner = True
+        self._resume()
+        return True
+
+    def _poll(self):
+        while not self._stopping.wait(JOB_POLL_INTERVAL):
+            if not self._owner:
+                self._try_own()
+                continue
+            # Pick up jobs that other worker processes queued
+            for name in os.listdir(self.jobs_dir):
+                job_id = name[:-len(".json")]
+                if not name.endswith(".json") or job_id in self._jobs:
+                    continue
+                job = self._read(job_id)
+                if job is not None and job["status"] == "queued":
+                    with self._lock:
+                        self._jobs[job_id] = job
+                    self._queue.put(job_id)
+
+    def _read(self, job_id: str) -> dict:
+        try:
+            with open(os.path.join(self.jobs_dir, f"{job_id}.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _resume(self):
+        """Load jobs from disk, re-enqueue unfinished ones and start the workers."""
+        now = time.time()
+
+        pending = []
+        for name in os.listdir(self.jobs_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.jobs_dir, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    job = json.load(f)
+            except (OSError, ValueError) as e:
+                log.warning("Skipping unreadable job file %s: %s", name, e)
+                continue
+
+            if job["status"] in ("done", "failed"):
+                if now - (job.get("finished_at") or now) > JOB_RETENTION_SECONDS:
+                    os.remove(path)
+                    continue
+            else:
+                # Interrupted mid-run: start over from the saved file
+                job.update(status="queued", stage="queued", chunks_parsed=0, chunks_done=0)
+                pending.append(job)
+            self._jobs[job["id"]] = job
+
+        for job in sorted(pending, key=lambda j: j["created_at"]):
+            self._save(job)
+            self._queue.put(job["id"])
+        if pending:
+            log.info("Resuming %d ingestion job(s)", len(pending))
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"ingest-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Ask workers to exit after their current job and hand off job ownership."""
+        self._stopping.set()
+        for _ in self._threads:
+            self._queue.put(None)
+        self._threads = []
+        self._poller = None
+        if self._owner:
+            self._owner = False
+            self._owner_lock.release()
+
+    def submit(self, file_path: str, filename: str, file_hash: str = None, namespace: str = DEFAULT_NAMESPACE) -> dict:
+        """Enqueue a saved file for ingestion into `namespace` and return the new job (pass file_hash if already known)."""
+        job = {
+            "id": uuid.uuid4().hex,
+            "filename": filename,
+            "namespace": namespace,
+            "file_path": os.path.abspath(file_path),
+            "file_hash": file_hash,
+            "status": "queued",
+            "stage": "queued",
+            "chunks_total": None,
+            "chunks_parsed": 0,
+            "chunks_done": 0,
+            "chunks_per_second": None,
+            "changes": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        # Jobs submitted to a non-owner worker are picked up from disk by the owner
+        if self._owner:
+            with self._lock:
+                self._jobs[job["id"]] = job
+        self._save(job)
+        if self._owner:
+            self._queue.put(job["id"])
+        return dict(job)
+
+    def get(self, job_id: str) -> dict:
+        """Return a snapshot of a job, or None if unknown."""
+        if self._owner:
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job:
+                    return dict(job)
+        # Another process runs the job and saves its progress to disk
+        if not all(c in "0123456789abcdef" for c in job_id):
+            return None
+        return self._read(job_id)
+
+    def _save(self, job: dict):
+        with self._lock:
+            data = json.dumps(job)
+        path = os.path.join(self.jobs_dir, f"{job['id']}.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _update(self, job: dict, **fields):
+        with self._lock:
+            job.update(fields)
+        self._save(job)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            job_id = self._queue.get()
+            if job_id is None:
+                break
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != "queued":
+                continue
+            trace = start_trace(job=job_id, filename=job["filename"], namespace=job.get("namespace", DEFAULT_NAMESPACE))
+            try:
+                self._process(job)
+                annotate(chunks=job.get("chunks_total", 0))
+                finish_trace("ingest", trace)
+            except Exception as e:
+                log.error("Ingestion job %s failed: %s", job_id, e)
+                self._update(job, status="failed", error=str(e), finished_at=time.time())
+                finish_trace("ingest", trace, status="error")
+
+    def _process(self, job: dict):
+        # Imported here so importing jobs (and app) doesn't open the vector store
+        from rag import ChunkWriter, document_tokenizer, index_document, is_unchanged
+
+        # Jobs queued before namespaces existed belong to the default namespace
+        namespace = job.get("namespace", DEFAULT_NAMESPACE)
+        started_at = time.time()
+        self._update(job, status="running", stage="hashing", started_at=started_at)
+        file_hash = job.get("file_hash")
+        if not file_hash:
+            with span("ingest_hash"):
+                file_hash = hash_file(job["file_path"])
+        if is_unchanged(job["filename"], file_hash, namespace):
+            self._update(job, status="done", stage="unchanged", chunks_total=0, finished_at=time.time())
+            return
+
+        self._update(job, stage="indexing", chunks_parsed=0)
+        last_save = [time.monotonic()]
+
+        def save_throttled():
+            if time.monotonic() - last_save[0] >= PROGRESS_SAVE_INTERVAL:
+                last_save[0] = time.monotonic()
+                self._save(job)
+
+        def on_stored(count: int):
+            with self._lock:
+                job["chunks_done"] += count
+                elapsed = time.time() - started_at
+                job["chunks_per_second"] = round(job["chunks_done"] / elapsed, 1) if elapsed > 0 else None
+            save_throttled()
+
+        def counted(chunks):
+            for chunk in chunks:
+                with self._lock:
+                    job["chunks_parsed"] += 1
+                yield chunk
+            save_throttled()
+
+        tokenizer = document_tokenizer(job["filename"], namespace)
+        with ChunkWriter(progress=on_stored, namespace=namespace) as writer:
+            chunks = counted(iter_document_chunks(job["file_path"], tokenizer=tokenizer))
+            changes = index_document(job["filename"], chunks, writer, file_hash, os.path.getsize(job["file_path"]),
+                                     tokenizer)
+            if not job["chunks_parsed"]:
+                raise ValueError(f"No text content found in {job['filename']}")
+            self._update(job, stage="storing", changes=changes, chunks_total=job["chunks_parsed"])
+
+        # Unchanged chunks count as done even though nothing was written for them
+        self._update(job, status="done", stage="done", chunks_done=job["chunks_total"], finished_at=time.time())
+
+job_queue = JobQueue()
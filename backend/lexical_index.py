@@ -0,0 +1,238 @@
+# backend/lexical_index.py
+"""
+BM25 keyword index over the stored chunks.
+
+Dense retrieval misses exact identifiers, error codes and names. This index
+is kept in sync with the Chroma collection at ingest time and its results are
+fused with the vector hits (see rag.search).
+
+Postings are stored per term as two packed arrays (chunk slot as uint32, term
+frequency as uint16) and scored with numpy views of those arrays, so a query
+costs a few vectorized passes over the postings of its terms. Deleted chunks
+are tombstoned and dropped when the index is compacted on save. The index is
+pickled to a single file next to the Chroma database.
+"""
+import os
+import pickle
+import re
+import threading
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from logger import get_logger
+
+log = get_logger(__name__)
+
+# ========================================
+# ⚡ LEXICAL INDEX TUNING
+# ========================================
+# 🎯 BM25_K1: Term frequency saturation (higher = repeated terms count for more)
+# 🎯 BM25_B: Length normalization (0 = none, 1 = full)
+#    Defaults: 1.2 / 0.75 (standard BM25)
+# 🎯 COMPACT_RATIO: Rewrite postings on save once this share of slots is deleted
+BM25_K1 = 1.2
+BM25_B = 0.75
+COMPACT_RATIO = 0.2
+
+INDEX_FORMAT = 1
+MAX_TF = 65535
+
+# Words plus identifiers joined by - . : / (e.g. ERR-404, v2.4.1, pkg.module)
+_term = re.compile(r"\w+(?:[-.:/]\w+)*")
+_part = re.compile(r"\w+")
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased terms; compound identifiers are indexed whole and by their parts."""
+    terms = []
+    for match in _term.finditer(text.lower()):
+        term = match.group()
+        terms.append(term)
+        parts = _part.findall(term)
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+class LexicalIndex:
+    """Incrementally updated BM25 inverted index keyed by chunk ID."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self._ids = []                  # slot -> chunk ID (None once deleted)
+        self._slots = {}                # chunk ID -> slot
+        self._lengths = array("I")      # slot -> number of terms (0 once deleted)
+        self._postings = {}             # term -> (array("I") slots, array("H") tfs)
+        self._total_length = 0
+        self._dirty = False
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+            if data.get("format") != INDEX_FORMAT:
+                raise ValueError(f"unsupported format {data.get('format')}")
+        except (OSError, ValueError, pickle.UnpicklingError, EOFError) as e:
+            log.warning("Ignoring unreadable lexical index %s: %s", self.path, e)
+            return
+        self._ids = data["ids"]
+        self._lengths = data["lengths"]
+        self._postings = data["postings"]
+        self._slots = {chunk_id: slot for slot, chunk_id in enumerate(self._ids) if chunk_id is not None}
+        self._total_length = sum(self._lengths)
+
+    def reload(self):
+        """Re-read the index from disk (after another process changed it)."""
+        with self._lock:
+            self._reset()
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def add(self, ids: list[str], texts: list[str]):
+        """Index chunks, replacing any already indexed under the same ID."""
+        with self._lock:
+            self._remove(ids)
+            for chunk_id, text in zip(ids, texts):
+                counts = Counter(tokenize(text))
+                slot = len(self._ids)
+                self._ids.append(chunk_id)
+                self._slots[chunk_id] = slot
+                # Every live chunk has length >= 1 so a 0 length marks a tombstone
+                length = max(1, sum(counts.values()))
+                self._lengths.append(length)
+                self._total_length += length
+                for term, tf in counts.items():
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = self._postings[term] = (array("I"), array("H"))
+                    postings[0].append(slot)
+                    postings[1].append(min(tf, MAX_TF))
+            self._dirty = True
+
+    def remove(self, ids: list[str]):
+        """Drop chunks from the index."""
+        with self._lock:
+            self._remove(ids)
+
+    def _remove(self, ids: list[str]):
+        for chunk_id in ids:
+            slot = self._slots.pop(chunk_id, None)
+            if slot is None:
+                continue
+            self._total_length -= self._lengths[slot]
+            self._lengths[slot] = 0
+            self._ids[slot] = None
+            self._dirty = True
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self._dirty = True
+        self.save()
+
+    def search(self, query: str, k: int = 20) -> list[tuple]:
+        """
+        Rank chunks against `query` with BM25.
+
+        Args:
+            query: Free-text query
+            k: Number of results
+
+        Returns:
+            List of (chunk ID, score), best first
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            if not self._slots:
+                return []
+            scores = self._score(terms)
+            matched = np.count_nonzero(scores)
+            if not matched:
+                return []
+            k = min(k, matched)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self._ids[slot], float(scores[slot])) for slot in top]
+
+    def idf(self, terms) -> dict:
+        """BM25 inverse document frequency of each term (0 for unknown terms)."""
+        with self._lock:
+            live = len(self._slots)
+            weights = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                df = len(postings[0]) if postings is not None else 0
+                weights[term] = float(np.log(1 + (live - df + 0.5) / (df + 0.5))) if df else 0.0
+            return weights
+
+    def _score(self, terms: set) -> np.ndarray:
+        # numpy views pin the arrays' buffers, so they must not outlive the lock
+        live = len(self._slots)
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+        avg_length = self._total_length / live
+        norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths.astype(np.float32) / avg_length)
+        scores = np.zeros(len(lengths), dtype=np.float32)
+
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            slots = np.frombuffer(postings[0], dtype=np.uint32)
+            tfs = np.frombuffer(postings[1], dtype=np.uint16).astype(np.float32)
+            df = len(slots)
+            idf = np.log(1 + (live - df + 0.5) / (df + 0.5))
+            # Slots are unique within a term's postings, so fancy-index += is safe
+            scores[slots] += idf * tfs * (BM25_K1 + 1) / (tfs + norms[slots])
+
+        scores[lengths == 0] = 0
+        return scores
+
+    def save(self):
+        """Persist the index if it changed, compacting away deleted chunks first."""
+        with self._lock:
+            if not self._dirty:
+                return
+            dead = len(self._ids) - len(self._slots)
+            if dead and dead > COMPACT_RATIO * len(self._ids):
+                self._compact()
+            data = {
+                "format": INDEX_FORMAT,
+                "ids": self._ids,
+                "lengths": self._lengths,
+                "postings": self._postings,
+            }
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    def _compact(self):
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+        alive = lengths > 0
+        new_slots = (np.cumsum(alive) - 1).astype(np.uint32)
+        postings = {}
+        for term, (slots, tfs) in self._postings.items():
+            slots = np.frombuffer(slots, dtype=np.uint32)
+            keep = alive[slots]
+            if keep.any():
+                postings[term] = (
+                    array("I", new_slots[slots[keep]].tobytes()),
+                    array("H", np.frombuffer(tfs, dtype=np.uint16)[keep].tobytes()),
+                )
+        self._postings = postings
+        self._lengths = array("I", lengths[alive].tobytes())
+        del lengths
+        self._ids = [chunk_id for chunk_id in self._ids if chunk_id is not None]
+        self._slots = {chunk_id: slot for slot, chunk_id in enumerate(self._ids)}
@@ -0,0 +1,46 @@
+# backend/logger.py
+"""
+Low-overhead logging for the backend modules.
+
+Records are handed to a queue and written by a background thread, so a
+request never waits on console or file I/O. All module loggers hang off the
+"backend" logger, which doesn't propagate to the root logger and so doesn't
+interfere with uvicorn's own logging configuration.
+
+Usage:
+    from logger import get_logger
+    log = get_logger(__name__)
+    log.info("Loaded %s: %d chunks", filename, count)   # formatted only if enabled
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+
+# ========================================
+# ⚡ LOGGING
+# ========================================
+# 🎯 LOG_LEVEL: DEBUG, INFO, WARNING or ERROR (default INFO)
+#    Records below the level are dropped before their message is formatted
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_root = logging.getLogger("backend")
+
+def _configure():
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = logging.handlers.QueueListener(records, handler)
+    listener.start()
+    atexit.register(listener.stop)
+    _root.addHandler(logging.handlers.QueueHandler(records))
+    _root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+    _root.propagate = False
+
+_configure()
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger for a backend module (pass __name__)."""
+    return _root.getChild(name)
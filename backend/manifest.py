@@ -0,0 +1,137 @@
+# backend/manifest.py
+"""
+Per-document manifest of indexed chunks, doubling as the document registry.
+
+For every document the manifest records the hash of the source file and the
+ordered content hashes of its chunks, plus its chunk count, file size and
+ingest time so the document list is served without scanning the collection. Re-indexing compares a new version
+against this record, so only added chunks are embedded, removed chunks are
+deleted and unchanged files are skipped without parsing. A reverse index from
+chunk hash to documents lets identical content under another name reuse
+stored embeddings instead of embedding it again.
+"""
+import json
+import os
+import threading
+
+from logger import get_logger
+
+log = get_logger(__name__)
+
+class Manifest:
+    """
+    JSON-backed mapping of document ID -> record.
+
+    Records hold "file_hash", "chunks" (content hashes in order), "chunk_count",
+    "size" (source file bytes) and "ingested_at". Records with "legacy" set
+    describe documents stored before chunk IDs were content-addressed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._documents = {}
+        self._owners = {}   # chunk hash -> set of document IDs
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._documents = json.load(f).get("documents", {})
+        except (OSError, ValueError) as e:
+            log.warning("Ignoring unreadable manifest %s: %s", self.path, e)
+            self._documents = {}
+        for doc_id, record in self._documents.items():
+            for content_hash in record.get("chunks", []):
+                self._owners.setdefault(content_hash, set()).add(doc_id)
+
+    def reload(self):
+        """Re-read the manifest from disk (after another process changed it)."""
+        with self._lock:
+            self._documents = {}
+            self._owners = {}
+            self._load()
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"documents": self._documents}, f)
+        os.replace(tmp_path, self.path)
+
+    def get(self, doc_id: str) -> dict:
+        """Return a copy of a document's record, or None if it was never indexed."""
+        with self._lock:
+            record = self._documents.get(doc_id)
+            return dict(record) if record is not None else None
+
+    def documents(self) -> list[dict]:
+        """Summary of every document (without its chunk hashes), sorted by name."""
+        with self._lock:
+            return [
+                {
+                    "name": doc_id,
+                    "chunks": record.get("chunk_count", len(record.get("chunks", []))),
+                    "size": record.get("size"),
+                    "file_hash": record.get("file_hash"),
+                    "ingested_at": record.get("ingested_at"),
+                }
+                for doc_id, record in sorted(self._documents.items())
+            ]
+
+    def total_chunks(self) -> int:
+        with self._lock:
+            return sum(record.get("chunk_count", len(record.get("chunks", []))) for record in self._documents.values())
+
+    def owners(self, content_hash: str) -> set:
+        """Documents that currently contain a chunk with this content hash."""
+        with self._lock:
+            return set(self._owners.get(content_hash, ()))
+
+    def find_file(self, file_hash: str) -> list[str]:
+        """Documents indexed from a file with this hash."""
+        with self._lock:
+            return sorted(doc_id for doc_id, record in self._documents.items() if record.get("file_hash") == file_hash)
+
+    def set(self, doc_id: str, record: dict):
+        """Replace a document's record and persist the manifest."""
+        with self._lock:
+            self._unlink(doc_id)
+            self._documents[doc_id] = record
+            for content_hash in record.get("chunks", []):
+                self._owners.setdefault(content_hash, set()).add(doc_id)
+            self._save()
+
+    def set_many(self, records: dict):
+        """Replace several documents' records with a single write."""
+        with self._lock:
+            for doc_id, record in records.items():
+                self._unlink(doc_id)
+                self._documents[doc_id] = record
+                for content_hash in record.get("chunks", []):
+                    self._owners.setdefault(content_hash, set()).add(doc_id)
+            self._save()
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            self._unlink(doc_id)
+            self._documents.pop(doc_id, None)
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self._owners.clear()
+            self._save()
+
+    def _unlink(self, doc_id: str):
+        old = self._documents.get(doc_id)
+        if not old:
+            return
+        for content_hash in old.get("chunks", []):
+            docs = self._owners.get(content_hash)
+            if docs is not None:
+                docs.discard(doc_id)
+                if not docs:
+                    del self._owners[content_hash]
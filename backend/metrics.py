@@ -0,0 +1,275 @@
+# backend/metrics.py
+"""
+In-process metrics and per-request timing spans.
+
+Every stage of a question (query embedding, vector and keyword search,
+reranking, prompt assembly, Ollama prompt evaluation and generation, time to
+first token) and of an ingestion (parse, chunk, embed, store) is timed with
+span() or record_stage(). Each measurement goes into a Prometheus histogram,
+served by GET /metrics, and into the current request's trace. The trace is
+logged as one structured line when the request finishes.
+
+Metrics are plain Python objects guarded by a lock per metric; an observation
+costs a bisect and an add. They are per process, so with `--workers N` each
+worker exposes its own numbers (scrape every worker or use sticky routing).
+"""
+import bisect
+import contextlib
+import contextvars
+import json
+import logging
+import threading
+import time
+
+from logger import get_logger
+
+log = get_logger(__name__)
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow generations
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300)
+TOKEN_COUNT_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+_registry = []
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Histogram:
+    """Fixed-bucket histogram, optionally split by label values."""
+
+    def __init__(self, name: str, help: str, buckets, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._series = {}   # label values -> [bucket counts (last is +Inf), sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self, *labels) -> dict:
+        """Count, sum, mean and cumulative bucket counts of one series."""
+        with self._lock:
+            counts, total, count = self._series.get(labels, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            cumulative, running = {}, 0
+            for bound, bucket in zip(self.buckets + ("+Inf",), counts):
+                running += bucket
+                cumulative[str(bound)] = running
+            return {
+                "count": count,
+                "sum": round(total, 6),
+                "mean": round(total / count, 6) if count else 0.0,
+                "buckets": cumulative,
+            }
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+            for labels, (counts, total, count) in series:
+                running = 0
+                for bound, bucket in zip(self.buckets + ("+Inf",), counts):
+                    running += bucket
+                    le = f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {running}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+class Counter:
+    """Monotonic counter, optionally split by label values."""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+class Gauge:
+    """Gauge read from a callback at scrape time; the callback returns {label values: value}."""
+
+    def __init__(self, name: str, help: str, callback, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        _registry.append(self)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.callback()
+        except Exception as e:
+            log.warning("Gauge %s failed: %s", self.name, e)
+            return lines
+        for labels, value in sorted(values.items()):
+            if value is not None:
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# ========================================
+# Shared metrics
+# ========================================
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds", "Time spent in each stage of answering or ingesting", SECONDS_BUCKETS, ("stage",))
+REQUEST_SECONDS = Histogram(
+    "rag_request_seconds", "End-to-end request time", SECONDS_BUCKETS, ("endpoint",))
+REQUESTS = Counter("rag_requests_total", "Requests by endpoint and outcome", ("endpoint", "status"))
+TIME_TO_FIRST_TOKEN = Histogram(
+    "rag_time_to_first_token_seconds", "Time from request arrival to the first streamed answer batch", SECONDS_BUCKETS)
+OLLAMA_LOAD_SECONDS = Histogram(
+    "ollama_load_seconds", "Time Ollama spent loading the model for a request", SECONDS_BUCKETS, ("model",))
+OLLAMA_PROMPT_EVAL_SECONDS = Histogram(
+    "ollama_prompt_eval_seconds", "Time Ollama spent evaluating the prompt", SECONDS_BUCKETS, ("model",))
+OLLAMA_PROMPT_TOKENS = Histogram(
+    "ollama_prompt_eval_tokens", "Prompt tokens Ollama evaluated (low when its prompt cache was reused)",
+    TOKEN_COUNT_BUCKETS, ("model",))
+OLLAMA_TOKENS_PER_SECOND = Histogram(
+    "ollama_generation_tokens_per_second", "Generation speed (eval_count / eval_duration)",
+    TOKENS_PER_SECOND_BUCKETS, ("model",))
+OLLAMA_GENERATED_TOKENS = Counter("ollama_generated_tokens_total", "Tokens generated by Ollama", ("model",))
+
+# ========================================
+# Per-request traces
+# ========================================
+_trace = contextvars.ContextVar("trace", default=None)
+
+def start_trace(**fields) -> dict:
+    """
+    Start collecting spans for the current request.
+
+    The trace is a plain dict shared with worker threads started through
+    asyncio.to_thread, which copy the current context.
+    """
+    trace = {"fields": dict(fields), "stages": {}, "started": time.perf_counter()}
+    _trace.set(trace)
+    return trace
+
+def annotate(**fields):
+    """Attach values (token counts, model, ...) to the current trace."""
+    trace = _trace.get()
+    if trace is not None:
+        trace["fields"].update(fields)
+
+def record_stage(stage: str, seconds: float):
+    """Record one measured stage in the histogram and the current trace."""
+    STAGE_SECONDS.observe(seconds, stage)
+    trace = _trace.get()
+    if trace is not None:
+        stages = trace["stages"]
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+@contextlib.contextmanager
+def span(stage: str):
+    """Time the enclosed block as `stage`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+class TimedIterator:
+    """
+    Iterable that records the time spent producing items of `iterable` as `stage`.
+
+    Time spent inside `inner` (a TimedIterator feeding `iterable`) is left out,
+    so nested generators, such as a chunker reading from a parser, are timed
+    as separate stages. The stage is recorded once iteration ends.
+    """
+
+    def __init__(self, iterable, stage: str, inner: "TimedIterator" = None):
+        self.iterable = iterable
+        self.stage = stage
+        self.inner = inner
+        self.seconds = 0.0
+
+    def __iter__(self):
+        iterator = iter(self.iterable)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self.seconds += time.perf_counter() - started
+                yield item
+        finally:
+            record_stage(self.stage, self.seconds - (self.inner.seconds if self.inner else 0.0))
+
+def finish_trace(endpoint: str, trace: dict, status: str = "ok", **fields):
+    """Record the request's total time and outcome and log its trace as one JSON line."""
+    if trace is None or trace.get("finished"):
+        return
+    trace["finished"] = True
+    trace["fields"].update(fields)
+    total = time.perf_counter() - trace["started"]
+    REQUEST_SECONDS.observe(total, endpoint)
+    REQUESTS.inc(1, endpoint, status)
+    if log.isEnabledFor(logging.INFO):
+        entry = {"endpoint": endpoint, "status": status, "total_ms": round(total * 1000, 1)}
+        entry.update({f"{stage}_ms": round(seconds * 1000, 1) for stage, seconds in trace["stages"].items()})
+        entry.update(trace["fields"])
+        log.info("%s", json.dumps(entry, default=str))
+
+def record_generation(data: dict, model: str = None):
+    """Record Ollama's timing fields from the final response of a generation."""
+    model = model or data.get("model") or "unknown"
+    fields = {}
+    if data.get("load_duration"):
+        OLLAMA_LOAD_SECONDS.observe(data["load_duration"] / 1e9, model)
+    if "prompt_eval_count" in data:
+        OLLAMA_PROMPT_TOKENS.observe(data["prompt_eval_count"], model)
+        fields["prompt_eval_tokens"] = data["prompt_eval_count"]
+    if data.get("prompt_eval_duration"):
+        record_stage("ollama_prompt_eval", data["prompt_eval_duration"] / 1e9)
+        OLLAMA_PROMPT_EVAL_SECONDS.observe(data["prompt_eval_duration"] / 1e9, model)
+    if data.get("eval_count"):
+        OLLAMA_GENERATED_TOKENS.inc(data["eval_count"], model)
+        fields["eval_tokens"] = data["eval_count"]
+        if data.get("eval_duration"):
+            record_stage("ollama_generation", data["eval_duration"] / 1e9)
+            tokens_per_second = data["eval_count"] / (data["eval_duration"] / 1e9)
+            OLLAMA_TOKENS_PER_SECOND.observe(tokens_per_second, model)
+            fields["tokens_per_second"] = round(tokens_per_second, 1)
+    fields["model"] = model
+    annotate(**fields)
@@ -0,0 +1,291 @@
+# backend/model_router.py
+"""
+Per-model configuration, concurrency limits and routing for Ollama requests.
+
+Ollama keeps only a few models in memory (OLLAMA_MAX_LOADED_MODELS, often 1
+on a GPU). Interleaving requests for different models makes it unload and
+reload them constantly, and each swap of a large model takes seconds. The
+router therefore:
+
+- reads per-model options (threads, GPU layers, context size, keep_alive,
+  concurrency limit) from models.json instead of code constants
+- queues requests per model, with at most `max_concurrent` running each
+- admits a model that is not running only while fewer than
+  `max_loaded_models` models are busy or Ollama already has it loaded (from
+  /api/ps), so requests are served in groups per model. Once a queued model
+  has waited `switch_after_seconds`, running models stop taking new requests
+  and drain, and the waiting model gets its turn
+- optionally sends simple questions (short question, small prompt) to a
+  smaller model, configured per model with "route_simple_to", when that
+  doesn't force Ollama to swap models
+- picks the model for background conversation summaries ("summary_model"),
+  under the same no-swap rule (see summaries.py)
+- runs background requests (summaries) at low priority: at most one per
+  model, only while no answer is waiting for a slot, and never in a model's
+  last free slot, so they can't delay the answering model
+"""
+import asyncio
+import contextlib
+import copy
+import itertools
+import json
+import os
+import time
+from collections import deque
+
+from logger import get_logger
+from metrics import Gauge
+
+log = get_logger(__name__)
+
+# 🎯 MODELS_CONFIG: Path of the model configuration file (see models.json)
+MODELS_CONFIG = os.environ.get("MODELS_CONFIG", os.path.join(os.path.dirname(__file__), "models.json"))
+
+# Used when models.json is missing; mirrors the shipped file
+DEFAULT_CONFIG = {
+    "default_model": "gpt-oss:20b",
+    "max_loaded_models": 1,
+    "switch_after_seconds": 2.0,
+    "residency_ttl_seconds": 5.0,
+    "simple_max_words": 16,
+    "simple_max_prompt_tokens": 1024,
+    "summary_model": "phi3:mini",
+    "defaults": {
+        "max_concurrent": 4,
+        "keep_alive": "30m",
+        "num_ctx": 4096,
+        "options": {"num_thread": 8, "num_gpu": 1},
+    },
+    "models": {},
+}
+
+def load_config(path: str = MODELS_CONFIG) -> dict:
+    """Read the model configuration, falling back to DEFAULT_CONFIG for missing keys."""
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    if not os.path.exists(path):
+        return config
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            loaded = json.load(f)
+    except (OSError, ValueError) as e:
+        log.warning("Ignoring unreadable model config %s: %s", path, e)
+        return config
+    defaults = dict(config["defaults"], **loaded.pop("defaults", {}))
+    defaults["options"] = dict(DEFAULT_CONFIG["defaults"]["options"], **defaults.get("options", {}))
+    config.update(loaded)
+    config["defaults"] = defaults
+    return config
+
+class ModelRouter:
+    """
+    Routing policy plus a model-aware admission queue.
+
+    slot() is used around every generation; model_settings() supplies the
+    per-model request options.
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.max_loaded = max(1, int(config["max_loaded_models"]))
+        self.switch_after = float(config["switch_after_seconds"])
+        self.residency_ttl = float(config["residency_ttl_seconds"])
+        self.resident = set()          # models Ollama reported as loaded
+        self.residency_checked = 0.0
+        self._active = {}              # model -> running requests
+        self._queued = {}              # model -> deque of (enqueue time, ticket)
+        self._background_queued = {}   # same, for background requests
+        self._background_active = {}   # model -> running background requests
+        self._tickets = itertools.count()
+        self._routed = {}              # "from -> to" -> count
+        self._switched_at = 0.0        # when a model last started running alongside or after others
+        self._condition = None         # created inside the running event loop
+
+    @property
+    def default_model(self) -> str:
+        return self.config["default_model"]
+
+    def model_settings(self, model: str) -> dict:
+        """Effective settings of `model`: defaults overlaid with its entry in models.json."""
+        defaults = self.config["defaults"]
+        entry = self.config["models"].get(model, {})
+        settings = dict(defaults, **entry)
+        settings["options"] = dict(defaults.get("options", {}), **entry.get("options", {}))
+        return settings
+
+    def limit(self, model: str) -> int:
+        return max(1, int(self.model_settings(model)["max_concurrent"]))
+
+    def num_ctx(self, model: str) -> int:
+        """Largest context window `model` is run with: its "num_ctx" in models.json."""
+        return int(self.model_settings(model or self.default_model)["num_ctx"])
+
+    def set_resident(self, models):
+        """Record the models Ollama currently has loaded (from /api/ps)."""
+        self.resident = set(models)
+        self.residency_checked = time.monotonic()
+
+    def residency_stale(self) -> bool:
+        return time.monotonic() - self.residency_checked > self.residency_ttl
+
+    def _running(self) -> set:
+        return {model for model, count in self._active.items() if count}
+
+    def route(self, model: str, question: str, prompt_tokens: int) -> str:
+        """
+        Pick the model that should answer.
+
+        Simple questions asked of a model with "route_simple_to" go to that
+        model instead, unless Ollama would have to unload a model to load it.
+        """
+        model = model or self.default_model
+        target = self.model_settings(model).get("route_simple_to")
+        if not target or target == model:
+            return model
+        simple = (len(question.split()) <= self.config["simple_max_words"]
+                  and prompt_tokens <= self.config["simple_max_prompt_tokens"])
+        if not simple:
+            return model
+        if not self._fits(target):
+            return model
+        key = f"{model} -> {target}"
+        self._routed[key] = self._routed.get(key, 0) + 1
+        return target
+
+    def summary_model(self, model: str) -> str:
+        """
+        Model for background conversation summaries.
+
+        The configured "summary_model" when Ollama can run it without
+        unloading a model, else `model` (the one answering, already loaded).
+        """
+        model = model or self.default_model
+        target = self.config.get("summary_model")
+        return target if target and self._fits(target) else model
+
+    def _fits(self, model: str) -> bool:
+        """Whether `model` is loaded or can be loaded without evicting another."""
+        loaded = self.resident | self._running()
+        return model in loaded or len(loaded) < self.max_loaded
+
+    def _starving(self, exclude: str) -> bool:
+        """
+        True if a model that isn't running has waited longer than switch_after.
+        The wait counts from the last switch, so each model's turn lasts at
+        least switch_after seconds.
+        """
+        now = time.monotonic()
+        running = self._running()
+        return any(
+            queue and model != exclude and model not in running
+            and now - max(queue[0][0], self._switched_at) >= self.switch_after
+            for model, queue in self._queued.items()
+        )
+
+    def _started(self, model: str):
+        running = self._running()
+        if model not in running:
+            self._switched_at = time.monotonic()
+            if model not in self.resident:
+                # Ollama evicts a loaded model to make room until /api/ps tells us otherwise
+                self.resident = self.resident | {model} if len(self.resident) < self.max_loaded else running | {model}
+        self._active[model] = self._active.get(model, 0) + 1
+
+    def _can_start(self, model: str, entry: tuple) -> bool:
+        if self._active.get(model, 0) >= self.limit(model):
+            return False
+        # FIFO within a model
+        if self._queued[model][0] != entry:
+            return False
+        running = self._running()
+        if model in running:
+            return not self._starving(exclude=model)
+        if not running:
+            # Idle: the model that has waited longest goes first
+            return all(entry[0] <= queue[0][0] for queue in self._queued.values() if queue)
+        return len(running) < self.max_loaded or model in self.resident
+
+    def _can_start_background(self, model: str, entry: tuple) -> bool:
+        if self._background_queued[model][0] != entry or self._background_active.get(model, 0):
+            return False
+        # Answers go first, and one slot stays free for them (unless the limit is 1)
+        if any(self._queued.values()):
+            return False
+        if self._active.get(model, 0) >= max(1, self.limit(model) - 1):
+            return False
+        running = self._running()
+        return model in running or len(running) < self.max_loaded or model in self.resident
+
+    @contextlib.asynccontextmanager
+    async def slot(self, model: str, background: bool = False):
+        """
+        Wait until a request for `model` may be sent to Ollama.
+
+        Args:
+            model: Model the request is for
+            background: Low-priority request nobody is waiting for (see
+                        _can_start_background); it never blocks or delays
+                        the other requests
+        """
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        condition = self._condition
+        entry = (time.monotonic(), next(self._tickets))
+        queue = (self._background_queued if background else self._queued).setdefault(model, deque())
+        queue.append(entry)
+        can_start = self._can_start_background if background else self._can_start
+        try:
+            async with condition:
+                while not can_start(model, entry):
+                    # Wake up periodically so a waiting model's switch_after can kick in
+                    try:
+                        await asyncio.wait_for(condition.wait(), timeout=self.switch_after or None)
+                    except asyncio.TimeoutError:
+                        pass
+                queue.popleft()
+                self._started(model)
+                if background:
+                    self._background_active[model] = self._background_active.get(model, 0) + 1
+                condition.notify_all()
+        except BaseException:
+            if entry in queue:
+                queue.remove(entry)
+                async with condition:
+                    condition.notify_all()
+            raise
+        try:
+            yield
+        finally:
+            self._active[model] -= 1
+            if background:
+                self._background_active[model] -= 1
+            async with condition:
+                condition.notify_all()
+
+    def stats(self) -> dict:
+        """Queued and running requests per model, residency and routing counts."""
+        models = (set(self._active) | {model for model, queue in self._queued.items() if queue}
+                  | {model for model, queue in self._background_queued.items() if queue})
+        return {
+            "max_loaded_models": self.max_loaded,
+            "resident": sorted(self.resident),
+            "models": {
+                model: {
+                    "waiting": len(self._queued.get(model, ())),
+                    "active": self._active.get(model, 0),
+                    "limit": self.limit(model),
+                    "background_waiting": len(self._background_queued.get(model, ())),
+                    "background_active": self._background_active.get(model, 0),
+                }
+                for model in sorted(models)
+            },
+            "routed": dict(self._routed),
+        }
+
+router = ModelRouter(load_config())
+
+Gauge("ollama_requests_waiting", "Requests queued for each model", lambda: {
+    (model,): len(queue) for model, queue in router._queued.items()}, ("model",))
+Gauge("ollama_requests_active", "Requests each model is running", lambda: {
+    (model,): count for model, count in router._active.items()}, ("model",))
+Gauge("ollama_model_resident", "1 for models Ollama has loaded (per /api/ps)", lambda: {
+    (model,): 1 for model in router.resident}, ("model",))
@@ -0,0 +1,62 @@
+# backend/namespaces.py
+"""
+Namespaces (workspaces) of the knowledge base.
+
+Every namespace has its own Chroma collection, manifest, keyword index, flat
+index, write lock and version file, so a question only searches its own
+team's chunks and one namespace's bulk ingest or clear never blocks, rebuilds
+or invalidates another's. The default namespace keeps the original layout
+(collection "documents", files directly in embeddings/ and data/), so stores
+created before namespaces existed are used as they are; other namespaces live
+under embeddings/namespaces/<name>/ and data/namespaces/<name>/.
+"""
+import os
+import re
+
+# 🎯 DEFAULT_NAMESPACE: Namespace used when a request doesn't name one
+DEFAULT_NAMESPACE = "default"
+
+# Lowercase letters, digits, "-" and "_", starting and ending with a letter or
+# digit; short enough to stay a valid Chroma collection name with its prefix
+_valid_name = re.compile(r"^[a-z0-9](?:[a-z0-9_-]{0,46}[a-z0-9])?$")
+
+class InvalidNamespace(ValueError):
+    """A namespace name that can't be used as a collection or directory name."""
+
+class UnknownNamespace(LookupError):
+    """A namespace that has never been uploaded to."""
+
+def validate_namespace(name: str) -> str:
+    """Return the namespace to use for `name` (empty = default), or raise InvalidNamespace."""
+    name = (name or DEFAULT_NAMESPACE).strip().lower()
+    if not _valid_name.match(name):
+        raise InvalidNamespace(
+            f"Invalid namespace '{name}': use up to 48 lowercase letters, digits, '-' or '_'"
+        )
+    return name
+
+def namespace_dir(root: str, namespace: str) -> str:
+    """Directory of `namespace` under `root` (embeddings/ or data/)."""
+    if namespace == DEFAULT_NAMESPACE:
+        return root
+    return os.path.join(root, "namespaces", namespace)
+
+def namespace_exists(root: str, namespace: str) -> bool:
+    """True if `namespace` has been created under `root` (the default always exists)."""
+    return namespace == DEFAULT_NAMESPACE or os.path.isdir(namespace_dir(root, namespace))
+
+def collection_name(namespace: str) -> str:
+    """Chroma collection holding the chunks of `namespace`."""
+    return "documents" if namespace == DEFAULT_NAMESPACE else f"documents__{namespace}"
+
+def list_namespaces(root: str) -> list[str]:
+    """Namespaces that have a directory under `root`, default first."""
+    names = []
+    try:
+        names = sorted(
+            name for name in os.listdir(os.path.join(root, "namespaces"))
+            if _valid_name.match(name) and name != DEFAULT_NAMESPACE
+        )
+    except OSError:
+        pass
+    return [DEFAULT_NAMESPACE] + names
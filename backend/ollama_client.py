@@ -1,35 +1,92 @@
 # backend/ollama_client.py
 # HTTP client for Ollama-style local LLM server with streaming support
+import os
 import requests
+import httpx
 import json
+from model_router import router
+from metrics import record_generation
+from logger import get_logger
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
-MODEL_NAME = "gpt-oss:20b"  # Change to your pulled model: e.g. "llama3.1", "llama3:8b", "gpt-oss:20b", "deepseek-r1"
+log = get_logger(__name__)
 
-def ask_ollama(prompt: str, stream: bool = False, max_tokens: int = 2048, temperature: float = 0.7, system: str = None, model_name: str = None):
-    """
-    Send a prompt to Ollama and get response.
-    
-    Args:
-        prompt: The prompt to send
-        stream: Whether to stream the response
-        max_tokens: Maximum tokens to generate (default 2048 for complete responses)
-        temperature: Temperature for generation (0.0-1.0)
-        system: System prompt with conversation history and context
-        model_name: Override the default model name
-    
-    Returns:
-        If stream=False: Complete response string
-        If stream=True: Generator yielding response chunks
-    """
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_URL = f"{OLLAMA_BASE_URL}/api/generate"
+OLLAMA_CHAT_URL = f"{OLLAMA_BASE_URL}/api/chat"
+OLLAMA_TAGS_URL = f"{OLLAMA_BASE_URL}/api/tags"
+# Default model and per-model options (threads, GPU layers, num_ctx, keep_alive,
+# concurrency) live in models.json, see model_router.py
+MODEL_NAME = router.default_model  # Change "default_model" to your pulled model: e.g. "llama3.1", "llama3:8b", "deepseek-r1"
+
+# ========================================
+# ⚡ CONNECTION POOL TUNING
+# ========================================
+# 🎯 MAX_CONNECTIONS: Upper bound on open sockets to Ollama from this process
+# 🎯 MAX_KEEPALIVE_CONNECTIONS: Idle sockets kept open for reuse between requests
+#    Reusing connections skips the TCP handshake on every chat turn
+# Generations per model are limited by "max_concurrent" in models.json
+# (match OLLAMA_NUM_PARALLEL on the server); extra requests wait in the router
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+
+# Shared keep-alive session for the synchronous helpers
+_session = requests.Session()
+
+# Shared async client, created lazily inside the running event loop
+_async_client = None
+
+def _get_async_client() -> httpx.AsyncClient:
+    """Return the process-wide pooled async HTTP client."""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            base_url=OLLAMA_BASE_URL,
+            # 🎯 timeout: see ask_ollama below, connect stays short so a dead server fails fast
+            timeout=httpx.Timeout(300.0, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+    return _async_client
+
+async def close_async_client():
+    """Close the shared async client (call on application shutdown)."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+async def refresh_residency():
+    """Update the router's view of which models Ollama has loaded (/api/ps), at most every few seconds."""
+    if not router.residency_stale():
+        return
+    # Mark as checked first so concurrent requests don't all poll
+    router.set_resident(router.resident)
+    try:
+        response = await _get_async_client().get("/api/ps", timeout=2)
+        response.raise_for_status()
+        router.set_resident(model.get("name", "") for model in response.json().get("models", []))
+    except (httpx.HTTPError, ValueError):
+        pass   # keep the last known residency
+
+def _build_payload(prompt: str, stream: bool, max_tokens: int, temperature: float, system: str, model_name: str, num_ctx: int = None) -> dict:
+    """Build the /api/generate request body shared by the sync and async clients."""
     # ========================================
     # ⚡ PERFORMANCE TUNING - ADJUST THESE VALUES FOR FASTER/BETTER RESPONSES
     # ========================================
     
+    model_name = model_name or MODEL_NAME
+    settings = router.model_settings(model_name)
+    
     payload = {
-        "model": model_name or MODEL_NAME,
+        "model": model_name,
         "prompt": prompt,
         "stream": stream,
+        # 🎯 keep_alive: How long Ollama keeps the model (and its prompt cache) loaded after a request
+        #    Unloading drops the evaluated prompt prefix, so a follow-up turn after a
+        #    pause has to re-evaluate the whole conversation (models.json, default 30m)
+        "keep_alive": settings["keep_alive"],
         "options": {
             # 🎯 temperature: Controls randomness (0.0-1.0)
             #    Lower = more focused/deterministic, Higher = more creative/random
@@ -44,9 +101,9 @@ def ask_ollama(prompt: str, stream: bool = False, max_tokens: int = 2048, temper
             
             # 🎯 num_ctx: Context window size (how much conversation history to remember)
             #    Lower = faster, Higher = better context understanding
-            #    Default: 2048 (balanced speed/context)
-            #    Try: 1024 for faster, 4096 for better long conversations
-            "num_ctx": 2048,
+            #    Default: the model's "num_ctx" in models.json, or the size chosen by the prompt packer
+            #    (rag.py sizes num_ctx per request, see prompt_budget.py)
+            "num_ctx": num_ctx or settings["num_ctx"],
             
             # 🎯 top_k: Limits next token selection to top K candidates
             #    Lower = more focused, Higher = more diverse
@@ -65,55 +122,90 @@ def ask_ollama(prompt: str, stream: bool = False, max_tokens: int = 2048, temper
             
             # 🎯 num_thread: CPU threads for processing (⚡ SPEED BOOST)
             #    More threads = faster processing (if CPU allows)
-            #    Default: 8 threads
             #    Try: 4 for low-end CPUs, 16+ for high-end CPUs
-            "num_thread": 8,
-            
             # 🎯 num_gpu: Number of GPU layers to use (⚡⚡ MAJOR SPEED BOOST)
-            #    0 = CPU only (slow), 1 = use GPU (fast), -1 = use all GPU layers
-            #    Default: 1 (enable GPU if available)
-            #    Set to 0 if no GPU, or -1 to max GPU usage
-            "num_gpu": 1,
+            #    0 = CPU only (slow), -1 = use all GPU layers
+            # Both come from "options" in models.json (defaults 8 and 1), per model;
+            # any other Ollama option set there overrides the values above
+            **settings["options"],
         }
     }
     
     if system:
         payload["system"] = system
+    return payload
+
+def _build_chat_payload(messages: list, stream: bool, max_tokens: int, temperature: float, model_name: str, num_ctx: int = None) -> dict:
+    """Build an /api/chat request body with the same options as _build_payload."""
+    payload = _build_payload("", stream, max_tokens, temperature, None, model_name, num_ctx)
+    del payload["prompt"]
+    payload["messages"] = messages
+    return payload
+
+def ask_ollama(prompt: str, stream: bool = False, max_tokens: int = 2048, temperature: float = 0.7, system: str = None, model_name: str = None, num_ctx: int = None):
+    """
+    Send a prompt to Ollama and get response.
+    
+    Args:
+        prompt: The prompt to send
+        stream: Whether to stream the response
+        max_tokens: Maximum tokens to generate (default 2048 for complete responses)
+        temperature: Temperature for generation (0.0-1.0)
+        system: System prompt with conversation history and context
+        model_name: Override the default model name
+        num_ctx: Context window size (default: the model's num_ctx in models.json)
+    
+    Returns:
+        If stream=False: Complete response string
+        If stream=True: Generator yielding response chunks
+    """
+    payload = _build_payload(prompt, stream, max_tokens, temperature, system, model_name, num_ctx)
     
     try:
         # 🎯 timeout: Maximum wait time for response (in seconds)
         #    Lower = fail faster on errors, Higher = allow slower models to complete
         #    Default: 300 seconds (5 minutes) - good for large models
         #    Try: 120 for faster models, 600 for very large models
-        resp = requests.post(OLLAMA_URL, json=payload, stream=stream, timeout=300)
+        resp = _session.post(OLLAMA_URL, json=payload, stream=stream, timeout=300)
         resp.raise_for_status()
         
         if stream:
-            return _stream_response(resp)
+            return _stream_response(resp, payload["model"])
         else:
-            return _parse_response(resp)
+            return _parse_response(resp, payload["model"])
     except requests.exceptions.RequestException as e:
         raise Exception(f"Error communicating with Ollama: {str(e)}")
 
-def _stream_response(response):
-    """Generator that yields chunks from streaming response."""
-    for line in response.iter_lines():
-        if line:
-            try:
-                data = json.loads(line)
-                if "response" in data:
-                    yield data["response"]
-                
-                # Check if done
-                if data.get("done", False):
-                    break
-            except json.JSONDecodeError:
-                continue
-
-def _parse_response(response):
+def _stream_response(response, model: str = None):
+    """
+    Generator that yields chunks from streaming response.
+    
+    The HTTP response is closed when the generator finishes or is closed early
+    by the consumer, which tells Ollama to stop generating.
+    """
+    try:
+        for line in response.iter_lines():
+            if line:
+                try:
+                    data = json.loads(line)
+                    if "response" in data:
+                        yield data["response"]
+                    
+                    # Check if done
+                    if data.get("done", False):
+                        record_generation(data, model)
+                        break
+                except json.JSONDecodeError:
+                    continue
+    finally:
+        response.close()
+
+def _parse_response(response, model: str = None):
     """Parse non-streaming response."""
     try:
         data = response.json()
+        if isinstance(data, dict):
+            record_generation(data, model)
         
         # Ollama format - check for DeepSeek-R1 style thinking + response
         if isinstance(data, dict):
@@ -123,7 +215,7 @@ def _parse_response(response):
             thinking = data.get("thinking", "")
             
             if thinking and (not answer or answer.strip() == ""):
-                print("DEBUG: Using thinking field from DeepSeek-R1")
+                log.debug("Using thinking field from DeepSeek-R1")
                 # Extract just the conclusion from thinking (last paragraph usually has the answer)
                 lines = thinking.strip().split('\n')
                 # Get last few meaningful lines
@@ -145,16 +237,128 @@ def _parse_response(response):
                 return choice["text"]
         
         # Fallback
-        print(f"WARNING: Could not extract answer from response")
+        log.warning("Could not extract answer from response")
         return "I apologize, but I couldn't generate a proper response. Please try again."
     except Exception as e:
-        print(f"ERROR parsing Ollama response: {str(e)}")
+        log.error("Error parsing Ollama response: %s", e)
         raise Exception(f"Error parsing Ollama response: {str(e)}")
 
+async def ask_ollama_async(prompt: str, max_tokens: int = 2048, temperature: float = 0.7, system: str = None, model_name: str = None, num_ctx: int = None,
+                           background: bool = False) -> str:
+    """
+    Async, non-streaming version of ask_ollama.
+
+    Uses the shared connection pool and waits for a slot from the model router,
+    so the calling event loop is never blocked while Ollama generates.
+    Background requests get a low-priority slot (see ModelRouter.slot).
+    """
+    payload = _build_payload(prompt, False, max_tokens, temperature, system, model_name, num_ctx)
+    return await _post_async("/api/generate", payload, background)
+
+async def stream_ollama_async(prompt: str, max_tokens: int = 2048, temperature: float = 0.7, system: str = None, model_name: str = None, num_ctx: int = None):
+    """
+    Async generator yielding response chunks from Ollama.
+
+    The router slot and pooled connection are held for the lifetime of the
+    stream and released as soon as the generator finishes or is closed.
+    """
+    payload = _build_payload(prompt, True, max_tokens, temperature, system, model_name, num_ctx)
+    async for chunk in _stream_async("/api/generate", payload):
+        yield chunk
+
+async def chat_ollama_async(messages: list, max_tokens: int = 2048, temperature: float = 0.7, model_name: str = None, num_ctx: int = None) -> str:
+    """
+    Non-streaming /api/chat call.
+
+    Args:
+        messages: Chat messages ({"role", "content"}), system message first
+        max_tokens: Maximum tokens to generate
+        temperature: Temperature for generation (0.0-1.0)
+        model_name: Override the default model name
+        num_ctx: Context window size (default: the model's num_ctx in models.json)
+
+    Returns:
+        Complete response string
+    """
+    payload = _build_chat_payload(messages, False, max_tokens, temperature, model_name, num_ctx)
+    return await _post_async("/api/chat", payload)
+
+async def stream_chat_ollama_async(messages: list, max_tokens: int = 2048, temperature: float = 0.7, model_name: str = None, num_ctx: int = None):
+    """Async generator yielding response chunks from /api/chat. See chat_ollama_async."""
+    payload = _build_chat_payload(messages, True, max_tokens, temperature, model_name, num_ctx)
+    async for chunk in _stream_async("/api/chat", payload):
+        yield chunk
+
+async def _post_async(path: str, payload: dict, background: bool = False) -> str:
+    client = _get_async_client()
+    await refresh_residency()
+    
+    async with router.slot(payload["model"], background=background):
+        try:
+            resp = await client.post(path, json=payload)
+            resp.raise_for_status()
+        except httpx.HTTPError as e:
+            raise Exception(f"Error communicating with Ollama: {str(e)}")
+    return _parse_response(resp, payload["model"])
+
+async def _stream_async(path: str, payload: dict):
+    client = _get_async_client()
+    await refresh_residency()
+    
+    async with router.slot(payload["model"]):
+        try:
+            async with client.stream("POST", path, json=payload) as resp:
+                resp.raise_for_status()
+                async for line in resp.aiter_lines():
+                    if not line:
+                        continue
+                    try:
+                        data = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    # /api/generate streams "response", /api/chat streams "message"
+                    if "response" in data:
+                        yield data["response"]
+                    elif data.get("message", {}).get("content"):
+                        yield data["message"]["content"]
+                    if data.get("done", False):
+                        record_generation(data, payload["model"])
+                        break
+        except httpx.HTTPError as e:
+            raise Exception(f"Error communicating with Ollama: {str(e)}")
+
+async def warm_model_async(model_name: str = None, num_ctx: int = None):
+    """
+    Ask Ollama to load a model without generating anything.
+
+    A request without a prompt only loads the model (and keeps it loaded for
+    its keep_alive), so the first real question skips the load.
+    """
+    payload = _build_payload("", False, 1, 0.0, None, model_name, num_ctx)
+    del payload["prompt"]
+    client = _get_async_client()
+    try:
+        resp = await client.post("/api/generate", json=payload)
+        resp.raise_for_status()
+    except httpx.HTTPError as e:
+        raise Exception(f"Error communicating with Ollama: {str(e)}")
+
+def _extract_models(data: dict) -> list:
+    """Convert an /api/tags response into the model list returned by the API."""
+    models = []
+    if "models" in data:
+        for model in data["models"]:
+            models.append({
+                "name": model.get("name", ""),
+                "size": model.get("size", 0),
+                "modified_at": model.get("modified_at", "")
+            })
+    return models
+
 def check_ollama_connection():
     """Check if Ollama server is reachable."""
     try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
+        response = _session.get(OLLAMA_TAGS_URL, timeout=5)
         return response.status_code == 200
     except:
         return False
@@ -162,18 +366,19 @@ def check_ollama_connection():
 def get_available_models():
     """Get list of available Ollama models."""
     try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
+        response = _session.get(OLLAMA_TAGS_URL, timeout=5)
         response.raise_for_status()
-        data = response.json()
-        models = []
-        if "models" in data:
-            for model in data["models"]:
-                models.append({
-                    "name": model.get("name", ""),
-                    "size": model.get("size", 0),
-                    "modified_at": model.get("modified_at", "")
-                })
-        return models
+        return _extract_models(response.json())
+    except Exception as e:
+        log.error("Error fetching models: %s", e)
+        return []
+
+async def get_available_models_async():
+    """Async version of get_available_models."""
+    try:
+        response = await _get_async_client().get("/api/tags", timeout=5)
+        response.raise_for_status()
+        return _extract_models(response.json())
     except Exception as e:
-        print(f"Error fetching models: {e}")
+        log.error("Error fetching models: %s", e)
         return []
@@ -0,0 +1,237 @@
+# backend/prompt_budget.py
+"""
+Token-budget-aware prompt assembly.
+
+Instead of cutting every chunk at 500 characters and every history message at
+150, the packer counts tokens for each prompt part and fills a fixed window by
+priority: the system prompt, personalization and question always go in, then
+the best retrieved chunk, the latest exchange, the summary of earlier turns
+(see summaries.py), further chunks by relevance and finally older history. It
+then picks the smallest num_ctx that fits the prompt plus room for the answer,
+since a larger context window makes Ollama's prompt evaluation slower.
+"""
+from token_counter import count_tokens, get_tokenizer
+
+# ========================================
+# ⚡ PROMPT BUDGET TUNING
+# ========================================
+# 🎯 NUM_CTX_CHOICES: Context window sizes a request may use (smallest that fits wins)
+#    Every distinct num_ctx makes Ollama reload the model, so keep this list short
+# 🎯 RESPONSE_RESERVE_RATIO: Share of the context window kept free for the
+#    generated answer, so small windows still leave most of their room to the prompt
+# 🎯 RESPONSE_RESERVE_TOKENS: Most context ever kept free for the answer
+# 🎯 TOKEN_ESTIMATE_FACTOR: Safety margin, tokens are counted with the embedding
+#    model's tokenizer which usually undercounts for the chat model
+# 🎯 MIN_PARTIAL_TOKENS: Smallest useful piece of a chunk or message to squeeze in
+# 🎯 MAX_CONTEXT_CHUNKS: Upper bound on retrieved chunks in one prompt
+# 🎯 RELEVANCE_MARGIN: Extra chunks must score within this of the best chunk
+#    Lower = fewer, more relevant chunks (faster), Higher = more context
+NUM_CTX_CHOICES = (1024, 2048, 4096)
+RESPONSE_RESERVE_RATIO = 0.375
+RESPONSE_RESERVE_TOKENS = 1024
+TOKEN_ESTIMATE_FACTOR = 1.15
+MIN_PARTIAL_TOKENS = 48
+MAX_CONTEXT_CHUNKS = 4
+RELEVANCE_MARGIN = 0.15
+
+# 🎯 Default AI personality - Edit this to change behavior!
+# Examples to try:
+# "You are a coding expert. Provide concise, practical solutions."
+# "You are a friendly tutor. Explain concepts clearly with examples."
+# "You are a research assistant. Provide detailed, factual answers."
+SYSTEM_PROMPT = "You are a helpful AI assistant. Provide short but well-structured answers."
+
+class PackedPrompt:
+    """Result of packing: the prompts to send plus what went into them."""
+
+    def __init__(self, system_prompt: str, prompt: str, num_ctx: int, prompt_tokens: int,
+                 hits: list, history: list, dropped_chunks: int, dropped_messages: int):
+        self.system_prompt = system_prompt
+        self.prompt = prompt
+        self.num_ctx = num_ctx
+        self.prompt_tokens = prompt_tokens
+        self.hits = hits
+        self.history = history
+        self.dropped_chunks = dropped_chunks
+        self.dropped_messages = dropped_messages
+
+    @property
+    def chunk_ids(self) -> list:
+        return [hit["id"] for hit in self.hits]
+
+def estimate_tokens(text: str) -> int:
+    """Estimated chat-model tokens for `text`."""
+    return int(count_tokens(text) * TOKEN_ESTIMATE_FACTOR) + 1 if text else 0
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut `text` to roughly `max_tokens` estimated tokens, marking the cut."""
+    limit = int(max_tokens / TOKEN_ESTIMATE_FACTOR)
+    offsets = get_tokenizer().offsets(text)
+    if len(offsets) <= limit:
+        return text
+    if limit <= 0:
+        return ""
+    return text[:offsets[limit - 1][1]].rstrip() + "..."
+
+def relevance(hit: dict) -> float:
+    """Cosine similarity of a hit, from Chroma's squared L2 distance on unit vectors."""
+    distance = hit.get("distance")
+    return 1.0 - distance / 2.0 if distance is not None else 0.0
+
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+
+def _format_chunk(hit: dict, text: str) -> str:
+    return f"[Source: {hit['metadata'].get('source', 'unknown')}]\n{text}"
+
+def _format_message(msg: dict, content: str) -> str:
+    role = "User" if msg.get("role") == "user" else "Assistant"
+    return f"{role}: {content}"
+
+def base_system_prompt(personalization: str = '') -> str:
+    """The stable part of the system prompt: instructions plus personalization."""
+    return f"{SYSTEM_PROMPT}\n\n{personalization}" if personalization else SYSTEM_PROMPT
+
+def _select_chunks(hits: list) -> list:
+    """Chunks close enough in relevance to the best one, plus the top keyword match."""
+    if not hits:
+        return []
+    best = max(relevance(hit) for hit in hits)
+    return [
+        hit for hit in hits
+        if relevance(hit) >= best - RELEVANCE_MARGIN or hit.get("keyword_rank") == 0
+    ][:MAX_CONTEXT_CHUNKS]
+
+def _fit(text: str, overhead: int, remaining: int):
+    """Return (text, cost) cut to fit `remaining` tokens, or None if too little room is left."""
+    remaining -= overhead
+    cost = estimate_tokens(text)
+    if cost > remaining:
+        if remaining < MIN_PARTIAL_TOKENS:
+            return None
+        # A couple of tokens of slack for rounding and the "..." marker
+        text = truncate_to_tokens(text, remaining - 2)
+        cost = min(estimate_tokens(text), remaining)
+    return text, cost + overhead
+
+def pack_prompt(question: str, hits: list, history: list = None, personalization: str = '',
+                max_num_ctx: int = None, summary: str = '') -> PackedPrompt:
+    """
+    Assemble the system prompt and user prompt within a token budget.
+
+    Parts are laid out from most to least stable (instructions, personalization,
+    conversation summary, history, retrieved context) so consecutive requests
+    share a long prefix.
+
+    Args:
+        question: The question to ask
+        hits: Retrieved chunks (dicts with id, document, metadata, distance), best first
+        history: Previous conversation messages, oldest first
+        personalization: User's personalization preferences
+        max_num_ctx: Largest context window allowed (default: largest NUM_CTX_CHOICES)
+        summary: Summary of the conversation before `history`, if any
+
+    Returns:
+        PackedPrompt with the prompts, chosen num_ctx and the included parts
+    """
+    history = history or []
+    max_num_ctx = max_num_ctx or max(NUM_CTX_CHOICES)
+    budget = max_num_ctx - response_reserve(max_num_ctx)
+    base_prompt = base_system_prompt(personalization)
+
+    # Fixed parts always go in
+    used = estimate_tokens(base_prompt) + estimate_tokens(question)
+    candidates = _select_chunks(hits)
+
+    # Priority order: best chunk, latest exchange, summary, other chunks by relevance, older history
+    recent = list(range(max(0, len(history) - 2), len(history)))
+    older = list(range(len(history) - len(recent) - 1, -1, -1))
+    queue = [("chunk", 0)] if candidates else []
+    queue += [("message", i) for i in reversed(recent)]
+    queue += [("summary", 0)] if summary else []
+    queue += [("chunk", i) for i in range(1, len(candidates))]
+    queue += [("message", i) for i in older]
+
+    chunk_texts, message_texts = {}, {}
+    summary_text = ""
+    for kind, index in queue:
+        if kind == "chunk":
+            text = candidates[index]["document"]
+            overhead = estimate_tokens(_format_chunk(candidates[index], ""))
+        elif kind == "summary":
+            text = summary
+            overhead = estimate_tokens(SUMMARY_HEADER)
+        else:
+            text = history[index].get("content", "")
+            overhead = estimate_tokens(_format_message(history[index], ""))
+        fitted = _fit(text, overhead, budget - used)
+        if fitted is None:
+            continue
+        text, cost = fitted
+        used += cost
+        if kind == "summary":
+            summary_text = text
+        else:
+            (chunk_texts if kind == "chunk" else message_texts)[index] = text
+
+    included_hits = [candidates[i] for i in sorted(chunk_texts)]
+    included_history = [history[i] for i in sorted(message_texts)]
+
+    system_parts = [base_prompt]
+    if summary_text:
+        system_parts.append(SUMMARY_HEADER + summary_text)
+    if message_texts:
+        lines = [_format_message(history[i], message_texts[i]) for i in sorted(message_texts)]
+        system_parts.append("Previous conversation:\n" + "\n".join(lines) + "\n")
+    if chunk_texts:
+        context = "\n\n".join(_format_chunk(candidates[i], chunk_texts[i]) for i in sorted(chunk_texts))
+        system_parts.append(f"Relevant document context:\n{context}")
+    system_prompt = "\n\n".join(system_parts)
+
+    num_ctx = choose_num_ctx(used, max_num_ctx)
+    return PackedPrompt(
+        system_prompt, question, num_ctx, used, included_hits, included_history,
+        dropped_chunks=len(hits) - len(included_hits),
+        dropped_messages=len(history) - len(included_history),
+    )
+
+def pack_turn(question: str, hits: list, budget: int) -> tuple:
+    """
+    Build one chat turn's user message: retrieved context, then the question.
+
+    Used by chat sessions, where instructions and earlier turns are already
+    part of the message list and only this message is new.
+
+    Args:
+        question: The question to ask
+        hits: Retrieved chunks, best first
+        budget: Tokens available for this message
+
+    Returns:
+        (content, included hits, estimated tokens)
+    """
+    used = estimate_tokens(question) + estimate_tokens("Question: ")
+    candidates = _select_chunks(hits)
+    texts = {}
+    for index, hit in enumerate(candidates):
+        fitted = _fit(hit["document"], estimate_tokens(_format_chunk(hit, "")), budget - used)
+        if fitted is None:
+            continue
+        texts[index], cost = fitted
+        used += cost
+
+    if not texts:
+        return question, [], used
+    context = "\n\n".join(_format_chunk(candidates[i], texts[i]) for i in sorted(texts))
+    content = f"Relevant document context:\n{context}\n\nQuestion: {question}"
+    return content, [candidates[i] for i in sorted(texts)], used
+
+def response_reserve(num_ctx: int) -> int:
+    """Tokens of a `num_ctx` context window kept free for the answer."""
+    return min(RESPONSE_RESERVE_TOKENS, int(num_ctx * RESPONSE_RESERVE_RATIO))
+
+def choose_num_ctx(prompt_tokens: int, max_num_ctx: int = None) -> int:
+    """Smallest allowed context window holding the prompt plus its answer reserve."""
+    for num_ctx in sorted(NUM_CTX_CHOICES):
+        if num_ctx >= prompt_tokens + response_reserve(num_ctx) and (max_num_ctx is None or num_ctx <= max_num_ctx):
+            return num_ctx
+    return max_num_ctx or max(NUM_CTX_CHOICES)
@@ -1,51 +1,871 @@
 # backend/rag.py
+import time
+_import_started = time.perf_counter()
+
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 import chromadb
 from chromadb.utils import embedding_functions
-from ollama_client import ask_ollama
+from ollama_client import ask_ollama, ask_ollama_async, stream_ollama_async, chat_ollama_async, stream_chat_ollama_async, MODEL_NAME
+from model_router import router
+from answer_cache import answer_cache, answer_key, replay, replay_async
+from single_flight import single_flight, SINGLE_FLIGHT
+from summaries import summaries
+from retrieval_cache import embedding_cache, retrieval_cache, embedding_key
+from manifest import Manifest
+from lexical_index import LexicalIndex
+from flat_index import FlatIndex
+from rerank import rerank, RERANK_ENABLED, RERANK_CANDIDATES
+from shared_state import SharedVersion, write_lock
+from namespaces import DEFAULT_NAMESPACE, InvalidNamespace, UnknownNamespace, validate_namespace, namespace_dir, namespace_exists, collection_name, list_namespaces as list_namespace_dirs
+from embedding_client import RemoteEmbeddingFunction
+from embed_batcher import QueryBatcher, EMBED_BATCHING
+from prompt_budget import pack_prompt, pack_turn, base_system_prompt
+from sessions import sessions
+from token_counter import get_tokenizer
+import hashlib
+import json
 import os
+import re
+import threading
+from datetime import datetime, timezone
+import numpy as np
+from warmup import readiness
+from metrics import span
+from logger import get_logger
+
+log = get_logger(__name__)
 
 # Initialize ChromaDB with persistent storage
-EMBEDDINGS_PATH = os.path.join(os.path.dirname(__file__), "..", "embeddings")
+# 🎯 EMBEDDINGS_PATH: Directory of the vector store and its indexes (default ../embeddings)
+EMBEDDINGS_PATH = os.environ.get("EMBEDDINGS_PATH", os.path.join(os.path.dirname(__file__), "..", "embeddings"))
 os.makedirs(EMBEDDINGS_PATH, exist_ok=True)
 
-chroma_client = chromadb.PersistentClient(path=EMBEDDINGS_PATH)
+# ========================================
+# ⚡ MULTI-WORKER DEPLOYMENT (environment variables)
+# ========================================
+# 🎯 CHROMA_HOST / CHROMA_PORT: Use a Chroma server instead of opening the
+#    store in-process; required with `uvicorn app:app --workers N` so a single
+#    process owns the vector store (start it with `chroma run --path ../embeddings`)
+# 🎯 EMBEDDING_SERVICE_URL: Embed through embedding_service.py instead of
+#    loading the model in every worker
+CHROMA_HOST = os.environ.get("CHROMA_HOST", "")
+CHROMA_PORT = int(os.environ.get("CHROMA_PORT", "8001"))
+EMBEDDING_SERVICE_URL = os.environ.get("EMBEDDING_SERVICE_URL", "")
+
+if CHROMA_HOST:
+    chroma_client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+else:
+    chroma_client = chromadb.PersistentClient(path=EMBEDDINGS_PATH)
+
+if EMBEDDING_SERVICE_URL:
+    embedding_fn = RemoteEmbeddingFunction(EMBEDDING_SERVICE_URL)
+else:
+    # Use default embedding function (all-MiniLM-L6-v2 via sentence-transformers)
+    embedding_fn = embedding_functions.DefaultEmbeddingFunction()
+
+def _open_collection(name: str):
+    # Embeddings are always computed here and passed in explicitly; a remote
+    # embedder must not replace the embedding function recorded with the collection
+    return chroma_client.get_or_create_collection(
+        name=name,
+        embedding_function=None if EMBEDDING_SERVICE_URL else embedding_fn
+    )
+
+# ========================================
+# ⚡ VECTOR BACKEND TUNING
+# ========================================
+# 🎯 VECTOR_BACKEND: Where vector search runs
+#    "auto" = exact flat index for small corpora, Chroma's HNSW index above FLAT_MAX_CHUNKS
+#    "flat" = always the flat index, "chroma" = always Chroma (no flat index kept)
+#    Chroma stays the store of documents and metadata in every mode
+# 🎯 FLAT_MAX_CHUNKS: Largest corpus searched with the flat index in "auto" mode
+#    Exact int8 search costs ~0.2 ms per 1,000 chunks at 99% recall, and the
+#    flat files are ~10x smaller than Chroma's index. HNSW overtakes it on
+#    latency around 5k chunks but loses recall as the corpus grows
+#    (benchmarks/bench_vector_store.py). Default: 10,000 (~2 ms per query)
+#    Counted per namespace
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "auto")
+FLAT_MAX_CHUNKS = int(os.environ.get("FLAT_MAX_CHUNKS", "10000"))
+
+class Namespace:
+    """
+    The collection of one namespace and everything kept alongside it.
+    
+    Each namespace has its own Chroma collection, manifest, keyword index and
+    flat index, and its own write lock and shared version, so ingesting into
+    or clearing one namespace never blocks or invalidates another
+    (see namespaces.py).
+    
+    Args:
+        name: Validated namespace name
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.path = namespace_dir(EMBEDDINGS_PATH, name)
+        os.makedirs(self.path, exist_ok=True)
+        self.collection = _open_collection(collection_name(name))
+        
+        # Content hashes of every indexed document's chunks, used for incremental re-indexing
+        self.manifest = Manifest(os.path.join(self.path, "manifest.json"))
+        # BM25 keyword index over the same chunks, fused with vector hits in search()
+        self.lexical_index = LexicalIndex(os.path.join(self.path, "lexical_index.pkl"))
+        # Quantized copy of the chunk embeddings, searched exactly by brute force (see flat_index.py)
+        self.flat_index = FlatIndex(os.path.join(self.path, "flat_index.pkl"))
+        self.flat_in_use = False   # True while the flat index mirrors the whole collection
+        self._flat_synced = False
+        self._flat_sync_lock = threading.Lock()
+        self._lexical_synced = False
+        self._lexical_sync_lock = threading.Lock()
+        self._registry_synced = False
+        self._registry_sync_lock = threading.Lock()
+        
+        # Held across every change to the collection, so one worker process writes at a time
+        self.write_lock = write_lock(os.path.join(self.path, ".write.lock"))
+        # Bumped on every change to the collection; part of every retrieval cache key.
+        # Shared through a file so other workers notice and reload their state
+        self.shared_version = SharedVersion(os.path.join(self.path, "collection_version"))
+        self.version = self.shared_version.read()
+        self._state_lock = threading.Lock()
+    
+    def source_key(self, source: str) -> tuple:
+        """Identity of a document of this namespace in the answer cache."""
+        return (self.name, source)
+    
+    def drop_answers(self):
+        """Forget cached answers quoting this namespace's documents."""
+        answer_cache.invalidate_sources(lambda source: source[0] == self.name)
+    
+    def bump_version(self):
+        """Publish a change to the collection (call with write_lock held)."""
+        self.version = self.shared_version.bump()
+    
+    def sync_shared_state(self):
+        """Reload manifest, keyword index and collection handle if another worker changed them."""
+        version = self.shared_version.read()
+        if version == self.version:
+            return
+        with self._state_lock:
+            if version == self.version:
+                return
+            self.manifest.reload()
+            self.lexical_index.reload()
+            self.flat_index.reload()
+            # The other worker may have crossed FLAT_MAX_CHUNKS; decide again on the next search
+            self._flat_synced = False
+            # A clear in another worker drops the collection this handle points to
+            self.collection = _open_collection(collection_name(self.name))
+            self.drop_answers()
+            self.version = version
+    
+    def sync_lexical_index(self):
+        """Rebuild the keyword index from Chroma if it is missing or out of date (checked once)."""
+        if self._lexical_synced:
+            return
+        with self._lexical_sync_lock:
+            if self._lexical_synced:
+                return
+            count = self.collection.count()
+            if len(self.lexical_index) != count:
+                log.info("Rebuilding lexical index of namespace %s from %d stored chunks...", self.name, count)
+                self.lexical_index.clear()
+                page_size = chroma_client.get_max_batch_size()
+                for offset in range(0, count, page_size):
+                    page = self.collection.get(limit=page_size, offset=offset, include=["documents"])
+                    self.lexical_index.add(page["ids"], page["documents"])
+                self.lexical_index.save()
+            self._lexical_synced = True
+    
+    def refresh_flat_index(self):
+        """
+        Build, keep or drop the flat index for the current corpus size.
+        
+        Called after every change to the collection (with write_lock held)
+        and once before the first search.
+        """
+        count = self.collection.count()
+        if not _wants_flat_index(count):
+            self.flat_in_use = False
+            if len(self.flat_index):
+                log.info("Dropping flat vector index of namespace %s (%d chunks), searching with Chroma", self.name, count)
+                self.flat_index.clear()
+        else:
+            if len(self.flat_index) != count:
+                log.info("Building flat vector index of namespace %s from %d stored chunks...", self.name, count)
+                self.flat_index.clear()
+                page_size = chroma_client.get_max_batch_size()
+                for offset in range(0, count, page_size):
+                    page = self.collection.get(limit=page_size, offset=offset, include=["embeddings"])
+                    self.flat_index.add(page["ids"], page["embeddings"])
+            self.flat_index.save()
+            self.flat_in_use = True
+        self._flat_synced = True
+    
+    def sync_flat_index(self):
+        """Decide between the flat index and Chroma before the first search (checked once)."""
+        if self._flat_synced:
+            return
+        with self._flat_sync_lock:
+            if not self._flat_synced:
+                self.refresh_flat_index()
+    
+    def sync_registry(self):
+        """
+        Register documents stored without a manifest record (checked once).
+        
+        Chunks written before the registry existed are scanned from their
+        metadata a single time; afterwards the document list never touches the
+        collection.
+        """
+        if self._registry_synced:
+            return
+        with self._registry_sync_lock:
+            if self._registry_synced:
+                return
+            count = self.collection.count()
+            if self.manifest.total_chunks() != count:
+                found = {}
+                page_size = chroma_client.get_max_batch_size()
+                for offset in range(0, count, page_size):
+                    page = self.collection.get(limit=page_size, offset=offset, include=["metadatas"])
+                    for meta in page["metadatas"]:
+                        if meta and "source" in meta and self.manifest.get(meta["source"]) is None:
+                            found.setdefault(meta["source"], []).append(meta)
+                records = {}
+                for source, metadatas in found.items():
+                    metadatas.sort(key=lambda meta: meta.get("chunk_index", 0))
+                    hashes = [meta.get("content_hash") for meta in metadatas]
+                    record = {"file_hash": None, "chunk_count": len(metadatas), "size": None, "ingested_at": None}
+                    # Positional chunk IDs can't be diffed, the next upload replaces them wholesale
+                    if all(hashes):
+                        record["chunks"] = hashes
+                    else:
+                        record.update(chunks=[], legacy=True)
+                    records[source] = record
+                if records:
+                    log.info("Registered %d document(s) found in namespace %s", len(records), self.name)
+                    self.manifest.set_many(records)
+            self._registry_synced = True
+    
+    def clear(self):
+        """Drop the collection and every index of this namespace."""
+        with self.write_lock:
+            chroma_client.delete_collection(collection_name(self.name))
+            self.collection = _open_collection(collection_name(self.name))
+            self.manifest.clear()
+            self.lexical_index.clear()
+            self.flat_index.clear()
+            self.refresh_flat_index()
+            self.bump_version()
+        self.drop_answers()
+
+def _wants_flat_index(count: int) -> bool:
+    return VECTOR_BACKEND == "flat" or (VECTOR_BACKEND == "auto" and count <= FLAT_MAX_CHUNKS)
 
-# Use default embedding function (all-MiniLM-L6-v2 via sentence-transformers)
-embedding_fn = embedding_functions.DefaultEmbeddingFunction()
+_namespaces = {}
+_namespaces_lock = threading.Lock()
 
-collection = chroma_client.get_or_create_collection(
-    name="documents",
-    embedding_function=embedding_fn
-)
+def get_namespace(name: str = DEFAULT_NAMESPACE, create: bool = True) -> Namespace:
+    """
+    State of a namespace, opened on first use.
+    
+    Args:
+        name: Namespace name; empty selects the default namespace
+        create: Create the namespace if it doesn't exist yet. Only uploads
+                create namespaces, so reads of a mistyped name leave no
+                collection or directories behind
+    
+    Raises:
+        InvalidNamespace: If the name can't be used (see namespaces.py)
+        UnknownNamespace: If create is False and the namespace doesn't exist
+    """
+    name = validate_namespace(name)
+    namespace = _namespaces.get(name)
+    if namespace is None:
+        with _namespaces_lock:
+            namespace = _namespaces.get(name)
+            if namespace is None:
+                # Another worker may have created it since, so check the disk
+                if not create and not namespace_exists(EMBEDDINGS_PATH, name):
+                    raise UnknownNamespace(f"Namespace '{name}' not found")
+                namespace = _namespaces[name] = Namespace(name)
+    return namespace
 
-def add_document_to_rag(doc_id: str, chunks: list[str]):
+def list_namespaces() -> list[str]:
+    """Every namespace that has been created, default first."""
+    return list_namespace_dirs(EMBEDDINGS_PATH)
+
+# The default namespace is opened with the module, so the store is ready for the first request
+get_namespace()
+
+# ========================================
+# ⚡ INGESTION TUNING
+# ========================================
+# 🎯 EMBED_BATCH_SIZE: Chunks embedded per ONNX call
+#    MiniLM pads every chunk to 256 tokens, so 64 keeps one batch in L2/L3 cache
+#    while still amortizing the per-call overhead across all cores
+#    Try: 32 for small machines, 128 for many-core servers
+# 🎯 WRITE_BATCH_SIZE: Chunks written to Chroma per collection.add()
+#    Capped at the client's maximum batch size
+EMBED_BATCH_SIZE = 64
+WRITE_BATCH_SIZE = 1024
+
+class ChunkWriter:
+    """
+    Buffered embed-and-store pipeline for ingesting chunks.
+    
+    Chunks from any number of documents are embedded in fixed-size batches
+    and written to Chroma in larger batches on a background thread, so the
+    write of one batch overlaps with embedding the next. Use as a context
+    manager; the remaining buffer is flushed and caches invalidated on exit.
+    
+    Updates and deletions of chunks already stored are queued too and only
+    applied on a successful exit, after the new chunks are written, so a job
+    that fails halfway leaves the previous version of its documents in place.
+    
+    Args:
+        progress: Optional callback receiving the number of chunks stored so far
+        namespace: Namespace the chunks are stored in
+    """
+    
+    def __init__(self, progress=None, namespace: str = DEFAULT_NAMESPACE):
+        self.namespace = get_namespace(namespace)
+        self.progress = progress
+        self.embedded = 0
+        self.sources = set()
+        self._manifest_updates = {}
+        self._updates = ([], [])   # stored chunk IDs, new metadata
+        self._deletes = []
+        self._texts, self._ids, self._metadatas = [], [], []
+        self._pending = ([], [], [], [])
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chroma-writer")
+        self._write_future = None
+        self._write_batch = min(WRITE_BATCH_SIZE, chroma_client.get_max_batch_size())
+    
+    def __enter__(self):
+        self.namespace.write_lock.acquire()
+        self.namespace.sync_shared_state()
+        # Decides whether this batch is also written to the flat index
+        self.namespace.sync_flat_index()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.flush()
+                self._apply_changes()
+                # Record documents as indexed only once their chunks are stored
+                for doc_id, record in self._manifest_updates.items():
+                    self.namespace.manifest.set(doc_id, record)
+        finally:
+            self._writer.shutdown(wait=True)
+            try:
+                if self.sources:
+                    self.namespace.lexical_index.save()
+                    self.namespace.refresh_flat_index()
+                    # Cached answers quoting an older version of these documents are stale now
+                    self.namespace.bump_version()
+                    for source in self.sources:
+                        answer_cache.invalidate_source(self.namespace.source_key(source))
+            finally:
+                self.namespace.write_lock.release()
+        return False
+    
+    def add(self, ids: list[str], texts: list[str], metadatas: list[dict]):
+        """Queue chunks for embedding; full batches are embedded immediately."""
+        self._ids.extend(ids)
+        self._texts.extend(texts)
+        self._metadatas.extend(metadatas)
+        self.sources.update(meta["source"] for meta in metadatas)
+        while len(self._texts) >= EMBED_BATCH_SIZE:
+            self._embed_batch(EMBED_BATCH_SIZE)
+    
+    def add_embedded(self, ids: list[str], texts: list[str], metadatas: list[dict], embeddings: list):
+        """Queue chunks whose embeddings are already known; they skip the model."""
+        pending_ids, pending_texts, pending_metas, pending_embeddings = self._pending
+        pending_ids.extend(ids)
+        pending_texts.extend(texts)
+        pending_metas.extend(metadatas)
+        pending_embeddings.extend(embeddings)
+        self.sources.update(meta["source"] for meta in metadatas)
+        if len(pending_ids) >= self._write_batch:
+            self._submit_write()
+    
+    def update(self, ids: list[str], metadatas: list[dict]):
+        """Queue new metadata for chunks already stored; applied on commit."""
+        self._updates[0].extend(ids)
+        self._updates[1].extend(metadatas)
+    
+    def delete(self, ids: list[str]):
+        """Queue stored chunks for deletion; applied on commit."""
+        self._deletes.extend(ids)
+    
+    def record(self, doc_id: str, manifest_record: dict):
+        """Commit a document's manifest record after a successful flush."""
+        self._manifest_updates[doc_id] = manifest_record
+        self.sources.add(doc_id)
+    
+    def flush(self):
+        """Embed and write everything still buffered, then wait for the writer."""
+        while self._texts:
+            self._embed_batch(EMBED_BATCH_SIZE)
+        self._submit_write()
+        if self._write_future is not None:
+            self._write_future.result()
+            self._write_future = None
+    
+    def _apply_changes(self):
+        namespace = self.namespace
+        size = self._write_batch
+        with span("ingest_store"):
+            ids, metadatas = self._updates
+            for start in range(0, len(ids), size):
+                namespace.collection.update(ids=ids[start:start + size], metadatas=metadatas[start:start + size])
+            for start in range(0, len(self._deletes), size):
+                namespace.collection.delete(ids=self._deletes[start:start + size])
+            if self._deletes:
+                namespace.flat_index.remove(self._deletes)
+                namespace.lexical_index.remove(self._deletes)
+    
+    def _embed_batch(self, size: int):
+        texts, self._texts = self._texts[:size], self._texts[size:]
+        ids, self._ids = self._ids[:size], self._ids[size:]
+        metadatas, self._metadatas = self._metadatas[:size], self._metadatas[size:]
+        with span("ingest_embed"):
+            embeddings = embedding_fn(texts)
+        
+        pending_ids, pending_texts, pending_metas, pending_embeddings = self._pending
+        pending_ids.extend(ids)
+        pending_texts.extend(texts)
+        pending_metas.extend(metadatas)
+        pending_embeddings.extend(embeddings)
+        self.embedded += len(texts)
+        if len(pending_ids) >= self._write_batch:
+            self._submit_write()
+    
+    def _submit_write(self):
+        ids, texts, metadatas, embeddings = self._pending
+        if not ids:
+            return
+        self._pending = ([], [], [], [])
+        # Keep at most one write in flight so memory stays bounded
+        if self._write_future is not None:
+            self._write_future.result()
+        # The writer thread records its timing into the current request's trace
+        self._write_future = self._writer.submit(contextvars.copy_context().run, self._write, ids, texts, metadatas, embeddings)
+    
+    def _write(self, ids, texts, metadatas, embeddings):
+        namespace = self.namespace
+        with span("ingest_store"):
+            namespace.collection.add(ids=ids, documents=texts, metadatas=metadatas, embeddings=embeddings)
+            if namespace.flat_in_use:
+                namespace.flat_index.add(ids, embeddings)
+            namespace.lexical_index.add(ids, texts)
+        if self.progress:
+            self.progress(len(ids))
+
+_whitespace = re.compile(r"\s+")
+
+def chunk_hash(text: str) -> str:
+    """Content hash of a chunk, insensitive to whitespace differences."""
+    normalized = _whitespace.sub(" ", text).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+def chunk_id(doc_id: str, content_hash: str, namespace: str = DEFAULT_NAMESPACE) -> str:
+    """Stable, content-addressed ID of a chunk within a document."""
+    # Default-namespace IDs predate namespaces; other namespaces get IDs of
+    # their own, so cached answers never cross namespaces
+    doc_path = doc_id if namespace == DEFAULT_NAMESPACE else f"{namespace}/{doc_id}"
+    doc_key = hashlib.sha1(doc_path.encode("utf-8")).hexdigest()[:12]
+    return f"{doc_key}-{content_hash}"
+
+def document_type(doc_id: str) -> str:
+    """File type of a document as stored in chunk metadata ("pdf", "md", ...)."""
+    return os.path.splitext(doc_id)[1].lstrip(".").lower()
+
+def document_tokenizer(doc_id: str, namespace: str = DEFAULT_NAMESPACE) -> str:
+    """
+    Name of the tokenizer to chunk `doc_id` with: the one recorded when it was
+    last indexed, so re-indexing keeps its chunk boundaries (and chunk IDs),
+    or the best one available for a new document.
+    """
+    namespace = get_namespace(namespace)
+    namespace.sync_shared_state()
+    record = namespace.manifest.get(doc_id) or {}
+    return get_tokenizer(record.get("tokenizer")).name
+
+def index_document(doc_id: str, chunks, writer: ChunkWriter, file_hash: str = None, file_size: int = None,
+                   tokenizer: str = None) -> dict:
+    """
+    Incrementally (re-)index a document through `writer`.
+    
+    The new chunk list is diffed against the document's manifest record:
+    chunks already stored are kept, removed chunks are deleted (once the
+    writer commits), and only new chunks are embedded. New chunks whose content already exists in another
+    document reuse that document's stored embedding.
+    
+    Chunks are consumed lazily, so passing a generator such as
+    docs_loader.iter_document_chunks lets embedding start while the rest of
+    the document is still being parsed.
+    
+    Every chunk carries its document's source, type and ingest time in its
+    metadata, so searches can be filtered by them (see metadata_filter).
+    
+    Args:
+        doc_id: Unique identifier for the document
+        chunks: Iterable of text chunks (or {"text", "page"} dicts) in document order
+        writer: ChunkWriter that embeds and stores the new chunks
+        file_hash: Hash of the source file, recorded to skip unchanged files later
+        file_size: Size of the source file in bytes, shown in the document list
+        tokenizer: Name of the tokenizer the chunks were measured with (see document_tokenizer)
+    
+    Returns:
+        Dict of counts: added, reused, removed, unchanged
+    """
+    namespace = writer.namespace
+    collection = namespace.collection
+    record = namespace.manifest.get(doc_id)
+    if record is None or record.get("legacy"):
+        # Documents indexed before manifests existed used positional IDs
+        legacy_ids = collection.get(where={"source": doc_id}, include=[])["ids"]
+        writer.delete(legacy_ids)
+        old_hashes = []
+    else:
+        old_hashes = record["chunks"]
+    old_positions = {content_hash: i for i, content_hash in enumerate(old_hashes)}
+    
+    hashes = []
+    seen = set()
+    kept_ids, kept_metadatas = [], []
+    ingested_at = time.time()
+    doc_type = document_type(doc_id)
+    donated = []   # (chunk ID, text, metadata, donor chunk ID)
+    counts = {"added": 0, "reused": 0, "removed": 0, "unchanged": 0}
+    
+    def copy_donated():
+        # Identical content already stored under another document: copy its vector
+        stored = collection.get(ids=[donor for _, _, _, donor in donated], include=["embeddings"])
+        by_id = dict(zip(stored["ids"], stored["embeddings"]))
+        for new_id, text, metadata, donor in donated:
+            if donor in by_id:
+                writer.add_embedded([new_id], [text], [metadata], [by_id[donor]])
+                counts["reused"] += 1
+            else:
+                writer.add([new_id], [text], [metadata])
+                counts["added"] += 1
+        donated.clear()
+    
+    for chunk in chunks:
+        text, page = (chunk, None) if isinstance(chunk, str) else (chunk["text"], chunk.get("page"))
+        content_hash = chunk_hash(text)
+        # Deduplicate repeated chunks within the document, keeping the first
+        if content_hash in seen:
+            continue
+        seen.add(content_hash)
+        index = len(hashes)
+        hashes.append(content_hash)
+        
+        metadata = {
+            "source": doc_id, "chunk_index": index, "content_hash": content_hash,
+            "type": doc_type, "ingested_at": ingested_at,
+        }
+        if page is not None:
+            metadata["page"] = page
+        new_id = chunk_id(doc_id, content_hash, namespace.name)
+        
+        if content_hash in old_positions:
+            # Unchanged chunks only need their position and ingest time refreshed, never re-embedding
+            counts["unchanged"] += 1
+            kept_ids.append(new_id)
+            kept_metadatas.append(metadata)
+            continue
+        
+        owners = namespace.manifest.owners(content_hash) - {doc_id}
+        if owners:
+            donated.append((new_id, text, metadata, chunk_id(next(iter(owners)), content_hash, namespace.name)))
+            if len(donated) >= EMBED_BATCH_SIZE:
+                copy_donated()
+        else:
+            writer.add([new_id], [text], [metadata])
+            counts["added"] += 1
+    
+    if donated:
+        copy_donated()
+    writer.update(kept_ids, kept_metadatas)
+    
+    removed = [chunk_id(doc_id, h, namespace.name) for h in old_positions if h not in seen]
+    writer.delete(removed)
+    counts["removed"] = len(removed)
+    
+    writer.record(doc_id, {
+        "file_hash": file_hash,
+        "chunks": hashes,
+        "chunk_count": len(hashes),
+        "size": file_size,
+        "ingested_at": ingested_at,
+        "tokenizer": tokenizer,
+    })
+    return counts
+
+def is_unchanged(doc_id: str, file_hash: str, namespace: str = DEFAULT_NAMESPACE) -> bool:
+    """True if `doc_id` is already indexed in `namespace` from a file with this hash."""
+    namespace = get_namespace(namespace)
+    namespace.sync_shared_state()
+    record = namespace.manifest.get(doc_id)
+    return bool(file_hash) and record is not None and record.get("file_hash") == file_hash
+
+def find_duplicate(file_hash: str, namespace: str = DEFAULT_NAMESPACE) -> str:
+    """Name of a document in `namespace` with exactly this file content, or None."""
+    namespace = get_namespace(namespace)
+    namespace.sync_shared_state()
+    matches = namespace.manifest.find_file(file_hash) if file_hash else []
+    return matches[0] if matches else None
+
+def add_document_to_rag(doc_id: str, chunks, file_hash: str = None, file_size: int = None, namespace: str = DEFAULT_NAMESPACE) -> dict:
     """
     Add document chunks to the RAG knowledge base.
     
+    Re-adding an existing document only embeds chunks that changed.
+    
     Args:
         doc_id: Unique identifier for the document
-        chunks: List of text chunks to add
+        chunks: Text chunks (or {"text", "page"} dicts) to add
+        file_hash: Optional hash of the source file (see docs_loader.hash_file)
+        file_size: Optional size of the source file in bytes
+        namespace: Namespace to add the document to
+    
+    Returns:
+        Dict of counts: added, reused, removed, unchanged
     """
     if not chunks:
+        return {"added": 0, "reused": 0, "removed": 0, "unchanged": 0}
+    
+    with ChunkWriter(namespace=namespace) as writer:
+        return index_document(doc_id, chunks, writer, file_hash, file_size)
+
+# Concurrent questions are embedded together in one call (see embed_batcher.py)
+query_batcher = QueryBatcher(embedding_fn) if EMBED_BATCHING else None
+
+def embed_query(query: str):
+    """Embed a single query, reusing the cached vector for repeated queries."""
+    with span("embed_query"):
+        return _embed_query(query)
+
+def _embed_query(query: str):
+    key = query.strip()
+    embedding = embedding_cache.get(key)
+    if embedding is None:
+        started = time.perf_counter()
+        embedding = query_batcher.embed(query) if query_batcher else embedding_fn([query])[0]
+        # The first call loads the model; later calls are no-ops for readiness
+        readiness.loaded("embedder", time.perf_counter() - started)
+        embedding_cache.put(key, embedding)
+    return embedding
+
+def embedding_stats() -> dict:
+    """Batch-size and queue-wait histograms of query embedding."""
+    return query_batcher.stats() if query_batcher else {"enabled": False}
+
+def warm_embedder():
+    """Run one embedding so the model is loaded before the first question."""
+    if readiness.is_loaded("embedder"):
         return
+    started = time.perf_counter()
+    embedding_fn(["warm up"])
+    readiness.loaded("embedder", time.perf_counter() - started)
+
+# ========================================
+# ⚡ HYBRID RETRIEVAL TUNING
+# ========================================
+# 🎯 HYBRID_SEARCH: Fuse BM25 keyword hits with vector hits
+#    Catches exact identifiers, error codes and names that embeddings miss
+#    Set to False for vector-only search
+# 🎯 HYBRID_CANDIDATES: Hits taken from each retriever before fusion
+# 🎯 RRF_K: Reciprocal rank fusion constant, score = sum of 1 / (RRF_K + rank)
+#    Higher = ranks further down each list still count, Default: 60
+HYBRID_SEARCH = True
+HYBRID_CANDIDATES = 20
+RRF_K = 60
+
+def _timestamp(value) -> float:
+    """Seconds since the epoch from a number or an ISO 8601 date (UTC unless it says otherwise)."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        moment = datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}': use seconds since the epoch or ISO 8601 (2024-05-01)") from None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+def metadata_filter(sources: list = None, types: list = None, after=None, before=None) -> dict:
+    """
+    Build the Chroma `where` filter restricting a search to some documents.
     
-    # Create unique IDs for each chunk
-    ids = [f"{doc_id}_chunk_{i}" for i in range(len(chunks))]
+    Args:
+        sources: Document names to search
+        types: Document types to search ("pdf", "md", "txt"; a leading dot is ignored)
+        after: Only documents ingested at or after this time (epoch seconds or ISO 8601)
+        before: Only documents ingested before this time
     
-    # Add to collection
-    collection.add(
-        ids=ids,
-        documents=chunks,
-        metadatas=[{"source": doc_id, "chunk_index": i} for i in range(len(chunks))]
-    )
+    Returns:
+        The filter, or None if nothing is restricted
+    
+    Raises:
+        ValueError: If a date can't be parsed
+    """
+    conditions = []
+    if sources:
+        conditions.append({"source": {"$in": list(sources)}})
+    if types:
+        conditions.append({"type": {"$in": [doc_type.lstrip(".").lower() for doc_type in types]}})
+    if after not in (None, ""):
+        conditions.append({"ingested_at": {"$gte": _timestamp(after)}})
+    if before not in (None, ""):
+        conditions.append({"ingested_at": {"$lt": _timestamp(before)}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
 
-def retrieve_context(query: str, n_results: int = 2) -> str:
+def _vector_search(namespace: Namespace, query_embedding, n_results: int, where: dict = None) -> list[dict]:
+    """Nearest chunks by embedding; flat index hits carry only id and distance."""
+    namespace.sync_flat_index()
+    # The flat index holds no metadata; filtered searches go to Chroma, which
+    # narrows the candidates with its metadata index before comparing vectors
+    if namespace.flat_in_use and where is None:
+        return [{"id": chunk_id, "distance": distance} for chunk_id, distance in namespace.flat_index.search(query_embedding, n_results)]
+    
+    results = namespace.collection.query(query_embeddings=[query_embedding], n_results=n_results, where=where)
+    hits = []
+    if results["documents"] and results["documents"][0]:
+        ids = results["ids"][0]
+        docs = results["documents"][0]
+        metadatas = (results.get("metadatas") or [[]])[0] or [None] * len(docs)
+        distances = (results.get("distances") or [[]])[0] or [None] * len(docs)
+        hits = [
+            {"id": chunk_id, "document": doc, "metadata": meta or {}, "distance": distance}
+            for chunk_id, doc, meta, distance in zip(ids, docs, metadatas, distances)
+        ]
+    return hits
+
+def _load_hits(namespace: Namespace, hits: list[dict], query_embedding) -> list[dict]:
+    """
+    Fill in document text and metadata for hits that only carry an ID, in one
+    collection.get. Hits without a distance (keyword-only) get one computed
+    from their stored vector. Chunks deleted in the meantime are dropped.
+    """
+    missing = [hit for hit in hits if "document" not in hit]
+    if not missing:
+        return hits
+    unscored = {hit["id"] for hit in missing if hit.get("distance") is None}
+    distances = namespace.flat_index.distances(query_embedding, list(unscored)) if unscored and namespace.flat_in_use else {}
+    include = ["documents", "metadatas"]
+    if len(distances) < len(unscored):
+        include.append("embeddings")
+    stored = namespace.collection.get(ids=[hit["id"] for hit in missing], include=include)
+    query_vector = np.asarray(query_embedding, dtype=np.float32)
+    found = {}
+    for i, chunk_id in enumerate(stored["ids"]):
+        found[chunk_id] = {"document": stored["documents"][i], "metadata": stored["metadatas"][i] or {}}
+        if chunk_id in distances:
+            found[chunk_id]["distance"] = distances[chunk_id]
+        elif chunk_id in unscored:
+            diff = np.asarray(stored["embeddings"][i], dtype=np.float32) - query_vector
+            found[chunk_id]["distance"] = float(diff @ diff)
+    return [
+        hit if "document" in hit else dict(hit, **found[hit["id"]])
+        for hit in hits if "document" in hit or hit["id"] in found
+    ]
+
+def search(query: str, n_results: int = 2, query_embedding=None, namespace: str = DEFAULT_NAMESPACE, where: dict = None) -> list[dict]:
+    """
+    Run a hybrid (vector + BM25) search and return the raw hits.
+    
+    Args:
+        query: The query to search for
+        n_results: Number of results to retrieve
+        query_embedding: Precomputed embedding of `query` (computed if omitted)
+        namespace: Namespace to search
+        where: Optional metadata filter (see metadata_filter)
+    
+    Returns:
+        List of hits, each a dict with id, document, metadata and distance;
+        hybrid hits also carry their fused score and keyword_rank (None if
+        BM25 did not return them)
+    """
+    namespace = get_namespace(namespace, create=False)
+    namespace.sync_shared_state()
+    if query_embedding is None:
+        query_embedding = embed_query(query)
+    
+    filter_key = json.dumps(where, sort_keys=True) if where else None
+    cache_key = (embedding_key(query_embedding), n_results, namespace.name, namespace.version, filter_key)
+    cached = retrieval_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    with span("vector_search"):
+        hits = _vector_search(namespace, query_embedding, max(n_results, HYBRID_CANDIDATES) if HYBRID_SEARCH else n_results, where)
+    hits = _fuse(namespace, query, hits, n_results, where) if HYBRID_SEARCH else hits[:n_results]
+    with span("fetch_chunks"):
+        hits = _load_hits(namespace, hits, query_embedding)
+    retrieval_cache.put(cache_key, hits)
+    return hits
+
+def _fuse(namespace: Namespace, query: str, vector_hits: list[dict], n_results: int, where: dict = None) -> list[dict]:
+    """Merge vector and BM25 rankings with reciprocal rank fusion."""
+    namespace.sync_lexical_index()
+    with span("keyword_search"):
+        keyword_hits = namespace.lexical_index.search(query, HYBRID_CANDIDATES)
+        if where is not None and keyword_hits:
+            # The keyword index holds no metadata; keep the hits the filter allows
+            allowed = set(namespace.collection.get(ids=[chunk_id for chunk_id, _ in keyword_hits], where=where, include=[])["ids"])
+            keyword_hits = [hit for hit in keyword_hits if hit[0] in allowed]
+    
+    scores = {}
+    for rank, hit in enumerate(vector_hits):
+        scores[hit["id"]] = 1.0 / (RRF_K + rank + 1)
+    keyword_rank = {}
+    for rank, (chunk_id, _) in enumerate(keyword_hits):
+        scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+        keyword_rank[chunk_id] = rank
+    ranked = sorted(scores, key=scores.get, reverse=True)[:n_results]
+    
+    # Keyword-only hits get their document and vector distance in _load_hits,
+    # so the prompt packer can compare them with the vector hits
+    by_id = {hit["id"]: hit for hit in vector_hits}
+    return [
+        dict(by_id.get(chunk_id, {"id": chunk_id}), score=scores[chunk_id], keyword_rank=keyword_rank.get(chunk_id))
+        for chunk_id in ranked
+    ]
+
+def format_context(hits: list[dict]) -> str:
+    """Render search hits as the context block passed to the LLM."""
+    # 🎯 doc_truncated: Truncate each document chunk
+    #    Lower = faster processing, Higher = more context per chunk
+    #    Default: 500 characters (balanced)
+    #    Try: 300 for speed, 1000 for detailed context
+    context_parts = []
+    for hit in hits:
+        doc = hit["document"]
+        source = hit["metadata"].get("source", "unknown")
+        doc_truncated = doc[:500] + "..." if len(doc) > 500 else doc
+        context_parts.append(f"[Source: {source}]\n{doc_truncated}")
+    
+    return "\n\n".join(context_parts)
+
+def retrieve_context(query: str, n_results: int = 2, namespace: str = DEFAULT_NAMESPACE, where: dict = None) -> str:
     """
     Retrieve relevant context from the knowledge base.
     
     Args:
         query: The query to search for
         n_results: Number of results to retrieve
+        namespace: Namespace to search
+        where: Optional metadata filter (see metadata_filter)
     
     Returns:
         Concatenated context string
@@ -59,34 +879,117 @@ def retrieve_context(query: str, n_results: int = 2) -> str:
     #    Try: 1 for speed, 3-5 for complex questions
     
     try:
-        results = collection.query(
-            query_texts=[query],
-            n_results=n_results
-        )
-        
-        if not results["documents"] or not results["documents"][0]:
-            return ""
-        
-        # Get documents and their sources
-        docs = results["documents"][0]
-        metadatas = results.get("metadatas", [[]])[0]
-        
-        # 🎯 doc_truncated: Truncate each document chunk
-        #    Lower = faster processing, Higher = more context per chunk
-        #    Default: 500 characters (balanced)
-        #    Try: 300 for speed, 1000 for detailed context
-        context_parts = []
-        for i, (doc, meta) in enumerate(zip(docs, metadatas)):
-            source = meta.get("source", "unknown") if meta else "unknown"
-            doc_truncated = doc[:500] + "..." if len(doc) > 500 else doc
-            context_parts.append(f"[Source: {source}]\n{doc_truncated}")
-        
-        return "\n\n".join(context_parts)
+        return format_context(search(query, n_results, namespace=namespace, where=where))
     except Exception as e:
-        print(f"Error retrieving context: {e}")
+        log.error("Error retrieving context: %s", e)
         return ""
 
-def ask_rag(question: str, stream: bool = False, history: list = None, personalization: str = '', model: str = ''):
+# 🎯 RETRIEVE_CANDIDATES: Chunks handed to the prompt packer per question (after reranking)
+#    The packer keeps only those that fit the token budget and are close in
+#    relevance to the best hit (see prompt_budget.py)
+RETRIEVE_CANDIDATES = 6
+
+def _retrieve_for_question(question: str, namespace: Namespace, where: dict = None) -> tuple:
+    """Embed the question once, search and rerank. Returns (embedding, hits)."""
+    try:
+        embedding = embed_query(question)
+        if not RERANK_ENABLED:
+            return embedding, search(question, n_results=RETRIEVE_CANDIDATES, query_embedding=embedding, namespace=namespace.name, where=where)
+        # Over-fetch, then let the reranker pick the candidates worth packing
+        hits = search(question, n_results=RERANK_CANDIDATES, query_embedding=embedding, namespace=namespace.name, where=where)
+        with span("rerank"):
+            return embedding, rerank(question, hits, idf=namespace.lexical_index.idf)[:RETRIEVE_CANDIDATES]
+    except Exception as e:
+        log.error("Error retrieving context: %s", e)
+        return None, []
+
+def _cache_args(question: str, embedding, hits: list[dict], personalization: str, model: str) -> dict:
+    """Keyword arguments identifying a question + retrieved context in the answer cache."""
+    return {
+        "question": question,
+        "embedding": embedding,
+        "model": model or MODEL_NAME,
+        "personalization": personalization,
+        "chunk_ids": [hit["id"] for hit in hits],
+    }
+
+def _store_answer(namespace: Namespace, cache_args: dict, hits: list[dict], answer: str):
+    sources = {namespace.source_key(hit["metadata"].get("source", "unknown")) for hit in hits}
+    answer_cache.put(sources=sources, answer=answer, **cache_args)
+
+def _caching_stream(chunks, namespace: Namespace, cache_args: dict, hits: list[dict]):
+    """Pass a sync stream through, caching the answer if it completes."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    _store_answer(namespace, cache_args, hits, "".join(parts).strip())
+
+async def _caching_stream_async(chunks, namespace: Namespace, cache_args: dict, hits: list[dict]):
+    """Pass an async stream through, caching the answer if it completes."""
+    parts = []
+    try:
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+    finally:
+        await chunks.aclose()
+    _store_answer(namespace, cache_args, hits, "".join(parts).strip())
+
+def _flight_key(cache_args: dict) -> tuple:
+    return answer_key(cache_args["question"], cache_args["model"], cache_args["personalization"], cache_args["chunk_ids"])
+
+def _summarized_history(history: list, model: str) -> tuple:
+    """
+    Replace the start of `history` with its cached summary, if there is one,
+    and extend the summary in the background once enough new turns piled up.
+    
+    Returns:
+        (messages after the summary, summary or "")
+    """
+    if not history:
+        return history, ''
+    covered, summary = summaries.lookup(history)
+    summaries.schedule(history, covered, summary, model)
+    return history[covered:], summary
+
+def _pack_and_route(question: str, hits: list, history: list, personalization: str, summary: str, model: str) -> tuple:
+    """
+    Fit the prompt into the requested model's context window, then pick the
+    model that answers it. Simple questions may go to a smaller model (see
+    model_router.py); the prompt is packed again if that model's window is
+    smaller than the one chosen.
+    
+    Returns:
+        (PackedPrompt, model that answers)
+    """
+    model = model or MODEL_NAME
+    packed = pack_prompt(question, hits, history, personalization,
+                         max_num_ctx=router.num_ctx(model), summary=summary)
+    routed = router.route(model, question, packed.prompt_tokens)
+    if routed != model and router.num_ctx(routed) < packed.num_ctx:
+        packed = pack_prompt(question, hits, history, personalization,
+                             max_num_ctx=router.num_ctx(routed), summary=summary)
+    return packed, routed
+
+def _stateless_prompt(question: str, hits: list, history: list, personalization: str, model: str) -> tuple:
+    """
+    The whole conversation packed into one prompt, for requests without a
+    session. Long conversations are summarized in the background, never on
+    this request's path.
+    
+    Returns:
+        (PackedPrompt, model that answers)
+    """
+    recent, summary = _summarized_history(history, model)
+    return _pack_and_route(question, hits, recent, personalization, summary, model)
+
+async def _answer_once(packed, model: str):
+    """A non-streaming generation as a one-chunk stream, so it can be shared through single_flight."""
+    yield await ask_ollama_async(packed.prompt, system=packed.system_prompt, model_name=model, num_ctx=packed.num_ctx)
+
+def ask_rag(question: str, stream: bool = False, history: list = None, personalization: str = '', model: str = '',
+            namespace: str = DEFAULT_NAMESPACE, where: dict = None):
     """
     Ask a question using RAG (Retrieval Augmented Generation).
     
@@ -96,110 +999,229 @@ def ask_rag(question: str, stream: bool = False, history: list = None, personali
         history: Previous conversation messages for context
         personalization: User's personalization preferences
         model: Model name to use for generation
+        namespace: Namespace whose documents are searched
+        where: Optional metadata filter on the searched chunks (see metadata_filter)
     
     Returns:
         If stream=False: Complete answer string
         If stream=True: Generator yielding answer chunks
     """
-    # Retrieve relevant context from documents
-    context = retrieve_context(question)
-    
-    # ========================================
-    # ⚡ CONVERSATION HISTORY TUNING FOR FASTER RESPONSES
-    # ========================================
-    # 🎯 history[-2:]: Number of previous messages to include
-    #    Lower = faster but less conversational context
-    #    Higher = slower but AI remembers more of the conversation
-    #    Default: last 2 messages (1 user + 1 assistant exchange)
-    #    Try: history[-1:] for fastest, history[-4:] for better context
-    
-    conversation_context = ""
-    if history:
-        conversation_context = "Previous conversation:\n"
-        for msg in history[-2:]:
-            role = "User" if msg.get("role") == "user" else "Assistant"
-            content = msg.get("content", "")
-            
-            # 🎯 Truncate long messages: Limit character count per message
-            #    Lower = faster processing, Higher = more context
-            #    Default: 150 characters (good for speed)
-            #    Try: 100 for faster, 300 for more context
-            if len(content) > 150:
-                content = content[:150] + "..."
-            conversation_context += f"{role}: {content}\n"
-        conversation_context += "\n"
-    
-    # ========================================
-    # 🎯 SYSTEM PROMPT CUSTOMIZATION
-    # ========================================
-    # Edit the system prompt below to change AI personality and behavior
-    # Shorter prompts = faster responses, Detailed prompts = more specific behavior
-    
-    system_prompt = None
-    if conversation_context or context or personalization:
-        system_parts = [
-            # 🎯 Default AI personality - Edit this to change behavior!
-            "You are a helpful AI assistant. Provide short but well-structured answers."
-            # Examples to try:
-            # "You are a coding expert. Provide concise, practical solutions."
-            # "You are a friendly tutor. Explain concepts clearly with examples."
-            # "You are a research assistant. Provide detailed, factual answers."
-        ]
-        if personalization:
-            system_parts.append(personalization)
-        if conversation_context:
-            system_parts.append(conversation_context)
-        if context:
-            system_parts.append(f"Relevant document context:\n{context}")
-        system_prompt = "\n\n".join(system_parts)
-    else:
-        # 🎯 Default system prompt when no context - Edit to change default behavior!
-        system_prompt = "You are a helpful AI assistant. Provide short but well-structured answers."
+    namespace = get_namespace(namespace, create=False)
+    # Retrieve relevant context from documents and fit it into the token budget
+    embedding, hits = _retrieve_for_question(question, namespace, where)
+    with span("prompt_assembly"):
+        packed, model = _stateless_prompt(question, hits, history, personalization, model)
     
-    # Build the current question prompt
-    prompt = f"{question}"
+    # Follow-up questions depend on the conversation, so only standalone
+    # questions are answered from (and stored in) the answer cache
+    cache_args = None
+    if not history:
+        cache_args = _cache_args(question, embedding, packed.hits, personalization, model)
+        cached = answer_cache.get(**cache_args)
+        if cached is not None:
+            return replay(cached) if stream else cached
     
     # Get response from LLM
     if stream:
         # Return generator for streaming
-        return ask_ollama(prompt, stream=True, system=system_prompt, model_name=model)
+        chunks = ask_ollama(packed.prompt, stream=True, system=packed.system_prompt, model_name=model, num_ctx=packed.num_ctx)
+        return _caching_stream(chunks, namespace, cache_args, packed.hits) if cache_args else chunks
     else:
         # Non-streaming call - ask_ollama is synchronous
         try:
-            return ask_ollama(prompt, stream=False, system=system_prompt, model_name=model)
+            answer = ask_ollama(packed.prompt, stream=False, system=packed.system_prompt, model_name=model, num_ctx=packed.num_ctx)
         except Exception as e:
-            print(f"Error calling Ollama: {e}")
+            log.error("Error calling Ollama: %s", e)
             raise Exception(f"Failed to get response from LLM: {str(e)}")
+        if cache_args:
+            _store_answer(namespace, cache_args, packed.hits, answer)
+        return answer
 
-def get_collection_stats():
-    """Get statistics about the document collection."""
+async def ask_rag_async(question: str, stream: bool = False, history: list = None, personalization: str = '', model: str = '', session_id: str = '',
+                        namespace: str = DEFAULT_NAMESPACE, where: dict = None):
+    """
+    Async version of ask_rag for use from async request handlers.
+    
+    Retrieval (embedding + vector search) is CPU bound, so it runs in a worker
+    thread; generation goes through the pooled async Ollama client.
+    
+    With a session_id, follow-up questions keep the conversation server-side
+    and send it through /api/chat as an append-only message list, so Ollama
+    can reuse the prompt it already evaluated on earlier turns (see
+    sessions.py). Standalone questions ignore it, so they still go through
+    the answer cache, single-flight and routing.
+    
+    Only `namespace` is searched, narrowed further by the `where` metadata
+    filter if one is given (see metadata_filter).
+    
+    Returns:
+        If stream=False: Complete answer string
+        If stream=True: Async generator yielding answer chunks
+    """
+    # Opening a namespace loads its collection and indexes from disk
+    namespace = await asyncio.to_thread(get_namespace, namespace, False)
+    embedding, hits = await asyncio.to_thread(_retrieve_for_question, question, namespace, where)
+    if session_id and history:
+        session = sessions.get(session_id, model or MODEL_NAME, base_system_prompt(personalization), namespace.name)
+        if stream:
+            return _stream_session_turn(session, question, history, hits, personalization)
+        return await _session_turn(session, question, history, hits, personalization)
+    with span("prompt_assembly"):
+        packed, model = _stateless_prompt(question, hits, history, personalization, model)
+    
+    cache_args = None
+    if not history:
+        cache_args = _cache_args(question, embedding, packed.hits, personalization, model)
+        cached = answer_cache.get(**cache_args)
+        if cached is not None:
+            return replay_async(cached) if stream else cached
+    
+    # Identical standalone questions asked while this one is generating share
+    # its generation instead of starting their own (see single_flight.py)
+    flight_key = _flight_key(cache_args) if cache_args and SINGLE_FLIGHT else None
+    if stream:
+        def start_stream():
+            chunks = stream_ollama_async(packed.prompt, system=packed.system_prompt, model_name=model, num_ctx=packed.num_ctx)
+            return _caching_stream_async(chunks, namespace, cache_args, packed.hits) if cache_args else chunks
+        return single_flight.stream(flight_key, start_stream) if flight_key else start_stream()
     try:
-        count = collection.count()
-        # Get unique sources
-        if count > 0:
-            results = collection.get()
-            sources = set()
-            if results.get("metadatas"):
-                for meta in results["metadatas"]:
-                    if meta and "source" in meta:
-                        sources.add(meta["source"])
-            return {
-                "total_chunks": count,
-                "total_documents": len(sources),
-                "documents": list(sources)
-            }
-        return {"total_chunks": 0, "total_documents": 0, "documents": []}
+        if flight_key:
+            return await single_flight.answer(
+                flight_key, lambda: _caching_stream_async(_answer_once(packed, model), namespace, cache_args, packed.hits))
+        answer = await ask_ollama_async(packed.prompt, system=packed.system_prompt, model_name=model, num_ctx=packed.num_ctx)
+    except Exception as e:
+        log.error("Error calling Ollama: %s", e)
+        raise Exception(f"Failed to get response from LLM: {str(e)}")
+    if cache_args:
+        _store_answer(namespace, cache_args, packed.hits, answer)
+    return answer
+
+def _prepare_turn(session, question: str, history: list, hits: list) -> tuple:
+    """
+    Sync the session with the client's history and build the next message list.
+    
+    Returns:
+        (messages, user message content), or None if the latest exchange alone
+        leaves no room for this turn and the request should go without the session
+    """
+    with span("prompt_assembly"):
+        trims = session.trims
+        if not session.matches(history):
+            session.reset(history)
+        session.trim()
+        if history:
+            covered, summary = summaries.lookup(history)
+            if summary and (session.trims != trims or not session.fits):
+                # Trimming already changed the prefix Ollama cached, so the
+                # summarized turns can be swapped for their summary at no extra cost
+                session.set_summary(summary, history, covered)
+            summaries.schedule(history, covered, summary, session.model)
+        if not session.fits:
+            return None
+        user_content, _, _ = pack_turn(question, hits, session.budget - session.tokens)
+        return session.messages(user_content), user_content
+
+async def _session_turn(session, question: str, history: list, hits: list, personalization: str) -> str:
+    # One turn at a time per session, so the message list stays append-only
+    async with session.lock:
+        prepared = _prepare_turn(session, question, history, hits)
+        try:
+            if prepared is None:
+                # The stateless prompt truncates an oversized exchange instead of dropping it
+                packed, model = _stateless_prompt(question, hits, history, personalization, session.model)
+                return await ask_ollama_async(packed.prompt, system=packed.system_prompt, model_name=model, num_ctx=packed.num_ctx)
+            messages, user_content = prepared
+            answer = await chat_ollama_async(messages, model_name=session.model, num_ctx=session.num_ctx)
+        except Exception as e:
+            log.error("Error calling Ollama: %s", e)
+            raise Exception(f"Failed to get response from LLM: {str(e)}")
+        session.append(question, user_content, answer)
+        return answer
+
+async def _stream_session_turn(session, question: str, history: list, hits: list, personalization: str):
+    async with session.lock:
+        prepared = _prepare_turn(session, question, history, hits)
+        if prepared is None:
+            packed, model = _stateless_prompt(question, hits, history, personalization, session.model)
+            chunks = stream_ollama_async(packed.prompt, system=packed.system_prompt, model_name=model, num_ctx=packed.num_ctx)
+            try:
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                await chunks.aclose()
+            return
+        messages, user_content = prepared
+        parts = []
+        async for chunk in stream_chat_ollama_async(messages, model_name=session.model, num_ctx=session.num_ctx):
+            parts.append(chunk)
+            yield chunk
+        # Only completed answers become part of the session
+        session.append(question, user_content, "".join(parts))
+
+def get_collection_stats(namespace: str = DEFAULT_NAMESPACE):
+    """
+    Get statistics about the document collection of a namespace.
+    
+    Served from the document registry, so the cost grows with the number of
+    documents rather than the number of chunks.
+    """
+    try:
+        namespace = get_namespace(namespace, create=False)
+        namespace.sync_shared_state()
+        namespace.sync_registry()
+        documents = namespace.manifest.documents()
+        return {
+            "namespace": namespace.name,
+            "total_chunks": namespace.collection.count(),
+            "total_documents": len(documents),
+            "documents": [doc["name"] for doc in documents],
+            "details": documents,
+        }
+    except (InvalidNamespace, UnknownNamespace):
+        raise
     except Exception as e:
         return {"error": str(e)}
 
-def clear_collection():
-    """Clear all documents from the collection."""
-    global collection, chroma_client
+def delete_document(doc_id: str, namespace: str = DEFAULT_NAMESPACE) -> dict:
+    """
+    Remove one document's chunks from the knowledge base.
+    
+    Args:
+        doc_id: Document ID (the uploaded file name)
+        namespace: Namespace the document belongs to
+    
+    Returns:
+        {"name", "chunks_removed"}, or None if the document is unknown
+    
+    Raises:
+        UnknownNamespace: If the namespace doesn't exist
+    """
+    namespace = get_namespace(namespace, create=False)
+    with namespace.write_lock:
+        namespace.sync_shared_state()
+        collection = namespace.collection
+        ids = collection.get(where={"source": doc_id}, include=[])["ids"]
+        if not ids and namespace.manifest.get(doc_id) is None:
+            return None
+        collection.delete(where={"source": doc_id})
+        namespace.flat_index.remove(ids)
+        namespace.lexical_index.remove(ids)
+        namespace.lexical_index.save()
+        namespace.refresh_flat_index()
+        namespace.manifest.remove(doc_id)
+        namespace.bump_version()
+        answer_cache.invalidate_source(namespace.source_key(doc_id))
+    return {"name": doc_id, "chunks_removed": len(ids)}
+
+def clear_collection(namespace: str = DEFAULT_NAMESPACE):
+    """Clear all documents of one namespace; other namespaces are untouched."""
+    namespace = get_namespace(namespace, create=False)
     try:
-        chroma_client.delete_collection("documents")
-        collection = chroma_client.get_or_create_collection(
-            name="documents",
-            embedding_function=embedding_fn
-        )
+        namespace.clear()
+        # Earlier turns quote context from the deleted documents
+        sessions.clear(namespace.name)
     except Exception as e:
-        print(f"Error clearing collection: {e}")
+        log.error("Error clearing namespace %s: %s", namespace.name, e)
+
+# Store, manifest and keyword index are open once this module has been imported
+readiness.loaded("store", time.perf_counter() - _import_started)
@@ -0,0 +1,171 @@
+# backend/rerank.py
+"""
+Reranking of retrieved candidates before prompt packing.
+
+rag.py over-fetches candidates and this module reorders them with a more
+precise scorer: a CPU cross-encoder when sentence-transformers is installed
+and RERANKER is set to "cross-encoder", otherwise a cheap lexical-overlap
+scorer blended with vector similarity. Candidates are scored best-first in
+batches under a per-request time budget; whatever is left unscored when the
+budget runs out keeps its retrieval order after the scored ones. Scores are
+cached per (query, chunk) pair, and chunk IDs are content hashes, so a cached
+score never refers to stale text.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from lexical_index import tokenize
+from prompt_budget import relevance
+
+from logger import get_logger
+
+log = get_logger(__name__)
+
+# ========================================
+# ⚡ RERANKING TUNING
+# ========================================
+# 🎯 RERANK_ENABLED: Rerank retrieved candidates before packing the prompt
+# 🎯 RERANKER: "lexical" (fast, no extra dependencies) or "cross-encoder"
+#    The cross-encoder needs `pip install sentence-transformers`; without it
+#    the lexical scorer is used
+# 🎯 CROSS_ENCODER_MODEL: Model used when RERANKER = "cross-encoder"
+# 🎯 RERANK_CANDIDATES: Candidates fetched from retrieval for reranking
+# 🎯 RERANK_BATCH_SIZE: Candidates scored per batch; the budget is checked between batches
+# 🎯 RERANK_BUDGET_MS: Time allowed for reranking one request
+#    Lower = predictable latency, Higher = more candidates actually reranked
+# 🎯 LEXICAL_WEIGHT: Share of the lexical score vs vector similarity (lexical scorer only)
+# 🎯 RERANK_CACHE_ENTRIES: Cached (query, chunk) scores
+RERANK_ENABLED = True
+RERANKER = "lexical"
+CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_CANDIDATES = 20
+RERANK_BATCH_SIZE = 8
+RERANK_BUDGET_MS = 150
+LEXICAL_WEIGHT = 0.5
+RERANK_CACHE_ENTRIES = 8192
+
+class LexicalScorer:
+    """IDF-weighted share of query terms found in the chunk, blended with vector similarity."""
+
+    name = "lexical"
+
+    def score(self, query: str, hits: list[dict], idf=None) -> list[float]:
+        """Score `hits`, weighting query terms with `idf` (the searched corpus's keyword index)."""
+        terms = set(tokenize(query))
+        weights = idf(terms) if idf else dict.fromkeys(terms, 1.0)
+        total = sum(weights.values())
+        scores = []
+        for hit in hits:
+            if total:
+                chunk_terms = set(tokenize(hit["document"]))
+                overlap = sum(weight for term, weight in weights.items() if term in chunk_terms) / total
+            else:
+                overlap = 0.0
+            scores.append(LEXICAL_WEIGHT * overlap + (1 - LEXICAL_WEIGHT) * relevance(hit))
+        return scores
+
+class CrossEncoderScorer:
+    """Cross-encoder relevance of (query, chunk) pairs, run on CPU."""
+
+    name = "cross-encoder"
+
+    def __init__(self, model_name: str = CROSS_ENCODER_MODEL):
+        from sentence_transformers import CrossEncoder
+        self._model = CrossEncoder(model_name, device="cpu")
+
+    def score(self, query: str, hits: list[dict], idf=None) -> list[float]:
+        pairs = [(query, hit["document"]) for hit in hits]
+        return [float(s) for s in self._model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)]
+
+class ScoreCache:
+    """LRU cache of (scorer, query, chunk ID) -> score."""
+
+    def __init__(self, max_entries: int = RERANK_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self._lock:
+            score = self._entries.get(key)
+            if score is not None:
+                self._entries.move_to_end(key)
+            return score
+
+    def put(self, key: tuple, score: float):
+        with self._lock:
+            self._entries[key] = score
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+score_cache = ScoreCache()
+
+_scorer = None
+_scorer_lock = threading.Lock()
+
+def get_scorer():
+    """Return the configured scorer, loading the cross-encoder on first use."""
+    global _scorer
+    if _scorer is None:
+        with _scorer_lock:
+            if _scorer is None:
+                if RERANKER == "cross-encoder":
+                    try:
+                        _scorer = CrossEncoderScorer()
+                    except Exception as e:
+                        log.warning("Cross-encoder unavailable (%s), reranking with the lexical scorer", e)
+                        _scorer = LexicalScorer()
+                else:
+                    _scorer = LexicalScorer()
+    return _scorer
+
+def rerank(query: str, hits: list[dict], budget_ms: float = RERANK_BUDGET_MS, idf=None) -> list[dict]:
+    """
+    Reorder retrieved hits by reranker score within a time budget.
+
+    Args:
+        query: The user's question
+        hits: Retrieved hits in retrieval order (best first)
+        budget_ms: Time allowed for scoring uncached candidates
+        idf: Optional callable mapping terms to IDF weights (lexical scorer)
+
+    Returns:
+        The hits, scored ones first by descending score (each with a
+        rerank_score), then any unscored ones in their original order
+    """
+    if not hits:
+        return hits
+    scorer = get_scorer()
+    key_query = " ".join(query.lower().split())
+    deadline = time.perf_counter() + budget_ms / 1000
+
+    scores = {}
+    pending = []
+    for index, hit in enumerate(hits):
+        cached = score_cache.get((scorer.name, key_query, hit["id"]))
+        if cached is None:
+            pending.append(index)
+        else:
+            scores[index] = cached
+
+    # Batches go best-first, so running out of time only leaves the tail in retrieval order
+    for start in range(0, len(pending), RERANK_BATCH_SIZE):
+        if time.perf_counter() >= deadline:
+            log.info("Rerank budget of %s ms exhausted after %d/%d candidates", budget_ms, len(scores), len(hits))
+            break
+        batch = pending[start:start + RERANK_BATCH_SIZE]
+        for index, score in zip(batch, scorer.score(query, [hits[i] for i in batch], idf)):
+            scores[index] = score
+            score_cache.put((scorer.name, key_query, hits[index]["id"]), score)
+
+    # Scores are only comparable among the scored prefix, never against unscored hits
+    scored = sorted(scores, key=lambda i: (-scores[i], i))
+    reranked = [dict(hits[i], rerank_score=scores[i]) for i in scored]
+    reranked += [hits[i] for i in range(len(hits)) if i not in scores]
+    return reranked
@@ -0,0 +1,124 @@
+# backend/retrieval_cache.py
+"""
+In-process caches for the retrieval step.
+
+EmbeddingCache keeps query embeddings in one preallocated float32 matrix, so
+repeated and regenerated questions skip the MiniLM forward pass. Its memory use
+is fixed up front instead of growing with one Python list per query.
+
+RetrievalCache keeps vector search results keyed on the query embedding,
+n_results and the collection version. Every ingest or clear bumps the version,
+so results from before a change can never be served after it.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# ========================================
+# ⚡ RETRIEVAL CACHE TUNING
+# ========================================
+# 🎯 EMBEDDING_CACHE_BYTES: Memory reserved for cached query embeddings
+#    Default: 8 MB (~5,400 MiniLM vectors of 384 float32 values)
+# 🎯 RETRIEVAL_CACHE_ENTRIES: Maximum cached vector search results
+EMBEDDING_CACHE_BYTES = 8 * 1024 * 1024
+RETRIEVAL_CACHE_ENTRIES = 2048
+
+def embedding_key(embedding) -> str:
+    """Stable hash of an embedding vector."""
+    vector = np.ascontiguousarray(embedding, dtype=np.float32)
+    return hashlib.sha1(vector.tobytes()).hexdigest()
+
+class EmbeddingCache:
+    """LRU cache of query text -> embedding, stored in a fixed float32 matrix."""
+
+    def __init__(self, max_bytes: int = EMBEDDING_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._matrix = None          # allocated on first insert, once the dimension is known
+        self._rows = OrderedDict()   # text -> row index, in LRU order
+        self._free = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text: str):
+        """Return a copy of the cached embedding for `text`, or None."""
+        with self._lock:
+            row = self._rows.get(text)
+            if row is None:
+                self.misses += 1
+                return None
+            self._rows.move_to_end(text)
+            self.hits += 1
+            return self._matrix[row].copy()
+
+    def put(self, text: str, embedding):
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        with self._lock:
+            if self._matrix is None:
+                capacity = max(1, self.max_bytes // (vector.size * 4))
+                self._matrix = np.zeros((capacity, vector.size), dtype=np.float32)
+                self._free = list(range(capacity - 1, -1, -1))
+            if vector.size != self._matrix.shape[1]:
+                return
+
+            row = self._rows.get(text)
+            if row is None:
+                if self._free:
+                    row = self._free.pop()
+                else:
+                    _, row = self._rows.popitem(last=False)
+                self._rows[text] = row
+            else:
+                self._rows.move_to_end(text)
+            self._matrix[row] = vector
+
+    def clear(self):
+        with self._lock:
+            if self._matrix is not None:
+                self._free = list(range(self._matrix.shape[0] - 1, -1, -1))
+            self._rows.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            capacity = 0 if self._matrix is None else self._matrix.shape[0]
+            return {"entries": len(self._rows), "capacity": capacity, "hits": self.hits, "misses": self.misses}
+
+class RetrievalCache:
+    """LRU cache of (embedding hash, n_results, collection version) -> search hits."""
+
+    def __init__(self, max_entries: int = RETRIEVAL_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple):
+        with self._lock:
+            hits = self._entries.get(key)
+            if hits is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(hits)
+
+    def put(self, key: tuple, hits: list):
+        with self._lock:
+            self._entries[key] = list(hits)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+embedding_cache = EmbeddingCache()
+retrieval_cache = RetrievalCache()
@@ -0,0 +1,209 @@
+# backend/sessions.py
+"""
+Server-side chat sessions for prompt-cache reuse.
+
+Ollama keeps the evaluated tokens of the last prompt it ran and only has to
+evaluate what comes after the longest shared prefix. A session therefore
+keeps the exact message list sent on earlier turns (system message first,
+then every user/assistant turn verbatim, retrieved context included) and
+only appends to it, so a follow-up turn re-evaluates just the new message.
+
+The client still sends its history; when it no longer matches the session
+(edited or regenerated messages, a restarted server) the session is rebuilt
+from that history.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+from model_router import router
+from prompt_budget import NUM_CTX_CHOICES, SUMMARY_HEADER, estimate_tokens, response_reserve
+
+# ========================================
+# ⚡ CHAT SESSION TUNING
+# ========================================
+# 🎯 MAX_SESSIONS: Sessions kept in memory (least recently used are dropped first)
+# 🎯 SESSION_TTL_SECONDS: Idle sessions expire after this long
+#    Default: 1800 (matches keep_alive in models.json; once the model unloads its prompt cache is gone)
+# 🎯 SESSION_NUM_CTX: Context window for every session turn, capped at the
+#    model's "num_ctx" in models.json (see session_num_ctx)
+#    Fixed per model because changing num_ctx reloads the model and discards its prompt cache
+# 🎯 TRIM_TARGET_RATIO: When a conversation outgrows the window, drop the oldest
+#    turns until it fills this share of the budget
+#    Trimming changes the prefix (one full re-evaluation), so trim rarely but deeply
+# 🎯 MIN_TURN_RATIO: Share of the budget kept free for a new turn's context and question
+#    A share rather than a fixed size, so small context windows still keep earlier turns
+MAX_SESSIONS = 256
+SESSION_TTL_SECONDS = 1800
+SESSION_NUM_CTX = max(NUM_CTX_CHOICES)
+TRIM_TARGET_RATIO = 0.5
+MIN_TURN_RATIO = 0.25
+
+def session_num_ctx(model: str) -> int:
+    """Context window of session turns answered by `model`."""
+    return min(SESSION_NUM_CTX, router.num_ctx(model))
+
+def _history_turns(history: list) -> list:
+    """Pair up a client history into (question, answer) turns."""
+    turns = []
+    question = None
+    for msg in history or []:
+        if msg.get("role") == "user":
+            question = msg.get("content", "")
+        elif question is not None:
+            turns.append((question, msg.get("content", "")))
+            question = None
+    return turns
+
+class ChatSession:
+    """Message list of one conversation, grown append-only between trims."""
+
+    def __init__(self, session_id: str, model: str, system_prompt: str, namespace: str = ""):
+        self.session_id = session_id
+        self.namespace = namespace
+        self.model = model
+        self.system_prompt = system_prompt
+        self.system_tokens = estimate_tokens(system_prompt)
+        self.num_ctx = session_num_ctx(model)
+        self.budget = self.num_ctx - response_reserve(self.num_ctx)
+        # Most the earlier turns may take up, leaving room for the next one
+        self.history_limit = self.budget - int(self.budget * MIN_TURN_RATIO)
+        # Summary of turns dropped by trimming (see summaries.py)
+        self.summary = ""
+        self.summary_tokens = 0
+        self.turns = []
+        self.trims = 0
+        self.lock = asyncio.Lock()
+        self.updated_at = time.monotonic()
+
+    @property
+    def tokens(self) -> int:
+        return self.system_tokens + self.summary_tokens + sum(turn["tokens"] for turn in self.turns)
+
+    @property
+    def fits(self) -> bool:
+        """Whether the earlier turns leave room for the next one."""
+        return self.tokens <= self.history_limit
+
+    def matches(self, history: list) -> bool:
+        """Whether the client's history shows exactly the answers in this session."""
+        answers = [answer.strip() for _, answer in _history_turns(history)]
+        if not self.turns:
+            return not answers
+        # Trimmed turns are still in the client's history, so compare the tail
+        return answers[-len(self.turns):] == [turn["answer"].strip() for turn in self.turns]
+
+    def reset(self, history: list):
+        """Rebuild the turns from the client's history (without retrieved context)."""
+        self.turns = []
+        self.set_summary("")
+        for question, answer in _history_turns(history):
+            self.append(question, question, answer)
+        self.trim()
+
+    def trim(self):
+        """
+        Drop the oldest turns once the conversation no longer fits in
+        history_limit. The latest turn is always kept: a follow-up question
+        needs it, and if it alone is too large the session doesn't fit.
+        """
+        if self.fits:
+            return
+        target = int(self.budget * TRIM_TARGET_RATIO)
+        while len(self.turns) > 1 and self.tokens > target:
+            self.turns.pop(0)
+        self.trims += 1
+
+    def set_summary(self, summary: str, history: list = None, covered: int = 0):
+        """
+        Carry `summary` of the first `covered` messages of the client's
+        `history` in the system message, dropping the turns it covers.
+
+        Changes the prefix Ollama has cached, so it is only set when a trim
+        has already changed it.
+        """
+        self.summary = summary
+        self.summary_tokens = estimate_tokens(SUMMARY_HEADER + summary) if summary else 0
+        if summary and history:
+            keep = len(_history_turns(history)) - len(_history_turns(history[:covered]))
+            if len(self.turns) > keep:
+                self.turns = self.turns[len(self.turns) - keep:] if keep else []
+
+    def messages(self, user_content: str) -> list:
+        """Full message list for the next request, ending with `user_content`."""
+        system_prompt = f"{self.system_prompt}\n\n{SUMMARY_HEADER}{self.summary}" if self.summary else self.system_prompt
+        messages = [{"role": "system", "content": system_prompt}]
+        for turn in self.turns:
+            messages.append({"role": "user", "content": turn["user"]})
+            messages.append({"role": "assistant", "content": turn["answer"]})
+        messages.append({"role": "user", "content": user_content})
+        return messages
+
+    def append(self, question: str, user_content: str, answer: str):
+        """Record a finished turn exactly as it was sent and answered."""
+        self.turns.append({
+            "question": question,
+            "user": user_content,
+            "answer": answer,
+            "tokens": estimate_tokens(user_content) + estimate_tokens(answer),
+        })
+        self.updated_at = time.monotonic()
+
+class SessionStore:
+    """LRU + TTL map of session ID -> ChatSession."""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, ttl_seconds: float = SESSION_TTL_SECONDS):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str, model: str, system_prompt: str, namespace: str = "") -> ChatSession:
+        """
+        Return the session for `session_id`, creating it if needed.
+
+        A different model or system prompt starts a fresh session, since none
+        of the cached prefix would be reusable; so does switching namespace,
+        since earlier turns quote another namespace's documents.
+        """
+        with self._lock:
+            now = time.monotonic()
+            session = self._sessions.get(session_id)
+            if session is not None and (
+                session.model != model
+                or session.system_prompt != system_prompt
+                or session.namespace != namespace
+                or now - session.updated_at > self.ttl_seconds
+            ):
+                session = None
+            if session is None:
+                session = ChatSession(session_id, model, system_prompt, namespace)
+                self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def clear(self, namespace: str = None):
+        """Drop every session, or only those of `namespace`."""
+        with self._lock:
+            if namespace is None:
+                self._sessions.clear()
+                return
+            for session_id in [key for key, session in self._sessions.items() if session.namespace == namespace]:
+                del self._sessions[session_id]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "turns": sum(len(s.turns) for s in self._sessions.values()),
+                "trims": sum(s.trims for s in self._sessions.values()),
+            }
+
+sessions = SessionStore()
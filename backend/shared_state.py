@@ -0,0 +1,90 @@
+# backend/shared_state.py
+"""
+State shared between API worker processes.
+
+With `uvicorn app:app --workers N` every worker keeps its own manifest,
+keyword index and caches in memory. Two files next to the collection keep
+them consistent:
+
+- a write lock, held for the whole of any change to the collection
+  (ingestion, deletes, clears), so only one thread of one process writes at
+  a time;
+- a collection version, bumped after every change. Workers compare it with
+  the version they last saw before serving a request and reload their
+  in-memory state when another worker changed the collection.
+
+A single worker uses the same path; the lock is then never contended.
+"""
+import os
+import tempfile
+import threading
+
+from filelock import FileLock
+
+class WriteLock:
+    """
+    Write lock excluding other threads and other processes.
+
+    A FileLock is reentrant within its process, so on its own it would let
+    two ingestion workers of one process write at once; a thread lock is
+    taken first, then the file lock for the other processes.
+    """
+
+    def __init__(self, path: str):
+        self._thread_lock = threading.Lock()
+        self._file_lock = FileLock(path, thread_local=False)
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        try:
+            self._file_lock.acquire()
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+    def release(self):
+        try:
+            self._file_lock.release()
+        finally:
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+def write_lock(path: str) -> WriteLock:
+    """Cross-thread and cross-process write lock (see WriteLock)."""
+    return WriteLock(path)
+
+class SharedVersion:
+    """Monotonic counter in a small file, bumped under the write lock."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def read(self) -> int:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def bump(self) -> int:
+        """Increment and return the version (call with the write lock held)."""
+        version = self.read() + 1
+        # A unique temporary file per bump, so concurrent writers never replace each other's
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(self.path) + ".", suffix=".tmp",
+                                        dir=os.path.dirname(self.path) or ".")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(str(version))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return version
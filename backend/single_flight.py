@@ -0,0 +1,142 @@
+# backend/single_flight.py
+"""
+Single-flight coalescing of identical in-flight questions.
+
+When many users ask the same question at the same moment, every request
+would otherwise miss the answer cache (nothing is cached until the first
+answer completes) and start its own generation. SingleFlight lets the first
+request for a key start one upstream generation and every identical request
+that arrives while it runs join it:
+
+- streaming subscribers first receive the chunks already generated, then
+  the live tail
+- non-streaming subscribers wait for the complete answer
+- the upstream generation runs in its own task, so it keeps going when the
+  request that started it disconnects; it is cancelled (closing the stream
+  to Ollama) only once every subscriber has gone
+
+Keys identify an answer the way the answer cache does (normalized question,
+model, personalization and retrieved chunk IDs), so a finished flight is
+followed by cache hits.
+"""
+import asyncio
+import os
+
+from metrics import Counter, Gauge, annotate
+
+# ========================================
+# ⚡ REQUEST COALESCING
+# ========================================
+# 🎯 SINGLE_FLIGHT: Share one generation between identical concurrent questions
+#    (SINGLE_FLIGHT=0 to disable)
+SINGLE_FLIGHT = os.environ.get("SINGLE_FLIGHT", "1") != "0"
+
+COALESCED = Counter("rag_single_flight_total", "Questions that started (leader) or joined (follower) a generation", ("role",))
+
+class Flight:
+    """One upstream generation and the chunks it has produced so far."""
+
+    def __init__(self):
+        self.parts = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        self._changed = asyncio.Condition()
+
+    async def _publish(self, part: str = None, error: BaseException = None, done: bool = False):
+        async with self._changed:
+            if part is not None:
+                self.parts.append(part)
+            if error is not None:
+                self.error = error
+            self.done = done
+            self._changed.notify_all()
+
+    async def _parts(self):
+        """Every chunk from the first one, waiting for new ones until the generation ends."""
+        index = 0
+        while True:
+            while index < len(self.parts):
+                yield self.parts[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.parts) or self.done)
+
+class SingleFlight:
+    """Registry of in-flight generations by answer key."""
+
+    def __init__(self):
+        self._flights = {}
+
+    def _join(self, key, start) -> Flight:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = Flight()
+            flight.task = asyncio.create_task(self._run(key, flight, start()))
+            role = "leader"
+        else:
+            role = "follower"
+        COALESCED.inc(1, role)
+        annotate(single_flight=role)
+        return flight
+
+    async def _run(self, key, flight: Flight, chunks):
+        try:
+            async for part in chunks:
+                await flight._publish(part)
+        except asyncio.CancelledError as e:
+            await flight._publish(error=e, done=True)
+            raise
+        except Exception as e:
+            await flight._publish(error=e, done=True)
+        else:
+            await flight._publish(done=True)
+        finally:
+            await chunks.aclose()
+            # Later identical questions start afresh (or hit the answer cache)
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def _leave(self, key, flight: Flight):
+        flight.subscribers -= 1
+        if flight.subscribers == 0 and not flight.done:
+            # Nobody is listening any more: stop generating
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.task.cancel()
+
+    async def stream(self, key, start):
+        """
+        Async generator of the answer chunks for `key`.
+
+        Args:
+            key: Answer identity (see answer_cache.answer_key)
+            start: Called without arguments to create the upstream async
+                iterator when no generation for `key` is running
+        """
+        flight = self._join(key, start)
+        flight.subscribers += 1
+        try:
+            async for part in flight._parts():
+                yield part
+        finally:
+            self._leave(key, flight)
+
+    async def answer(self, key, start) -> str:
+        """The complete answer for `key`, sharing a running generation if there is one."""
+        parts = []
+        async for part in self.stream(key, start):
+            parts.append(part)
+        return "".join(parts)
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+single_flight = SingleFlight()
+
+Gauge("rag_single_flight_in_flight", "Shared generations currently running", lambda: {(): single_flight.in_flight()})
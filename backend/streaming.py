@@ -0,0 +1,167 @@
+# backend/streaming.py
+"""
+Server-Sent Events helpers for streaming answers to the browser.
+
+Tokens from Ollama arrive one tiny chunk at a time. Sending one SSE event per
+token costs a write syscall and an event dispatch each, so chunks are coalesced
+into small batches before they are flushed. The stream also watches for the
+client going away and closes the upstream generator so Ollama stops working on
+an answer nobody will read.
+"""
+import asyncio
+import contextlib
+import json
+import time
+
+from metrics import TIME_TO_FIRST_TOKEN, finish_trace
+from logger import get_logger
+
+log = get_logger(__name__)
+
+# ========================================
+# ⚡ STREAMING TUNING
+# ========================================
+# 🎯 FLUSH_MIN_CHARS: Buffer tokens until at least this many characters are queued
+#    Lower = smoother typing effect, Higher = fewer events and less overhead
+#    Default: 24 characters (a handful of tokens)
+# 🎯 FLUSH_MAX_DELAY: Never hold buffered tokens longer than this (seconds)
+#    Default: 0.05 (50 ms, below what users perceive as stutter)
+# 🎯 DISCONNECT_CHECK_INTERVAL: How often to poll for a closed client (seconds)
+FLUSH_MIN_CHARS = 24
+FLUSH_MAX_DELAY = 0.05
+DISCONNECT_CHECK_INTERVAL = 0.25
+
+def sse_event(data: str, event: str = None) -> str:
+    """
+    Format one SSE event.
+
+    Multi-line payloads are split over several `data:` lines as required by
+    the SSE spec, so newlines inside an answer survive the trip.
+    """
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    for line in data.split("\n"):
+        lines.append(f"data: {line}")
+    return "\n".join(lines) + "\n\n"
+
+async def coalesce_chunks(chunks, min_chars: int = FLUSH_MIN_CHARS, max_delay: float = FLUSH_MAX_DELAY):
+    """
+    Merge tiny chunks from an async iterator into larger batches.
+
+    The first chunk is always flushed immediately so time-to-first-token is not
+    penalised; after that a batch is flushed once it reaches `min_chars` or has
+    been held for `max_delay` seconds, even if no further chunk arrives.
+    """
+    buffer = []
+    buffered = 0
+    held_since = None
+    first = True
+    iterator = chunks.__aiter__()
+    # The pending read outlives a flush timeout; cancelling it would close the upstream generator
+    pending = None
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            if buffer:
+                timeout = max(0.0, max_delay - (time.perf_counter() - held_since))
+                done, _ = await asyncio.wait({pending}, timeout=timeout)
+                if not done:
+                    yield "".join(buffer)
+                    buffer.clear()
+                    buffered = 0
+                    continue
+            try:
+                chunk = await pending
+            except StopAsyncIteration:
+                break
+            finally:
+                pending = None
+            if not chunk:
+                continue
+            if not buffer:
+                held_since = time.perf_counter()
+            buffer.append(chunk)
+            buffered += len(chunk)
+            if first or buffered >= min_chars:
+                first = False
+                yield "".join(buffer)
+                buffer.clear()
+                buffered = 0
+    finally:
+        if pending is not None:
+            pending.cancel()
+            with contextlib.suppress(asyncio.CancelledError, StopAsyncIteration):
+                await pending
+
+    if buffer:
+        yield "".join(buffer)
+
+async def stream_sse(request, chunks, started_at: float = None, trace: dict = None):
+    """
+    Turn an async generator of answer chunks into an SSE byte stream.
+
+    Args:
+        request: The incoming Starlette request, used to detect disconnects
+        chunks: Async generator yielding answer text
+        started_at: perf_counter() timestamp when the request arrived
+        trace: The request's metrics trace, finished when the stream ends
+
+    Yields:
+        SSE-formatted strings: answer batches, a final `stats` event with
+        time-to-first-token (or an `error` event if generation failed), then
+        the `[DONE]` sentinel
+    """
+    started_at = started_at or time.perf_counter()
+    first_token_at = None
+    events = 0
+    chars = 0
+    last_check = started_at
+    disconnected = False
+    status = "error"
+
+    batches = coalesce_chunks(chunks)
+    try:
+        async for batch in batches:
+            now = time.perf_counter()
+            if first_token_at is None:
+                first_token_at = now
+                TIME_TO_FIRST_TOKEN.observe(first_token_at - started_at)
+
+            if now - last_check >= DISCONNECT_CHECK_INTERVAL:
+                last_check = now
+                if await request.is_disconnected():
+                    disconnected = True
+                    log.info("Client disconnected, cancelling generation")
+                    break
+
+            events += 1
+            chars += len(batch)
+            yield sse_event(batch)
+    except Exception as e:
+        # Tell the client the answer is incomplete instead of ending as if it were done
+        log.error("Streaming answer failed: %s", e)
+        yield sse_event(json.dumps({"error": "Failed to get response from LLM"}), event="error")
+        yield sse_event("[DONE]")
+    else:
+        status = "disconnected" if disconnected else "ok"
+        if not disconnected:
+            total = time.perf_counter() - started_at
+            stats = {
+                "ttft_ms": round((first_token_at - started_at) * 1000, 1) if first_token_at else None,
+                "total_ms": round(total * 1000, 1),
+                "events": events,
+                "chars": chars,
+            }
+            yield sse_event(json.dumps(stats), event="stats")
+            yield sse_event("[DONE]")
+    finally:
+        # Closing the upstream generator closes the HTTP stream to Ollama,
+        # which aborts the generation server-side. This also runs when the
+        # response task is cancelled because the client went away.
+        await batches.aclose()
+        await chunks.aclose()
+        ttft_ms = round((first_token_at - started_at) * 1000, 1) if first_token_at else None
+        finish_trace("ask", trace, status, ttft_ms=ttft_ms)
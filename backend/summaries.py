@@ -0,0 +1,197 @@
+# backend/summaries.py
+"""
+Rolling summaries of long conversations.
+
+The prompt packer drops the oldest history messages once a conversation no
+longer fits the token budget, and chat sessions drop their oldest turns when
+they trim, so long chats forget what was said early on. Once the messages not
+yet covered by a summary pass SUMMARY_TRIGGER_TOKENS, a background task asks
+a small model (models.json "summary_model", see model_router.py) to fold
+everything except the latest SUMMARY_KEEP_MESSAGES into the previous summary.
+The prompt then carries that summary plus the messages after it, so its size
+stays bounded without losing the thread of the conversation.
+
+Summaries are keyed by a hash of the messages they cover, so they work for
+plain /ask history as well as sessions, and a conversation whose history was
+edited simply falls back to an older summary (or none). Requests never wait
+for a summary: they use whatever is cached when they arrive, and summaries
+take a low-priority router slot, so they never hold up an answer.
+"""
+import asyncio
+import contextvars
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import Counter, Gauge, span
+from model_router import router
+from ollama_client import ask_ollama_async, refresh_residency
+from prompt_budget import choose_num_ctx, estimate_tokens, truncate_to_tokens
+from logger import get_logger
+
+log = get_logger(__name__)
+
+# ========================================
+# ⚡ CONVERSATION SUMMARY TUNING
+# ========================================
+# 🎯 CONVERSATION_SUMMARIES: Summarize long conversations in the background
+#    (CONVERSATION_SUMMARIES=0 to disable)
+# 🎯 SUMMARY_TRIGGER_TOKENS: Unsummarized history that starts a new summary
+#    Lower = smaller prompts but more summary calls, Default: 1024
+# 🎯 SUMMARY_KEEP_MESSAGES: Latest messages always sent verbatim (2 exchanges)
+# 🎯 SUMMARY_MAX_TOKENS: Longest summary generated
+# 🎯 SUMMARY_MESSAGE_TOKENS: Each message is cut to this before summarizing
+# 🎯 SUMMARY_MAX_PENDING: Summaries generated at once; more are skipped, not queued
+# 🎯 SUMMARY_CACHE_ENTRIES / SUMMARY_TTL_SECONDS: Summaries kept in memory and for how long
+CONVERSATION_SUMMARIES = os.environ.get("CONVERSATION_SUMMARIES", "1") != "0"
+SUMMARY_TRIGGER_TOKENS = 1024
+SUMMARY_KEEP_MESSAGES = 4
+SUMMARY_MAX_TOKENS = 256
+SUMMARY_MESSAGE_TOKENS = 384
+SUMMARY_MAX_PENDING = 4
+SUMMARY_CACHE_ENTRIES = 1024
+SUMMARY_TTL_SECONDS = 3600
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You summarize conversations for an assistant that will continue them. "
+    "Keep names, numbers, decisions, open questions and what the user is trying to do. "
+    "Write plain sentences, no preamble."
+)
+
+SUMMARIES = Counter("rag_conversation_summaries_total", "Background conversation summaries by result", ("result",))
+
+def prefix_keys(history: list) -> list[str]:
+    """keys[i] identifies the first i + 1 messages of `history`."""
+    keys = []
+    digest = hashlib.sha1()
+    for msg in history:
+        digest.update(f"{msg.get('role', '')}\0{msg.get('content', '')}\0".encode("utf-8"))
+        keys.append(digest.copy().hexdigest())
+    return keys
+
+def _format_message(msg: dict) -> str:
+    role = "User" if msg.get("role") == "user" else "Assistant"
+    return f"{role}: {truncate_to_tokens(msg.get('content', ''), SUMMARY_MESSAGE_TOKENS)}"
+
+def summary_prompt(previous: str, messages: list) -> str:
+    """Prompt asking for `previous` (may be empty) extended with `messages`."""
+    parts = []
+    if previous:
+        parts.append(f"Summary of the conversation so far:\n{previous}")
+    parts.append("Messages to add:\n" + "\n".join(_format_message(msg) for msg in messages))
+    parts.append(f"Write the updated summary in at most {SUMMARY_MAX_TOKENS * 3 // 4} words.")
+    return "\n\n".join(parts)
+
+class ConversationSummaries:
+    """
+    Cache of rolling summaries by conversation prefix, and the background
+    tasks extending them. At most one summary per conversation (identified
+    by its first message) is generated at a time.
+    """
+
+    def __init__(self, max_entries: int = SUMMARY_CACHE_ENTRIES, ttl: float = SUMMARY_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # prefix key -> (summary, created_at)
+        self._pending = {}              # first message key -> task
+        self._lock = threading.Lock()
+
+    def lookup(self, history: list, limit: int = None) -> tuple:
+        """
+        Longest cached summary of a prefix of `history`.
+
+        Args:
+            history: Conversation messages, oldest first
+            limit: Only consider summaries covering at most this many messages
+
+        Returns:
+            (number of messages covered, summary), or (0, "") if none is cached
+        """
+        if not CONVERSATION_SUMMARIES or not history:
+            return 0, ""
+        keys = prefix_keys(history[:limit] if limit is not None else history)
+        now = time.monotonic()
+        with self._lock:
+            for covered in range(len(keys), 0, -1):
+                key = keys[covered - 1]
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if now - entry[1] > self.ttl:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                return covered, entry[0]
+        return 0, ""
+
+    def schedule(self, history: list, covered: int, summary: str, model: str):
+        """
+        Summarize the older part of `history` in the background if needed.
+
+        Starts when the messages after the current summary (`covered`
+        messages, summarized as `summary`) have grown past
+        SUMMARY_TRIGGER_TOKENS. Returns at once; only callers on an event
+        loop start summaries.
+        """
+        if not CONVERSATION_SUMMARIES:
+            return
+        end = len(history) - SUMMARY_KEEP_MESSAGES
+        if end <= covered:
+            return
+        if sum(estimate_tokens(msg.get("content", "")) for msg in history[covered:]) < SUMMARY_TRIGGER_TOKENS:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        keys = prefix_keys(history[:end])
+        conversation = keys[0]
+        with self._lock:
+            if conversation in self._pending or len(self._pending) >= SUMMARY_MAX_PENDING:
+                return
+            # A fresh context keeps the summary's timings out of the request's trace
+            self._pending[conversation] = loop.create_task(
+                self._summarize(conversation, keys[-1], history[covered:end], summary, model),
+                context=contextvars.Context(),
+            )
+
+    async def _summarize(self, conversation: str, key: str, messages: list, previous: str, model: str):
+        try:
+            prompt = summary_prompt(previous, messages)
+            # A cheap model when it can run without a model swap, else the one
+            # answering; a fresh /api/ps tells which models are loaded
+            await refresh_residency()
+            model = router.summary_model(model)
+            num_ctx = choose_num_ctx(estimate_tokens(SUMMARY_SYSTEM_PROMPT) + estimate_tokens(prompt),
+                                     router.num_ctx(model))
+            with span("summarize"):
+                text = await ask_ollama_async(prompt, max_tokens=SUMMARY_MAX_TOKENS, temperature=0.2,
+                                              system=SUMMARY_SYSTEM_PROMPT, model_name=model, num_ctx=num_ctx,
+                                              background=True)
+            # Bounded even if the model ignores num_predict
+            text = truncate_to_tokens(text.strip(), SUMMARY_MAX_TOKENS)
+            if text:
+                self._store(key, text)
+            SUMMARIES.inc(1, "ok")
+        except Exception as e:
+            log.warning("Conversation summary failed: %s", e)
+            SUMMARIES.inc(1, "error")
+        finally:
+            with self._lock:
+                self._pending.pop(conversation, None)
+
+    def _store(self, key: str, summary: str):
+        with self._lock:
+            self._entries[key] = (summary, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+summaries = ConversationSummaries()
+
+Gauge("rag_conversation_summaries_pending", "Conversation summaries being generated", lambda: {(): summaries.pending()})
@@ -0,0 +1,84 @@
+# backend/tests/conftest.py
+"""
+Shared setup for the backend tests (run `python -m pytest` from backend/).
+
+The tests use a throwaway vector store and data directory and embed with a
+small hashing function instead of the MiniLM model, so they need neither a
+model download nor a running Ollama; generation goes to the stand-in server
+from benchmarks/fake_ollama.py through the `fake_ollama` fixture.
+"""
+import asyncio
+import hashlib
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "benchmarks"))
+
+# Set before any backend module reads them
+_root = tempfile.mkdtemp(prefix="rag-tests-")
+os.environ["EMBEDDINGS_PATH"] = os.path.join(_root, "embeddings")
+os.environ["DATA_DIR"] = os.path.join(_root, "data")
+os.environ["PREWARM"] = "0"
+
+from chromadb.utils import embedding_functions
+from chromadb.api.types import EmbeddingFunction
+
+class HashingEmbeddingFunction(EmbeddingFunction):
+    """Bag-of-words vectors from hashed words; similar texts get similar vectors."""
+
+    def __init__(self):
+        pass
+
+    def __call__(self, input):
+        vectors = []
+        for text in input:
+            vector = np.zeros(384, dtype=np.float32)
+            for word in text.lower().split():
+                vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % 384] += 1
+            vectors.append(vector / (np.linalg.norm(vector) or 1))
+        return vectors
+
+    @staticmethod
+    def name():
+        return "default"
+
+    def get_config(self):
+        return {}
+
+    @staticmethod
+    def build_from_config(config):
+        return HashingEmbeddingFunction()
+
+# rag creates its embedding function at import time
+embedding_functions.DefaultEmbeddingFunction = HashingEmbeddingFunction
+
+@pytest.fixture
+def fake_ollama(monkeypatch):
+    """
+    Send the async Ollama client's requests to an in-process fake_ollama app.
+
+    Returns the app, created with no load time or latency and near-instant
+    generation.
+    """
+    import httpx
+    import ollama_client
+    from fake_ollama import create_app
+
+    app = create_app(load_ms=0, latency_ms=0, tokens_per_second=100000, prompt_tokens_per_second=1e9, response_tokens=16)
+    clients = {}
+
+    def client():
+        # One client per event loop; each test runs its own loop
+        loop = asyncio.get_running_loop()
+        if loop not in clients:
+            clients[loop] = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://ollama")
+        return clients[loop]
+
+    monkeypatch.setattr(ollama_client, "_get_async_client", client)
+    return app
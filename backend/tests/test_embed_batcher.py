@@ -0,0 +1,39 @@
+# backend/tests/test_embed_batcher.py
+"""Concurrent query embeddings share batched calls."""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from embed_batcher import QueryBatcher
+
+def test_concurrent_queries_share_one_call():
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return [[len(text), 1.0] for text in texts]
+
+    batcher = QueryBatcher(embed, window_ms=5000, max_batch=4)
+    texts = ["one", "three", "three", "sixteen"]
+    with ThreadPoolExecutor(len(texts)) as pool:
+        futures = [pool.submit(batcher.embed, text) for text in texts]
+        vectors = [future.result(5) for future in futures]
+    # The batch goes out once full; identical questions share one row
+    assert calls == [["one", "three", "sixteen"]]
+    assert [vector[0] for vector in vectors] == [3, 5, 5, 7]
+    assert all(isinstance(vector, np.ndarray) for vector in vectors)
+
+def test_full_batch_goes_without_waiting():
+    calls = []
+    batcher = QueryBatcher(lambda texts: calls.append(list(texts)) or [[0.0]] * len(texts), window_ms=10000, max_batch=1)
+    batcher.embed("alone")
+    assert calls == [["alone"]]
+
+def test_errors_reach_every_caller():
+    def embed(texts):
+        raise RuntimeError("model missing")
+
+    batcher = QueryBatcher(embed, window_ms=1)
+    with pytest.raises(RuntimeError, match="model missing"):
+        batcher.embed("anything")
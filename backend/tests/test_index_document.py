@@ -0,0 +1,48 @@
+# backend/tests/test_index_document.py
+"""Incremental re-indexing: chunks are diffed against the manifest by content hash."""
+import pytest
+
+import rag
+
+NAMESPACE = "diff-test"
+
+def stored(doc_id: str) -> list[str]:
+    """Texts of a document's stored chunks, in document order."""
+    found = rag.get_namespace(NAMESPACE).collection.get(where={"source": doc_id}, include=["documents", "metadatas"])
+    return [text for _, text in sorted(zip(found["metadatas"], found["documents"]), key=lambda pair: pair[0]["chunk_index"])]
+
+def test_reindex_embeds_only_changed_chunks():
+    first = rag.add_document_to_rag("guide.md", ["alpha one", "beta two", "gamma three"], namespace=NAMESPACE)
+    assert first == {"added": 3, "reused": 0, "removed": 0, "unchanged": 0}
+
+    second = rag.add_document_to_rag("guide.md", ["alpha one", "delta four", "gamma three", "alpha one"], namespace=NAMESPACE)
+    assert second == {"added": 1, "reused": 0, "removed": 1, "unchanged": 2}
+    # Repeated chunks are stored once; positions follow the new order
+    assert stored("guide.md") == ["alpha one", "delta four", "gamma three"]
+    assert rag.get_namespace(NAMESPACE).manifest.get("guide.md")["chunk_count"] == 3
+
+def test_identical_chunks_reuse_another_documents_embedding(monkeypatch):
+    rag.add_document_to_rag("original.txt", ["shared paragraph", "only in original"], namespace=NAMESPACE)
+    embedded = []
+    embed = rag.embedding_fn
+    monkeypatch.setattr(rag, "embedding_fn", lambda texts: embedded.extend(texts) or embed(texts))
+
+    counts = rag.add_document_to_rag("copy.txt", ["shared paragraph", "only in copy"], namespace=NAMESPACE)
+    assert counts == {"added": 1, "reused": 1, "removed": 0, "unchanged": 0}
+    assert embedded == ["only in copy"]
+    assert stored("copy.txt") == ["shared paragraph", "only in copy"]
+
+def test_failed_reindex_keeps_previous_version():
+    rag.add_document_to_rag("notes.txt", ["first version", "kept paragraph"], namespace=NAMESPACE)
+
+    def chunks():
+        yield "second version"
+        yield "kept paragraph"
+        raise RuntimeError("parser crashed")
+
+    with pytest.raises(RuntimeError):
+        with rag.ChunkWriter(namespace=NAMESPACE) as writer:
+            rag.index_document("notes.txt", chunks(), writer)
+    # Deletions only apply on commit, and the manifest still describes the old chunks
+    assert "first version" in stored("notes.txt")
+    assert rag.get_namespace(NAMESPACE).manifest.get("notes.txt")["chunk_count"] == 2
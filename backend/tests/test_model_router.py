@@ -0,0 +1,74 @@
+# backend/tests/test_model_router.py
+"""Router admission: background summaries never take an answer's slot."""
+import asyncio
+import copy
+
+from model_router import DEFAULT_CONFIG, ModelRouter
+
+def make_router(max_concurrent: int = 2) -> ModelRouter:
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    config["defaults"]["max_concurrent"] = max_concurrent
+    config["switch_after_seconds"] = 0.05
+    return ModelRouter(config)
+
+async def hold(router, model, release: asyncio.Event, started: list, name: str, background=False):
+    async with router.slot(model, background=background):
+        started.append(name)
+        await release.wait()
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+def test_background_leaves_last_slot_to_answers():
+    async def run():
+        router, started = make_router(), []
+        answer, summary = asyncio.Event(), asyncio.Event()
+        tasks = [asyncio.create_task(hold(router, "m", answer, started, "answer"))]
+        await settle()
+        tasks.append(asyncio.create_task(hold(router, "m", summary, started, "summary", background=True)))
+        await settle()
+        # One of two slots is free, but it's the last one
+        assert started == ["answer"]
+        answer.set()
+        await settle()
+        assert started == ["answer", "summary"]
+        summary.set()
+        await asyncio.gather(*tasks)
+    asyncio.run(run())
+
+def test_one_background_request_at_a_time():
+    async def run():
+        router, started = make_router(max_concurrent=4), []
+        first, second = asyncio.Event(), asyncio.Event()
+        tasks = [asyncio.create_task(hold(router, "m", first, started, "first", background=True)),
+                 asyncio.create_task(hold(router, "m", second, started, "second", background=True))]
+        await settle()
+        assert started == ["first"]
+        first.set()
+        await settle()
+        assert started == ["first", "second"]
+        second.set()
+        await asyncio.gather(*tasks)
+    asyncio.run(run())
+
+def test_waiting_answers_go_before_background():
+    async def run():
+        router, started = make_router(max_concurrent=1), []
+        release = {name: asyncio.Event() for name in ("a", "b", "summary")}
+        tasks = [asyncio.create_task(hold(router, "m", release["a"], started, "a"))]
+        await settle()
+        tasks.append(asyncio.create_task(hold(router, "m", release["summary"], started, "summary", background=True)))
+        await settle()
+        tasks.append(asyncio.create_task(hold(router, "m", release["b"], started, "b")))
+        await settle()
+        release["a"].set()
+        await settle()
+        # The summary queued first, but the waiting answer gets the slot
+        assert started == ["a", "b"]
+        release["b"].set()
+        await settle()
+        assert started == ["a", "b", "summary"]
+        release["summary"].set()
+        await asyncio.gather(*tasks)
+    asyncio.run(run())
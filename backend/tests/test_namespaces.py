@@ -0,0 +1,26 @@
+# backend/tests/test_namespaces.py
+"""Namespaces are created by uploads only; reads of unknown ones are 404s."""
+import os
+
+from fastapi.testclient import TestClient
+
+import app as api
+import rag
+
+def test_reads_of_unknown_namespace_create_nothing():
+    with TestClient(api.app) as client:
+        assert client.get("/documents?namespace=missing").status_code == 404
+        assert client.post("/ask", json={"text": "Anything?", "namespace": "missing"}).status_code == 404
+        assert client.post("/ask", json={"text": "Anything?", "namespace": "missing", "stream": True}).status_code == 404
+        assert client.delete("/documents/notes.txt?namespace=missing").status_code == 404
+        assert client.delete("/documents?namespace=missing").status_code == 404
+        assert "missing" not in client.get("/namespaces").json()["namespaces"]
+    assert "missing" not in rag._namespaces
+    assert not os.path.exists(rag.namespace_dir(rag.EMBEDDINGS_PATH, "missing"))
+
+def test_upload_creates_namespace():
+    with TestClient(api.app) as client:
+        response = client.post("/upload?namespace=created", files={"file": ("notes.txt", b"release notes " * 40)})
+        assert response.status_code == 200
+        assert "created" in client.get("/namespaces").json()["namespaces"]
+        assert client.get("/documents?namespace=created").status_code == 200
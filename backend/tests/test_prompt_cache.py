@@ -0,0 +1,52 @@
+# backend/tests/test_prompt_cache.py
+"""Session turns keep a stable prefix, so Ollama only evaluates the new turn."""
+import asyncio
+
+import pytest
+
+import rag
+from metrics import start_trace
+
+HITS = [{
+    "id": "doc-1", "distance": 0.2, "metadata": {"source": "guide.md"},
+    "document": "The deploy script lives in tools/deploy.sh and needs the STAGE variable set.",
+}]
+
+@pytest.fixture
+def sent(monkeypatch, fake_ollama):
+    """Record the message lists sent through /api/chat."""
+    calls = []
+    chat = rag.chat_ollama_async
+
+    async def recording_chat(messages, **kwargs):
+        calls.append(messages)
+        return await chat(messages, **kwargs)
+
+    monkeypatch.setattr(rag, "chat_ollama_async", recording_chat)
+    monkeypatch.setattr(rag, "_retrieve_for_question", lambda question, namespace, where: (None, HITS))
+    return calls
+
+def test_follow_ups_reuse_the_evaluated_prefix(sent):
+    history = [
+        {"role": "user", "content": "How do I deploy?"},
+        {"role": "assistant", "content": "Run tools/deploy.sh. " + "It builds, tags and pushes the image. " * 30},
+    ]
+
+    async def turn(question: str) -> tuple:
+        trace = start_trace()
+        answer = await rag.ask_rag_async(question, history=history, session_id="prefix")
+        history.extend([{"role": "user", "content": question}, {"role": "assistant", "content": answer}])
+        return answer, trace["fields"]["prompt_eval_tokens"]
+
+    async def main():
+        return [await turn("Which variable does it need?"), await turn("Where does the script live?")]
+
+    (first_answer, first_tokens), (_, second_tokens) = asyncio.run(main())
+    first, second = sent
+    # Byte-identical prefix: everything sent on the first turn, then its answer
+    assert second[:len(first)] == first
+    assert second[len(first)] == {"role": "assistant", "content": first_answer}
+    # Only the new turn is evaluated again
+    full = sum(len(message["content"]) for message in second) // 4
+    assert second_tokens < first_tokens
+    assert second_tokens < full // 4
@@ -0,0 +1,82 @@
+# backend/tests/test_sessions.py
+"""Chat sessions: trimming, and that follow-up turns keep the conversation."""
+import asyncio
+
+import pytest
+
+import rag
+from prompt_budget import estimate_tokens
+from sessions import ChatSession
+
+def words(count: int, word: str = "lorem") -> str:
+    return " ".join([word] * count)
+
+@pytest.fixture
+def captured(monkeypatch):
+    """Answer every generation with a fixed text and record what was sent."""
+    calls = []
+
+    async def chat(messages, model_name=None, num_ctx=None, **kwargs):
+        calls.append({"messages": messages, "num_ctx": num_ctx})
+        return "Noted."
+
+    async def ask(prompt, system=None, model_name=None, num_ctx=None, **kwargs):
+        calls.append({"prompt": prompt, "system": system, "num_ctx": num_ctx})
+        return "Noted."
+
+    monkeypatch.setattr(rag, "chat_ollama_async", chat)
+    monkeypatch.setattr(rag, "ask_ollama_async", ask)
+    monkeypatch.setattr(rag, "_retrieve_for_question", lambda question, namespace, where: (None, []))
+    return calls
+
+def ask(question: str, history: list, session_id: str = "s") -> str:
+    return asyncio.run(rag.ask_rag_async(question, history=history, session_id=session_id))
+
+def test_trim_keeps_latest_turn():
+    session = ChatSession("trim", "gpt-oss:20b", "You are helpful.")
+    for i in range(40):
+        session.append(f"question {i}", f"question {i} " + words(80), words(80))
+        session.trim()
+        assert session.turns[-1]["question"] == f"question {i}"
+        assert session.fits
+    assert session.trims > 0
+
+def test_small_window_keeps_previous_exchange(monkeypatch):
+    import sessions
+    monkeypatch.setattr(sessions, "SESSION_NUM_CTX", 2048)
+    session = ChatSession("small", "gpt-oss:20b", "You are helpful.")
+    session.append("My name is Ada.", "My name is Ada. " + words(300), words(200))
+    session.trim()
+    assert len(session.turns) == 1 and session.fits
+
+def test_follow_ups_include_earlier_turns(captured):
+    first_answer = "Nice to meet you, Ada. " + words(250)
+    history = [
+        {"role": "user", "content": "My name is Ada and I work on compilers."},
+        {"role": "assistant", "content": first_answer},
+    ]
+    ask("What was my name again?", history, "follow-ups")
+    second = captured[-1]["messages"]
+    assert [msg["role"] for msg in second] == ["system", "user", "assistant", "user"]
+    assert "My name is Ada" in second[1]["content"]
+    assert second[2]["content"] == first_answer
+
+    history += [{"role": "user", "content": "What was my name again?"}, {"role": "assistant", "content": "Noted."}]
+    ask("And what do I work on?", history, "follow-ups")
+    third = captured[-1]["messages"]
+    # The second turn still contains the first, exactly as sent before
+    assert third[:len(second)] == second
+    assert third[-1]["content"].endswith("And what do I work on?")
+
+def test_oversized_exchange_falls_back_to_stateless_prompt(captured):
+    huge_answer = words(6000)
+    history = [
+        {"role": "user", "content": "Tell me everything."},
+        {"role": "assistant", "content": huge_answer},
+    ]
+    ask("Summarize that in one line.", history, "oversized")
+    call = captured[-1]
+    assert "messages" not in call
+    # The stateless prompt keeps a truncated copy of the exchange instead of dropping it
+    assert "Previous conversation:\nAssistant: lorem lorem" in call["system"]
+    assert estimate_tokens(call["system"]) + estimate_tokens(call["prompt"]) < call["num_ctx"]
@@ -0,0 +1,100 @@
+# backend/tests/test_single_flight.py
+"""Identical in-flight questions share one generation."""
+import asyncio
+
+from single_flight import SingleFlight
+
+class Generation:
+    """Upstream stand-in that yields a part each time `step` is set."""
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.started = 0
+        self.closed = False
+        self.step = asyncio.Event()
+
+    def start(self):
+        self.started += 1
+        return self._run()
+
+    async def _run(self):
+        try:
+            for part in self.parts:
+                await self.step.wait()
+                self.step.clear()
+                yield part
+        finally:
+            self.closed = True
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+async def collect(stream, into: list):
+    async for part in stream:
+        into.append(part)
+
+def test_follower_gets_earlier_parts_then_live_tail():
+    async def run():
+        flights, generation = SingleFlight(), Generation(["a", "b", "c"])
+        leader, follower = [], []
+        tasks = [asyncio.create_task(collect(flights.stream("key", generation.start), leader))]
+        generation.step.set()
+        await settle()
+        assert leader == ["a"]
+
+        tasks.append(asyncio.create_task(collect(flights.stream("key", generation.start), follower)))
+        await settle()
+        assert follower == ["a"]
+        for _ in range(2):
+            generation.step.set()
+            await settle()
+        await asyncio.gather(*tasks)
+        assert leader == follower == ["a", "b", "c"]
+        assert generation.started == 1
+        assert flights.in_flight() == 0
+    asyncio.run(run())
+
+def test_non_streaming_followers_share_the_answer():
+    async def run():
+        flights, generation = SingleFlight(), Generation(["x", "y"])
+        answers = asyncio.gather(*(flights.answer("key", generation.start) for _ in range(3)))
+        for _ in range(2):
+            await settle()
+            generation.step.set()
+        assert await answers == ["xy"] * 3
+        assert generation.started == 1
+    asyncio.run(run())
+
+def test_generation_outlives_leader_until_last_subscriber_leaves():
+    async def run():
+        flights, generation = SingleFlight(), Generation(["a", "b", "c"])
+        leader = asyncio.create_task(collect(flights.stream("key", generation.start), []))
+        follower_parts = []
+        follower = asyncio.create_task(collect(flights.stream("key", generation.start), follower_parts))
+        generation.step.set()
+        await settle()
+
+        leader.cancel()
+        generation.step.set()
+        await settle()
+        assert follower_parts == ["a", "b"]
+        assert not generation.closed
+
+        follower.cancel()
+        await settle()
+        assert generation.closed
+        assert flights.in_flight() == 0
+    asyncio.run(run())
+
+def test_errors_reach_every_subscriber():
+    async def run():
+        flights = SingleFlight()
+
+        async def failing():
+            yield "partial"
+            raise RuntimeError("Ollama went away")
+
+        results = await asyncio.gather(*(flights.answer("key", failing) for _ in range(2)), return_exceptions=True)
+        assert [str(result) for result in results] == ["Ollama went away"] * 2
+    asyncio.run(run())
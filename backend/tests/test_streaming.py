@@ -0,0 +1,77 @@
+# backend/tests/test_streaming.py
+"""SSE streaming: chunk coalescing, the error event and upstream cancellation."""
+import asyncio
+import json
+
+import streaming
+from streaming import coalesce_chunks, sse_event, stream_sse
+
+class Client:
+    """Request stand-in whose connection can be dropped."""
+
+    def __init__(self):
+        self.gone = False
+
+    async def is_disconnected(self):
+        return self.gone
+
+async def tokens(parts, delay: float = 0.0, state: dict = None):
+    try:
+        for part in parts:
+            if delay:
+                await asyncio.sleep(delay)
+            yield part
+    finally:
+        if state is not None:
+            state["closed"] = True
+
+async def collect(stream) -> list:
+    return [item async for item in stream]
+
+def test_first_chunk_is_sent_alone_then_batched():
+    batches = asyncio.run(collect(coalesce_chunks(tokens(["Hi", " there", ",", " how", " are", " you?"]), min_chars=10, max_delay=10)))
+    assert batches == ["Hi", " there, how", " are you?"]
+
+def test_held_chunks_flush_when_upstream_stalls():
+    async def stalled():
+        yield "first"
+        yield "tail"
+        await asyncio.sleep(0.5)
+        yield "late"
+
+    async def run():
+        stream = coalesce_chunks(stalled(), min_chars=100, max_delay=0.02)
+        assert await stream.__anext__() == "first"
+        # Held for max_delay, not until the next chunk arrives
+        assert await asyncio.wait_for(stream.__anext__(), 0.2) == "tail"
+        await stream.aclose()
+    asyncio.run(run())
+
+def test_sse_event_splits_lines():
+    assert sse_event("one\ntwo", event="stats") == "event: stats\ndata: one\ndata: two\n\n"
+
+def test_failed_generation_ends_with_error_event():
+    async def failing():
+        yield "partial"
+        raise RuntimeError("connection reset")
+
+    events = asyncio.run(collect(stream_sse(Client(), failing())))
+    assert events[0] == sse_event("partial")
+    assert events[-2] == sse_event(json.dumps({"error": "Failed to get response from LLM"}), event="error")
+    assert events[-1] == sse_event("[DONE]")
+
+def test_disconnect_closes_upstream(monkeypatch):
+    monkeypatch.setattr(streaming, "DISCONNECT_CHECK_INTERVAL", 0)
+    monkeypatch.setattr(streaming, "FLUSH_MIN_CHARS", 1)
+    client, state = Client(), {}
+
+    async def run():
+        events = []
+        async for event in stream_sse(client, tokens(["a"] * 100, delay=0.001, state=state)):
+            events.append(event)
+            client.gone = len(events) >= 3
+        return events
+
+    events = asyncio.run(run())
+    assert len(events) == 3
+    assert state["closed"]
@@ -0,0 +1,50 @@
+# backend/tests/test_tokenizer.py
+"""Tokenizer fallback: WordPiece is retried, and documents keep their tokenizer."""
+import pytest
+
+import token_counter
+
+@pytest.fixture
+def wordpiece_path(tmp_path, monkeypatch):
+    """Point the counter at a WordPiece file that doesn't exist yet."""
+    path = tmp_path / "tokenizer.json"
+    monkeypatch.setattr(token_counter, "TOKENIZER_PATH", str(path))
+    monkeypatch.setattr(token_counter, "TOKENIZER_RETRY_SECONDS", 0)
+    monkeypatch.setattr(token_counter, "_wordpiece", None)
+    monkeypatch.setattr(token_counter, "_wordpiece_retry_at", 0.0)
+    return path
+
+def download(path):
+    """Write a small WordPiece tokenizer where the MiniLM one would be."""
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    vocab = {"[UNK]": 0, "chunk": 1, "##ing": 2, "text": 3}
+    tokenizer = Tokenizer(models.WordPiece(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    tokenizer.save(str(path))
+
+def test_wordpiece_is_retried_after_fallback(wordpiece_path):
+    assert token_counter.get_tokenizer().name == "regex"
+
+    download(wordpiece_path)
+    assert token_counter.get_tokenizer().name == "wordpiece"
+    assert token_counter.count_tokens("chunking text") == 3
+    assert token_counter.get_tokenizer("regex").count("chunking text") == 2
+
+def test_reindexing_keeps_the_recorded_tokenizer(wordpiece_path, tmp_path):
+    from ingest import ingest_files
+    from rag import document_tokenizer, get_namespace
+
+    path = tmp_path / "notes.txt"
+    path.write_text("Chunking text with the fallback tokenizer. " * 20)
+    ingest_files([str(path)], max_workers=1, namespace="tokenizer-test")
+    assert get_namespace("tokenizer-test").manifest.get("notes.txt")["tokenizer"] == "regex"
+
+    download(wordpiece_path)
+    assert document_tokenizer("notes.txt", "tokenizer-test") == "regex"
+    assert document_tokenizer("new.txt", "tokenizer-test") == "wordpiece"
+
+    # Editing the document doesn't switch it to the tokenizer now available
+    path.write_text("Chunking text with the fallback tokenizer. " * 20 + "More text.")
+    ingest_files([str(path)], max_workers=1, namespace="tokenizer-test")
+    record = get_namespace("tokenizer-test").manifest.get("notes.txt")
+    assert record["tokenizer"] == "regex"
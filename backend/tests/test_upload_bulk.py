@@ -0,0 +1,28 @@
+# backend/tests/test_upload_bulk.py
+"""/upload/bulk: per-file checks and one job per accepted file."""
+from fastapi.testclient import TestClient
+
+import app as api
+
+def test_bulk_upload_rejects_bad_and_duplicate_files():
+    files = [
+        ("files", ("notes.txt", b"release notes " * 40)),
+        ("files", ("notes.txt", b"other content with the same name " * 40)),
+        ("files", ("copy.md", b"release notes " * 40)),
+        ("files", ("tool.exe", b"MZ")),
+        ("files", ("fake.pdf", b"just text")),
+        ("files", ("empty.txt", b"")),
+    ]
+    with TestClient(api.app) as client:
+        response = client.post("/upload/bulk?namespace=bulk-test", files=files)
+    assert response.status_code == 200
+    body = response.json()
+    assert [job["filename"] for job in body["jobs"]] == ["notes.txt"]
+    assert set(body["errors"]) == {"notes.txt", "copy.md", "tool.exe", "fake.pdf", "empty.txt"}
+    assert "name" in body["errors"]["notes.txt"]
+    assert body["errors"]["copy.md"] == "Same content as 'notes.txt'"
+
+def test_bulk_upload_needs_a_file():
+    with TestClient(api.app) as client:
+        response = client.post("/upload/bulk", data={"note": "no files"})
+    assert response.status_code == 400
@@ -0,0 +1,82 @@
+# backend/tests/test_uploads.py
+"""Streaming upload parser: hashing, limits and content checks."""
+import asyncio
+import hashlib
+import os
+
+import pytest
+from starlette.requests import Request
+
+from uploads import MULTIPART_OVERHEAD, UploadRejected, receive_upload
+
+BOUNDARY = "test-boundary"
+
+def multipart(filename: str, content: bytes, field: str = "file") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + content + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+def make_request(body: bytes, chunk_size: int = 256, content_length: int = None) -> tuple:
+    """A request whose body arrives in chunks; also returns the list of chunks read."""
+    chunks = [body[start:start + chunk_size] for start in range(0, len(body), chunk_size)]
+    read = []
+
+    async def receive():
+        index = len(read)
+        read.append(index)
+        return {"type": "http.request", "body": chunks[index] if index < len(chunks) else b"",
+                "more_body": index + 1 < len(chunks)}
+
+    headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]
+    if content_length is not None:
+        headers.append((b"content-length", str(content_length).encode()))
+    return Request({"type": "http", "method": "POST", "path": "/upload", "headers": headers}, receive), read
+
+def receive(body: bytes, tmp_path, **kwargs):
+    request, read = make_request(body, content_length=kwargs.pop("content_length", None))
+    return asyncio.run(receive_upload(request, str(tmp_path), **kwargs)), read
+
+def test_upload_is_hashed_while_streaming(tmp_path):
+    content = b"release notes\n" * 200
+    upload, _ = receive(multipart("docs/notes.txt", content), tmp_path)
+    assert upload["filename"] == "notes.txt"
+    assert upload["size"] == len(content)
+    assert upload["file_hash"] == hashlib.sha256(content).hexdigest()
+    with open(upload["temp_path"], "rb") as f:
+        assert f.read() == content
+
+@pytest.mark.parametrize("filename, content, status", [
+    ("big.txt", b"x" * 5000, 413),
+    ("fake.pdf", b"just text " * 200, 415),
+    ("short.pdf", b"tiny", 415),
+    ("binary.txt", b"text\x00" * 300, 415),
+    ("tool.exe", b"MZ", 400),
+    ("empty.md", b"", 400),
+])
+def test_rejected_upload_leaves_no_file(tmp_path, filename, content, status):
+    with pytest.raises(UploadRejected) as rejected:
+        receive(multipart(filename, content), tmp_path, max_bytes=4096)
+    assert rejected.value.status_code == status
+    assert os.listdir(tmp_path) == []
+
+def test_oversized_upload_stops_reading_early(tmp_path):
+    request, read = make_request(multipart("big.txt", b"x" * 100_000))
+    with pytest.raises(UploadRejected) as rejected:
+        asyncio.run(receive_upload(request, str(tmp_path), max_bytes=4096))
+    assert rejected.value.status_code == 413
+    # Stopped at the limit instead of reading the rest of the body
+    assert len(read) <= 4096 // 256 + 2
+
+def test_declared_length_is_checked_before_reading(tmp_path):
+    request, read = make_request(multipart("notes.txt", b"text"), content_length=4096 + MULTIPART_OVERHEAD + 1)
+    with pytest.raises(UploadRejected) as rejected:
+        asyncio.run(receive_upload(request, str(tmp_path), max_bytes=4096))
+    assert rejected.value.status_code == 413
+    assert read == []
+
+def test_upload_needs_multipart_file(tmp_path):
+    with pytest.raises(UploadRejected) as rejected:
+        receive(multipart("notes.txt", b"text", field="other"), tmp_path)
+    assert rejected.value.status_code == 400
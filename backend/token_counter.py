@@ -0,0 +1,92 @@
+# backend/token_counter.py
+"""
+Token counting with the embedding model's tokenizer.
+
+Uses the WordPiece tokenizer that ships with Chroma's default all-MiniLM-L6-v2
+model when it has been downloaded, and falls back to a word/punctuation regex
+(a close, slightly low estimate of WordPiece counts) otherwise. Loading is
+retried every TOKENIZER_RETRY_SECONDS, so a process started before the model
+was downloaded switches to WordPiece once it is there.
+
+The tokenizer decides where chunks end, and chunk IDs are content hashes, so
+each document records the tokenizer it was chunked with in the manifest and is
+chunked with that one again when re-indexed (see rag.document_tokenizer).
+"""
+import os
+import re
+import threading
+import time
+
+# all-MiniLM-L6-v2 embeds at most 256 tokens, including [CLS] and [SEP];
+# anything longer is silently truncated before embedding
+MODEL_MAX_TOKENS = 256
+SPECIAL_TOKENS = 2
+
+# 🎯 TOKENIZER_RETRY_SECONDS: How often to retry loading WordPiece while the
+#    regex fallback is in use
+TOKENIZER_RETRY_SECONDS = 30.0
+
+TOKENIZER_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "chroma", "onnx_models", "all-MiniLM-L6-v2", "onnx", "tokenizer.json"
+)
+
+_word_pieces = re.compile(r"\w+|[^\w\s]")
+
+class RegexTokenizer:
+    """Approximate tokenizer: one token per word or punctuation mark."""
+
+    name = "regex"
+
+    def offsets(self, text: str) -> list:
+        return [match.span() for match in _word_pieces.finditer(text)]
+
+    def count(self, text: str) -> int:
+        return sum(1 for _ in _word_pieces.finditer(text))
+
+class WordPieceTokenizer:
+    """The embedding model's own tokenizer, without padding or truncation."""
+
+    name = "wordpiece"
+
+    def __init__(self, path: str):
+        from tokenizers import Tokenizer
+        self._tokenizer = Tokenizer.from_file(path)
+        self._tokenizer.no_padding()
+        self._tokenizer.no_truncation()
+
+    def offsets(self, text: str) -> list:
+        return self._tokenizer.encode(text, add_special_tokens=False).offsets
+
+    def count(self, text: str) -> int:
+        return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+
+_regex = RegexTokenizer()
+_wordpiece = None
+_wordpiece_retry_at = 0.0   # monotonic time of the next load attempt
+_lock = threading.Lock()
+
+def _load_wordpiece():
+    global _wordpiece, _wordpiece_retry_at
+    if _wordpiece is None and time.monotonic() >= _wordpiece_retry_at:
+        with _lock:
+            if _wordpiece is None and time.monotonic() >= _wordpiece_retry_at:
+                try:
+                    _wordpiece = WordPieceTokenizer(TOKENIZER_PATH)
+                except Exception:
+                    _wordpiece_retry_at = time.monotonic() + TOKENIZER_RETRY_SECONDS
+    return _wordpiece
+
+def get_tokenizer(name: str = None):
+    """
+    Return the shared tokenizer called `name` ("wordpiece" or "regex"), or the
+    best one available if `name` is None. WordPiece falls back to the regex
+    tokenizer while the model files are missing; check the returned
+    tokenizer's name for the one actually used.
+    """
+    if name == RegexTokenizer.name:
+        return _regex
+    return _load_wordpiece() or _regex
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in `text` (without special tokens)."""
+    return get_tokenizer().count(text) if text else 0
@@ -0,0 +1,196 @@
+# backend/uploads.py
+"""
+Streaming receipt of uploaded documents.
+
+An UploadFile parameter makes Starlette spool the whole multipart body to a
+temporary file before the route runs, and copying it into data/ afterwards is
+blocking file I/O on the event loop. receive_upload() instead parses the
+multipart body as it arrives and writes the file part to a temporary file in
+data/ through aiofiles, hashing and counting the bytes on the way. The file
+type is checked as soon as the part headers and first bytes arrive and the
+size limit on every chunk, so a rejected upload stops before the rest of it
+is read, and the hash is known without reading the file again.
+receive_uploads() does the same for every file of a bulk upload, skipping
+the files that fail a check.
+"""
+import hashlib
+import os
+import uuid
+
+import aiofiles
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+# ========================================
+# ⚡ UPLOAD LIMITS
+# ========================================
+# 🎯 MAX_UPLOAD_MB: Largest document accepted by /upload
+#    Default: 50 MB (uploads stream to disk, so memory use doesn't grow with size)
+# 🎯 ALLOWED_EXTENSIONS: Document types the loader can parse
+MAX_UPLOAD_MB = float(os.environ.get("MAX_UPLOAD_MB", "50"))
+MAX_UPLOAD_BYTES = int(MAX_UPLOAD_MB * 1024 * 1024)
+ALLOWED_EXTENSIONS = {".pdf", ".txt", ".md"}
+
+# Bytes of a file inspected to check that its content matches its extension
+SNIFF_BYTES = 1024
+# Room for multipart boundaries and part headers when checking Content-Length
+MULTIPART_OVERHEAD = 16 * 1024
+
+class UploadRejected(Exception):
+    """An upload that fails a type, size or format check; carries the HTTP status to return."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def check_extension(filename: str) -> str:
+    """Return the file's lowercased extension, or raise UploadRejected if it isn't supported."""
+    file_ext = os.path.splitext(filename)[1].lower()
+    if file_ext not in ALLOWED_EXTENSIONS:
+        raise UploadRejected(400, f"File type {file_ext} not supported. Allowed: {ALLOWED_EXTENSIONS}")
+    return file_ext
+
+def _check_content(filename: str, file_ext: str, head: bytes):
+    """Reject files whose first bytes don't match their extension."""
+    if file_ext == ".pdf" and not head.startswith(b"%PDF-"):
+        raise UploadRejected(415, f"'{filename}' is not a PDF file")
+    if file_ext != ".pdf" and b"\x00" in head:
+        raise UploadRejected(415, f"'{filename}' is not a text file")
+
+def _filename(disposition: dict) -> str:
+    # Browsers send the bare name; strip any client-side directories
+    name = disposition[b"filename"].decode("utf-8", "replace").replace("\\", "/")
+    return os.path.basename(name)
+
+async def receive_upload(request, data_dir: str, field: str = "file", max_bytes: int = MAX_UPLOAD_BYTES) -> dict:
+    """
+    Stream the file part `field` of a multipart request into `data_dir`.
+
+    Args:
+        request: The incoming Starlette request (its body must not have been read)
+        data_dir: Directory the temporary file is created in
+        field: Form field holding the document
+        max_bytes: Size limit of the document
+
+    Returns:
+        {"filename", "temp_path", "file_hash", "size"}; the caller moves or
+        deletes temp_path
+
+    Raises:
+        UploadRejected: If the request isn't a multipart upload, or the file
+            is missing, empty, too large or of an unsupported type
+    """
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > max_bytes + MULTIPART_OVERHEAD:
+        raise UploadRejected(413, f"File exceeds the {max_bytes / 1024 / 1024:g} MB upload limit")
+    uploads, _ = await _receive(request, data_dir, field, max_bytes, multiple=False)
+    return uploads[0]
+
+async def receive_uploads(request, data_dir: str, field: str = "files", max_bytes: int = MAX_UPLOAD_BYTES) -> tuple:
+    """
+    Stream every file part `field` of a multipart request into `data_dir`.
+
+    Each file gets the same checks as in receive_upload; a file that fails
+    them is skipped and the rest of the request is still received.
+
+    Returns:
+        (uploads, rejected): uploads as returned by receive_upload, in
+        request order, and a dict of rejected file name -> reason
+
+    Raises:
+        UploadRejected: If the request isn't a multipart upload or has no
+            file in `field`
+    """
+    return await _receive(request, data_dir, field, max_bytes, multiple=True)
+
+async def _receive(request, data_dir: str, field: str, max_bytes: int, multiple: bool) -> tuple:
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadRejected(400, "Expected a multipart/form-data upload")
+
+    # The parser's callbacks are synchronous; they queue events that the loop
+    # below handles with awaitable file writes after each chunk
+    events = []
+    header_field, header_value, headers = bytearray(), bytearray(), {}
+
+    def on_header_end():
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        events.append(("part", dict(headers)))
+        headers.clear()
+
+    parser = MultipartParser(boundary, callbacks={
+        "on_header_field": lambda data, start, end: header_field.extend(data[start:end]),
+        "on_header_value": lambda data, start, end: header_value.extend(data[start:end]),
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": lambda data, start, end: events.append(("data", bytes(data[start:end]))),
+        "on_part_end": lambda: events.append(("end", None)),
+    })
+
+    uploads, rejected = [], {}
+    out = None          # open temporary file while a wanted part is streaming
+    temp_path = None
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for kind, value in events:
+                try:
+                    if kind == "part":
+                        _, disposition = parse_options_header(value.get(b"content-disposition", b""))
+                        if (uploads and not multiple) or disposition.get(b"name") != field.encode() or b"filename" not in disposition:
+                            continue
+                        filename = _filename(disposition)
+                        file_ext = check_extension(filename)
+                        temp_path = os.path.join(data_dir, f".upload-{uuid.uuid4().hex}.part")
+                        out = await aiofiles.open(temp_path, "wb")
+                        digest, size, head, checked = hashlib.sha256(), 0, bytearray(), False
+                    elif out is None:
+                        continue
+                    elif kind == "data":
+                        size += len(value)
+                        if size > max_bytes:
+                            raise UploadRejected(413, f"File exceeds the {max_bytes / 1024 / 1024:g} MB upload limit")
+                        if not checked:
+                            head.extend(value[:SNIFF_BYTES - len(head)])
+                            if len(head) >= SNIFF_BYTES:
+                                _check_content(filename, file_ext, bytes(head))
+                                checked = True
+                        digest.update(value)
+                        await out.write(value)
+                    else:
+                        await out.close()
+                        out = None
+                        if not size:
+                            raise UploadRejected(400, f"'{filename}' is empty")
+                        if not checked:
+                            _check_content(filename, file_ext, bytes(head))
+                        uploads.append({"filename": filename, "temp_path": temp_path, "file_hash": digest.hexdigest(), "size": size})
+                        temp_path = None
+                except UploadRejected as e:
+                    if not multiple:
+                        raise
+                    # Skip the rest of this part and carry on with the next file
+                    rejected[filename] = e.detail
+                    if out is not None:
+                        await out.close()
+                        out = None
+                    if temp_path and os.path.exists(temp_path):
+                        os.remove(temp_path)
+                    temp_path = None
+            events.clear()
+        parser.finalize()
+        if not uploads and not rejected:
+            raise UploadRejected(400, f"No complete file found in form field '{field}'")
+    except BaseException:
+        if out is not None:
+            await out.close()
+        for path in [temp_path] + [upload["temp_path"] for upload in uploads]:
+            if path and os.path.exists(path):
+                os.remove(path)
+        raise
+    return uploads, rejected
@@ -0,0 +1,116 @@
+# backend/warmup.py
+"""
+Readiness tracking and background pre-warming.
+
+Importing rag opens the vector store, manifest and keyword index, and the
+first embedding loads the ONNX model. app.py therefore imports rag lazily, so
+/ and /models answer as soon as the server is up. /ready reports when the
+store and embedder are loaded. With PREWARM on, startup loads both in a
+background thread and asks Ollama to load the default model, and the time
+from process start to ready is recorded as the cold-start time.
+"""
+import asyncio
+import os
+import threading
+import time
+
+from metrics import Gauge
+from logger import get_logger
+
+log = get_logger(__name__)
+
+# Taken when app.py imports this module, i.e. close to process start
+PROCESS_STARTED = time.perf_counter()
+
+# ========================================
+# ⚡ STARTUP TUNING
+# ========================================
+# 🎯 PREWARM: Load the vector store and embedding model in the background at startup
+#    Off (PREWARM=0) = fastest boot, the first request pays the load instead
+# 🎯 PREWARM_OLLAMA: Also ask Ollama to load the default model at startup
+#    The first answer then skips the model load (often the slowest part)
+PREWARM = os.environ.get("PREWARM", "1") != "0"
+PREWARM_OLLAMA = os.environ.get("PREWARM_OLLAMA", "1") != "0"
+
+# Components the API needs before it can answer questions
+REQUIRED = ("store", "embedder")
+
+class Readiness:
+    """Load times of the heavy components and the resulting cold-start time."""
+
+    def __init__(self):
+        self.load_seconds = {}
+        self.errors = {}
+        self.cold_start_seconds = None
+        self._lock = threading.Lock()
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self.load_seconds
+
+    def loaded(self, name: str, seconds: float):
+        with self._lock:
+            if name in self.load_seconds:
+                return
+            self.load_seconds[name] = round(seconds, 3)
+            self.errors.pop(name, None)
+            if self.cold_start_seconds is None and all(c in self.load_seconds for c in REQUIRED):
+                self.cold_start_seconds = round(time.perf_counter() - PROCESS_STARTED, 3)
+                log.info("Cold start: ready in %ss (store %ss, embedder %ss)", self.cold_start_seconds,
+                         self.load_seconds["store"], self.load_seconds["embedder"])
+
+    def failed(self, name: str, error: Exception):
+        with self._lock:
+            self.errors[name] = str(error)
+        log.error("Warm-up of %s failed: %s", name, error)
+
+    @property
+    def ready(self) -> bool:
+        # Without pre-warming, components load on first use and the API can always serve
+        return not PREWARM or self.cold_start_seconds is not None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "prewarm": PREWARM,
+                "loaded": {name: name in self.load_seconds for name in REQUIRED + ("model",)},
+                "load_seconds": dict(self.load_seconds),
+                "cold_start_seconds": self.cold_start_seconds,
+                "errors": dict(self.errors),
+            }
+
+readiness = Readiness()
+
+Gauge("rag_cold_start_seconds", "Time from process start until the store and embedder were loaded",
+      lambda: {(): readiness.cold_start_seconds})
+Gauge("rag_component_load_seconds", "Load time of each heavy component", lambda: {
+    (name,): seconds for name, seconds in readiness.load_seconds.items()}, ("component",))
+
+_model_task = None
+
+def _warm_local():
+    try:
+        import rag  # opens the store; rag records its own load time
+        rag.warm_embedder()
+    except Exception as e:
+        readiness.failed("embedder" if readiness.is_loaded("store") else "store", e)
+
+async def _warm_model():
+    from ollama_client import MODEL_NAME, warm_model_async
+    from sessions import session_num_ctx
+    started = time.perf_counter()
+    try:
+        # Load with the session context size; a different num_ctx would reload the model
+        await warm_model_async(num_ctx=session_num_ctx(MODEL_NAME))
+        readiness.loaded("model", time.perf_counter() - started)
+    except Exception as e:
+        readiness.failed("model", e)
+
+def start():
+    """Start pre-warming in the background (call from the app's startup hook)."""
+    if not PREWARM:
+        return
+    threading.Thread(target=_warm_local, name="prewarm", daemon=True).start()
+    if PREWARM_OLLAMA:
+        global _model_task
+        _model_task = asyncio.get_running_loop().create_task(_warm_model())
@@ -1,5 +1,6 @@
 import { useState, useRef, useEffect } from 'react'
 import { marked } from 'marked'
+import { waitForJob } from './jobs'
 
 // Configure marked for better rendering
 marked.setOptions({
@@ -24,6 +25,7 @@ function Chat({ theme, currentChat, currentChatId, onMessagesUpdate, onUploadSuc
   const inputRef = useRef(null)
   const abortControllerRef = useRef(null)
   const previousChatIdRef = useRef(null)
+  const sessionIdRef = useRef(null)
 
   // Load messages when currentChatId changes (switching chats)
   useEffect(() => {
@@ -48,9 +50,16 @@ function Chat({ theme, currentChat, currentChatId, onMessagesUpdate, onUploadSuc
       }
       
       previousChatIdRef.current = currentChatId
+      // Random, so another client can't guess it and join the conversation
+      sessionIdRef.current = currentChatId ? crypto.randomUUID() : null
     }
   }, [currentChatId, currentChat])
 
+  // Only follow-up questions use a server-side session (the model reuses the
+  // conversation it already read); standalone questions go without one so
+  // the server can answer them from its cache
+  const sessionFor = (history) => (sessionIdRef.current && history.length > 0 ? sessionIdRef.current : '')
+
   // Update parent when messages change
   useEffect(() => {
     if (currentChatId && saveToMemory && messages.length > 0) {
@@ -211,7 +220,12 @@ function Chat({ theme, currentChat, currentChatId, onMessagesUpdate, onUploadSuc
       const formData = new FormData()
       formData.append('file', file)
       const response = await fetch('/upload', { method: 'POST', body: formData })
-      if (!response.ok) throw new Error('Upload failed')
+      // 409: the same content is already in the knowledge base
+      if (!response.ok && response.status !== 409) throw new Error('Upload failed')
+      if (response.ok) {
+        const data = await response.json()
+        await waitForJob(data.job_id)
+      }
       
       // Update file status to uploaded
       setAttachedFiles(prev => prev.map(f => 
@@ -288,7 +302,8 @@ function Chat({ theme, currentChat, currentChatId, onMessagesUpdate, onUploadSuc
           stream: false,
           history: updatedMessages,
           personalization: personalizationPrompt,
-          model: selectedModel
+          model: selectedModel,
+          session_id: sessionFor(updatedMessages)
         }),
         signal: abortController.signal
       })
@@ -347,7 +362,8 @@ function Chat({ theme, currentChat, currentChatId, onMessagesUpdate, onUploadSuc
           stream: false,
           history: historyBeforeUser,
           personalization: personalizationPrompt,
-          model: selectedModel
+          model: selectedModel,
+          session_id: sessionFor(historyBeforeUser)
         }),
         signal: abortController.signal
       })
@@ -425,7 +441,8 @@ function Chat({ theme, currentChat, currentChatId, onMessagesUpdate, onUploadSuc
           stream: false,
           history: messages,
           personalization: personalizationPrompt,
-          model: selectedModel
+          model: selectedModel,
+          session_id: sessionFor(messages)
         }),
         signal: abortController.signal
       })
@@ -1,4 +1,5 @@
 import { useState, useRef } from 'react'
+import { waitForJob } from './jobs'
 
 function Upload({ onUploadSuccess }) {
   const [selectedFile, setSelectedFile] = useState(null)
@@ -52,15 +53,36 @@ function Upload({ onUploadSuccess }) {
         body: formData,
       })
 
+      if (response.status === 409) {
+        // Same content is already indexed; nothing to process
+        const errorData = await response.json()
+        setMessage({ type: 'success', text: `✅ ${errorData.detail}` })
+        return
+      }
+
       if (!response.ok) {
         const errorData = await response.json()
         throw new Error(errorData.detail || 'Upload failed')
       }
 
       const data = await response.json()
+      setMessage({ type: 'success', text: `⏳ ${data.message}` })
+
+      const job = await waitForJob(data.job_id, {
+        onProgress: (job) => {
+          if (job.chunks_parsed) {
+            setMessage({
+              type: 'success',
+              text: `⏳ Processing ${job.filename}: ${job.stage} (${job.chunks_done}/${job.chunks_parsed} chunks)`
+            })
+          }
+        }
+      })
       setMessage({ 
         type: 'success', 
-        text: `✅ ${data.message} (${data.chunks} chunks created)` 
+        text: job.stage === 'unchanged'
+          ? `✅ Document '${job.filename}' is already up to date`
+          : `✅ Document '${job.filename}' processed successfully (${job.chunks_total} chunks created)` 
       })
       setSelectedFile(null)
       if (fileInputRef.current) {
@@ -104,6 +126,25 @@ function Upload({ onUploadSuccess }) {
     }
   }
 
+  const handleDeleteDocument = async (name) => {
+    if (!confirm(`Remove "${name}" from the knowledge base?`)) {
+      return
+    }
+
+    try {
+      const response = await fetch(`/documents/${encodeURIComponent(name)}`, {
+        method: 'DELETE',
+      })
+
+      if (response.ok) {
+        setMessage({ type: 'success', text: `✅ Removed ${name}` })
+        await loadDocuments()
+      }
+    } catch (error) {
+      setMessage({ type: 'error', text: `❌ Error removing document: ${error.message}` })
+    }
+  }
+
   return (
     <div className="space-y-6">
       {/* Upload Card */}
@@ -234,7 +275,14 @@ function Upload({ onUploadSuccess }) {
                       <svg className="h-4 w-4 text-gray-400" fill="none" viewBox="0 0 24 24" stroke="currentColor">
                         <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M9 12h6m-6 4h6m2 5H7a2 2 0 01-2-2V5a2 2 0 012-2h5.586a1 1 0 01.707.293l5.414 5.414a1 1 0 01.293.707V19a2 2 0 01-2 2z" />
                       </svg>
-                      {doc}
+                      <span className="flex-1">{doc}</span>
+                      <button
+                        onClick={() => handleDeleteDocument(doc)}
+                        className="text-xs text-red-500 hover:text-red-700 px-2 py-1 rounded hover:bg-red-50 transition-colors"
+                        title="Remove document"
+                      >
+                        Remove
+                      </button>
                     </li>
                   ))}
                 </ul>
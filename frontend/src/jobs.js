@@ -0,0 +1,14 @@
+// Poll a background ingestion job until it finishes
+export async function waitForJob(jobId, { interval = 1000, onProgress } = {}) {
+  while (true) {
+    const response = await fetch(`/jobs/${jobId}`)
+    if (!response.ok) throw new Error('Could not fetch upload status')
+
+    const job = await response.json()
+    if (onProgress) onProgress(job)
+    if (job.status === 'done') return job
+    if (job.status === 'failed') throw new Error(job.error || 'Processing failed')
+
+    await new Promise(resolve => setTimeout(resolve, interval))
+  }
+}